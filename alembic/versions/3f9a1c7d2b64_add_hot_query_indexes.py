@@ -0,0 +1,168 @@
+"""Add composite and unique indexes for hot queries
+
+Revision ID: 3f9a1c7d2b64
+Revises: 000711f4db6c
+Create Date: 2025-11-08 14:12:31.208144
+
+No Postgres os índices são criados com CREATE INDEX CONCURRENTLY (fora de
+transação), então a migration pode ser aplicada com o banco em produção.
+As constraints únicas são criadas a partir de um índice único concorrente
+(ADD CONSTRAINT ... USING INDEX), que só precisa de um lock rápido.
+
+ATENÇÃO: likes/matches precisam de uma pausa de escrita entre a remoção de
+duplicados e o fim dos índices únicos. Um duplicado gravado nesse meio faz o
+CREATE UNIQUE INDEX CONCURRENTLY falhar e deixa um índice INVALID. No
+Postgres a remoção de duplicados roda logo antes de cada build (inclusive a
+cada nova tentativa) e cada índice tem UNIQUE_INDEX_ATTEMPTS tentativas:
+remove o índice inválido (senão o if_not_exists o pularia), deduplica, cria
+e confere que ficou válido; se ainda falhar, pare as escritas e rode de novo.
+
+A etapa não é atômica: roda em autocommit (fora de transação, exigência do
+CONCURRENTLY), cada UPDATE/DELETE da deduplicação é confirmado sozinho e a
+migration pode parar entre a deduplicação e o build. Rodar de novo é seguro:
+a deduplicação se repete antes de cada build e pega duplicados novos.
+No modo offline (--sql) as verificações de índice inválido não rodam:
+confira pg_index.indisvalid à mão.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7d2b64'
+down_revision: Union[str, Sequence[str], None] = '000711f4db6c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (nome, tabela, colunas)
+INDEXES = [
+    # get_user_liked_by e checagem de reciprocidade do like_user
+    ('ix_likes_liked_id_liker_id', 'likes', ['liked_id', 'liker_id']),
+    # Matches do usuário (user_a_id já é coberto pela constraint única)
+    ('ix_matches_user_b_id', 'matches', ['user_b_id']),
+    # get_chat_messages: filtra por match_id e ordena por created_at
+    ('ix_chat_messages_match_id_created_at', 'chat_messages', ['match_id', 'created_at']),
+    # get_users_with_same_game
+    ('ix_users_game_is_active', 'users', ['game', 'is_active']),
+]
+
+# (nome, tabela, colunas)
+UNIQUE_CONSTRAINTS = [
+    ('uq_likes_liker_liked', 'likes', ['liker_id', 'liked_id']),
+    # O serviço sempre grava o par ordenado (user_a_id = menor id)
+    ('uq_matches_user_pair', 'matches', ['user_a_id', 'user_b_id']),
+]
+
+# Builds de cada índice único antes de desistir (duplicados gravados durante o build)
+UNIQUE_INDEX_ATTEMPTS = 3
+
+
+def _is_postgresql() -> bool:
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def _remove_duplicates() -> None:
+    """Remove likes/matches duplicados, que impediriam as constraints únicas"""
+    # Mensagens de um match duplicado passam para o match mantido (menor id)
+    op.execute("""
+        UPDATE chat_messages SET match_id = (
+            SELECT MIN(m2.id) FROM matches m1
+            JOIN matches m2 ON m2.user_a_id = m1.user_a_id AND m2.user_b_id = m1.user_b_id
+            WHERE m1.id = chat_messages.match_id
+        )
+        WHERE match_id IN (
+            SELECT m1.id FROM matches m1
+            JOIN matches m2 ON m2.user_a_id = m1.user_a_id AND m2.user_b_id = m1.user_b_id
+            WHERE m2.id < m1.id
+        )
+    """)
+    op.execute("""
+        DELETE FROM matches WHERE id IN (
+            SELECT m1.id FROM matches m1
+            JOIN matches m2 ON m2.user_a_id = m1.user_a_id AND m2.user_b_id = m1.user_b_id
+            WHERE m2.id < m1.id
+        )
+    """)
+    op.execute("""
+        DELETE FROM likes WHERE id IN (
+            SELECT l1.id FROM likes l1
+            JOIN likes l2 ON l2.liker_id = l1.liker_id AND l2.liked_id = l1.liked_id
+            WHERE l2.id < l1.id
+        )
+    """)
+
+
+def _invalid_index(name: str) -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first() is not None
+
+
+def _drop_if_invalid(name: str) -> None:
+    """Remove um índice deixado INVALID por um CONCURRENTLY que falhou"""
+    if not op.get_context().as_sql and _invalid_index(name):
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def _create_unique_concurrently(name: str, table: str, columns) -> None:
+    """
+    Índice único concorrente. Cada tentativa deduplica logo antes do build;
+    se um duplicado entrar durante o build, o índice inválido sai e tenta de novo.
+    """
+    for attempt in range(1, UNIQUE_INDEX_ATTEMPTS + 1):
+        _drop_if_invalid(name)
+        _remove_duplicates()
+        try:
+            op.create_index(name, table, columns, unique=True,
+                            postgresql_concurrently=True, if_not_exists=True)
+        except sa.exc.IntegrityError:
+            if attempt == UNIQUE_INDEX_ATTEMPTS:
+                _drop_if_invalid(name)
+                raise RuntimeError(f"Índice {name} falhou com duplicados novos: pause as escritas em {table} e rode a migration de novo")
+            continue
+        if op.get_context().as_sql or not _invalid_index(name):
+            return
+    raise RuntimeError(f"Índice {name} ficou INVALID: pause as escritas em {table} e rode a migration de novo")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _is_postgresql():
+        _remove_duplicates()
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            op.create_index(name, table, columns, unique=True)
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+        return
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            _create_unique_concurrently(name, table, columns)
+        for name, table, columns in INDEXES:
+            _drop_if_invalid(name)
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+    for name, table, columns in UNIQUE_CONSTRAINTS:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _is_postgresql():
+        for name, table, columns in INDEXES + UNIQUE_CONSTRAINTS:
+            op.drop_index(name, table_name=table)
+        return
+
+    for name, table, columns in UNIQUE_CONSTRAINTS:
+        op.drop_constraint(name, table, type_='unique')
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,51 @@
+"""Add keyset index for the discovery feed
+
+Revision ID: 8b2e4f6a1c93
+Revises: 3f9a1c7d2b64
+Create Date: 2025-11-15 10:41:07.513926
+
+Troca ix_users_game_is_active por (game, is_active, id): o feed de descoberta
+pagina por id dentro de um jogo, e com o id no índice cada página é uma
+leitura de intervalo, sem ordenar todos os jogadores do jogo. No Postgres o
+índice é criado/removido com CONCURRENTLY.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4f6a1c93'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_postgresql() -> bool:
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def _swap_index(create: tuple, drop: str) -> None:
+    name, columns = create
+    if not _is_postgresql():
+        op.create_index(name, 'users', columns, unique=False)
+        op.drop_index(drop, table_name='users')
+        return
+
+    # CREATE/DROP INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        op.create_index(name, 'users', columns, unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index(drop, table_name='users', postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _swap_index(('ix_users_game_is_active_id', ['game', 'is_active', 'id']), 'ix_users_game_is_active')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _swap_index(('ix_users_game_is_active', ['game', 'is_active']), 'ix_users_game_is_active_id')
@@ -0,0 +1,51 @@
+"""Add users.updated_at
+
+Revision ID: a9d4f7c2e815
+Revises: e7b3c9d1a4f2
+Create Date: 2025-12-06 10:42:18.537120
+
+Marca a última mudança de cada usuário (perfil, jogos, status). O índice de
+candidatos do feed usa a coluna para aplicar só as mudanças recentes em vez
+de reler users/user_games inteiras. Linhas antigas ficam com NULL (já entram
+no warm inicial). No Postgres o índice é criado/removido com CONCURRENTLY.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4f7c2e815'
+down_revision: Union[str, Sequence[str], None] = 'e7b3c9d1a4f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_postgresql() -> bool:
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    if not _is_postgresql():
+        op.create_index('ix_users_updated_at', 'users', ['updated_at'], unique=False)
+        return
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_updated_at', 'users', ['updated_at'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_users_updated_at', table_name='users',
+                          postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index('ix_users_updated_at', table_name='users')
+    op.drop_column('users', 'updated_at')
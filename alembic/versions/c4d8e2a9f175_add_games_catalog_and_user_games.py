@@ -0,0 +1,97 @@
+"""Add games catalog and user_games association
+
+Revision ID: c4d8e2a9f175
+Revises: 8b2e4f6a1c93
+Create Date: 2025-11-22 16:05:48.902317
+
+Cria o catálogo `games` e a associação `user_games` (um usuário pode ter
+vários jogos) e preenche a partir de users.game, que continua existindo como
+jogo principal. O backfill de user_games roda em lotes por faixa de id: no
+Postgres cada lote é commitado separadamente (sem uma transação gigante em
+tabelas grandes) e a migration pode ser reexecutada sem duplicar linhas.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2a9f175'
+down_revision: Union[str, Sequence[str], None] = '8b2e4f6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Usuários por lote no backfill de user_games
+BACKFILL_BATCH_SIZE = 10000
+
+BACKFILL_GAMES = """
+    INSERT INTO games (name, created_at)
+    SELECT DISTINCT u.game, CURRENT_TIMESTAMP FROM users u
+    WHERE u.game IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM games g WHERE g.name = u.game)
+"""
+
+BACKFILL_USER_GAMES = """
+    INSERT INTO user_games (user_id, game_id, created_at)
+    SELECT u.id, g.id, CURRENT_TIMESTAMP FROM users u
+    JOIN games g ON g.name = u.game
+    WHERE NOT EXISTS (
+        SELECT 1 FROM user_games ug WHERE ug.user_id = u.id AND ug.game_id = g.id
+    )
+"""
+
+
+def _backfill_user_games() -> None:
+    if op.get_context().as_sql:
+        # Modo offline (--sql): não dá para consultar o maior id; um statement só
+        op.execute(BACKFILL_USER_GAMES)
+        return
+
+    max_id = op.get_bind().execute(sa.text('SELECT MAX(id) FROM users')).scalar() or 0
+    batch = sa.text(BACKFILL_USER_GAMES + ' AND u.id > :low AND u.id <= :high')
+
+    def run_batches():
+        for low in range(0, max_id, BACKFILL_BATCH_SIZE):
+            op.get_bind().execute(batch, {'low': low, 'high': low + BACKFILL_BATCH_SIZE})
+
+    if op.get_context().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            run_batches()
+    else:
+        run_batches()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'games',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_games_id'), 'games', ['id'], unique=False)
+    op.create_table(
+        'user_games',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'game_id')
+    )
+    op.create_index('ix_user_games_game_id_user_id', 'user_games', ['game_id', 'user_id'], unique=False)
+
+    op.execute(BACKFILL_GAMES)
+    _backfill_user_games()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_games_game_id_user_id', table_name='user_games')
+    op.drop_table('user_games')
+    op.drop_index(op.f('ix_games_id'), table_name='games')
+    op.drop_table('games')
@@ -0,0 +1,59 @@
+"""Add chat read cursors
+
+Revision ID: e7b3c9d1a4f2
+Revises: c4d8e2a9f175
+Create Date: 2025-11-29 11:20:36.184205
+
+Cria chat_read_cursors (última mensagem lida por usuário em cada sala) e o
+índice (match_id, id) em chat_messages, usado para contar as mensagens
+depois do cursor. No Postgres o índice é criado/removido com CONCURRENTLY.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c9d1a4f2'
+down_revision: Union[str, Sequence[str], None] = 'c4d8e2a9f175'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_postgresql() -> bool:
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'chat_read_cursors',
+        sa.Column('match_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['match_id'], ['matches.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('match_id', 'user_id')
+    )
+    if not _is_postgresql():
+        op.create_index('ix_chat_messages_match_id_id', 'chat_messages', ['match_id', 'id'], unique=False)
+        return
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        op.create_index('ix_chat_messages_match_id_id', 'chat_messages', ['match_id', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_chat_messages_match_id_id', table_name='chat_messages',
+                          postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index('ix_chat_messages_match_id_id', table_name='chat_messages')
+    op.drop_table('chat_read_cursors')
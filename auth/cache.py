@@ -0,0 +1,110 @@
+# auth/cache.py
+"""
+Cache por processo dos usuários autenticados.
+
+Evita uma consulta à tabela `users` a cada requisição protegida: o principal
+resolvido a partir do token fica em memória por alguns segundos, indexado pelo
+`sub` do token (email). Cada worker do gunicorn tem o seu próprio cache.
+
+Os claims de um token v2 só substituem o banco enquanto o token tiver menos
+de AUTH_CLAIMS_MAX_AGE_SECONDS e o usuário não tiver mudado depois da emissão
+(revoke_claims, chamado em todo update). Assim uma desativação vale na hora
+neste worker e em no máximo AUTH_CLAIMS_MAX_AGE_SECONDS nos outros.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", 10000))
+AUTH_CLAIMS_MAX_AGE_SECONDS = float(os.getenv("AUTH_CLAIMS_MAX_AGE_SECONDS", 300))
+
+
+class PrincipalCache:
+    """Cache LRU com TTL e contadores de acerto/erro."""
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS, max_size: int = AUTH_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # user_id → momento (epoch) da última mudança; tokens emitidos antes não valem como claims
+        self._claims_revoked_at: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, subject: str):
+        """Retorna o principal em cache ou None (expirado ou ausente)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, subject: str, principal) -> None:
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[subject] = (expires_at, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *subjects: str) -> None:
+        """Remove as entradas indicadas (ex: após update ou desativação do usuário)"""
+        with self._lock:
+            for subject in subjects:
+                if subject is not None and self._entries.pop(subject, None) is not None:
+                    self.invalidations += 1
+
+    def revoke_claims(self, user_id: int) -> None:
+        """Tokens deste usuário emitidos até agora passam a ser conferidos no banco"""
+        now = time.time()
+        with self._lock:
+            self._claims_revoked_at[user_id] = now
+            # Marcas mais velhas que a idade máxima dos claims não barram mais nada
+            expired = [uid for uid, at in self._claims_revoked_at.items() if at < now - AUTH_CLAIMS_MAX_AGE_SECONDS]
+            for uid in expired:
+                del self._claims_revoked_at[uid]
+
+    def claims_usable(self, user_id: int, issued_at) -> bool:
+        """Se os claims de um token v2 (emitido em `issued_at`) ainda podem dispensar o banco"""
+        if issued_at is None or time.time() - issued_at > AUTH_CLAIMS_MAX_AGE_SECONDS:
+            return False
+        with self._lock:
+            revoked_at = self._claims_revoked_at.get(user_id)
+        return revoked_at is None or issued_at > revoked_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._claims_revoked_at.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "revoked_claims": len(self._claims_revoked_at),
+            }
+
+
+principal_cache = PrincipalCache()
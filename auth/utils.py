@@ -1,6 +1,9 @@
 # auth/utils.py
 import os
+import asyncio
+import threading
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 
@@ -9,16 +12,80 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# Versão do formato do token. v1 = apenas email em "sub";
+# v2 = também carrega id, jogo e status do usuário (claims "uid", "game", "act")
+TOKEN_VERSION = 2
+
+# --- Pool dedicado para o bcrypt ---
+# O bcrypt é CPU-bound e libera o GIL, então threads bastam. O pool é pequeno e
+# separado do threadpool do AnyIO para que uma rajada de logins não deixe as
+# demais rotas síncronas do worker sem threads.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", 2))
+# Quantas operações podem esperar na fila além das que estão executando
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", 32))
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_POOL_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(HASH_POOL_WORKERS + HASH_POOL_MAX_QUEUE)
+
+
+class HashingPoolSaturated(Exception):
+    """O pool de hashing está cheio; a requisição deve falhar rápido (503)"""
+
+
+def _submit_hash_job(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HashingPoolSaturated()
+    try:
+        future = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
-def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
+def _hashpw(password: str) -> str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _submit_hash_job(_checkpw, plain_password, hashed_password).result()
+
+def get_password_hash(password: str) -> str:
+    return _submit_hash_job(_hashpw, password).result()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão assíncrona: aguarda o pool de hashing sem ocupar uma thread do AnyIO"""
+    return await asyncio.wrap_future(_submit_hash_job(_checkpw, plain_password, hashed_password))
+
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit_hash_job(_hashpw, password))
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Indica se o hash foi gerado com um custo diferente do configurado ($2b$<custo>$...)"""
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != BCRYPT_ROUNDS
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+def create_user_access_token(user) -> str:
+    """Cria um token v2 com os claims necessários para montar o principal sem ir ao banco"""
+    return create_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "game": user.game,
+        "act": user.is_active,
+        "ver": TOKEN_VERSION,
+        "iat": datetime.now(timezone.utc),
+    })
\ No newline at end of file
@@ -1,8 +1,11 @@
 # app/database/connection.py
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import load_secrets # <--- Importe sua função
+from .pool import engine_options, instrument_engine
+from .routing import RoutingSession
 
 # --- CORREÇÃO AQUI ---
 # Antes de tentar criar a engine, verifique se a URL existe.
@@ -16,8 +19,43 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("A variavel DATABASE_URL esta vazia. Verifique o Secrets Manager.")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def to_async_database_url(url: str) -> str:
+    """Troca o driver síncrono pelo assíncrono (asyncpg para Postgres, aiosqlite para SQLite)"""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+# Pode ser sobrescrita explicitamente; por padrão é derivada da DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+# Tamanho, overflow, timeout, recycle e pre-ping do pool vêm do ambiente (DB_POOL_*)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+instrument_engine("primary", engine)
+
+# Réplica de leitura opcional: funções marcadas com @replica_read leem dela
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+replica_engine = None
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(REPLICA_DATABASE_URL, **engine_options(REPLICA_DATABASE_URL))
+    instrument_engine("replica", replica_engine)
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession,
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    replica=replica_engine
+)
+
+# Engine/sessões assíncronas para rotas async (ex: WebSocket do chat), que
+# não devem bloquear o event loop com I/O síncrono de banco
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+instrument_engine("async", async_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -26,4 +64,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
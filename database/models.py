@@ -1,6 +1,6 @@
 # database/models.py
 import enum
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Enum, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Enum, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .connection import Base
@@ -12,7 +12,41 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    # Jogo principal (exibição e compatibilidade); o matching usa `games`
     game = Column(String, nullable=True)
+    # Última mudança de perfil/jogos/status (refresh incremental do índice de candidatos)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Todos os jogos do usuário (tabela user_games). Carregados sob demanda: quem
+    # serializa perfis pede selectinload(User.games) na própria consulta
+    games = relationship("Game", secondary="user_games", order_by="Game.name")
+
+    __table_args__ = (
+        # Feed de descoberta: filtra por jogo/ativo e pagina por id (keyset)
+        Index("ix_users_game_is_active_id", "game", "is_active", "id"),
+        Index("ix_users_updated_at", "updated_at"),
+    )
+
+# Catálogo normalizado de jogos
+class Game(Base):
+    __tablename__ = "games"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Associação usuário ↔ jogo (índice invertido jogo → usuários)
+class UserGame(Base):
+    __tablename__ = "user_games"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Jogadores de um jogo, já ordenados por id (keyset do feed)
+        Index("ix_user_games_game_id_user_id", "game_id", "user_id"),
+    )
 
 # Novo Enum para o status
 class MatchStatus(enum.Enum):
@@ -36,6 +70,12 @@ class Match(Base):
     user_a = relationship("User", foreign_keys=[user_a_id])
     user_b = relationship("User", foreign_keys=[user_b_id])
 
+    __table_args__ = (
+        # Par sempre ordenado (user_a_id < user_b_id): um único match por par
+        UniqueConstraint("user_a_id", "user_b_id", name="uq_matches_user_pair"),
+        Index("ix_matches_user_b_id", "user_b_id"),
+    )
+
 # Nova tabela para rastrear curtidas individuais
 class Like(Base):
     __tablename__ = "likes"
@@ -52,6 +92,11 @@ class Like(Base):
     liker = relationship("User", foreign_keys=[liker_id])
     liked = relationship("User", foreign_keys=[liked_id])
 
+    __table_args__ = (
+        UniqueConstraint("liker_id", "liked_id", name="uq_likes_liker_liked"),
+        Index("ix_likes_liked_id_liker_id", "liked_id", "liker_id"),
+    )
+
 # Nova tabela para mensagens de chat
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -68,4 +113,20 @@ class ChatMessage(Base):
 
     # Relacionamentos
     match = relationship("Match")
-    sender = relationship("User")
\ No newline at end of file
+    sender = relationship("User")
+
+    __table_args__ = (
+        Index("ix_chat_messages_match_id_created_at", "match_id", "created_at"),
+        # Mensagens de uma sala depois de um id (não lidas, keyset do histórico)
+        Index("ix_chat_messages_match_id_id", "match_id", "id"),
+    )
+
+# Até onde cada usuário leu cada sala (contagem de não lidas)
+class ChatReadCursor(Base):
+    __tablename__ = "chat_read_cursors"
+
+    match_id = Column(Integer, ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Última mensagem lida; as de id maior (do outro usuário) são não lidas
+    last_read_message_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
@@ -0,0 +1,165 @@
+# database/pool.py
+"""
+Configuração e instrumentação do pool de conexões.
+
+Os parâmetros do pool vêm do ambiente (DB_POOL_*). Cada worker do gunicorn
+tem o seu próprio pool, então as métricas aqui são sempre por processo.
+"""
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+class PoolMetrics:
+    """Contadores de checkout/checkin de um pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.checkout_timeouts = 0
+        self.in_use = 0
+        self.in_use_max = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+                return
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+
+    def on_checkout(self, *args):
+        with self._lock:
+            self.in_use += 1
+            self.in_use_max = max(self.in_use_max, self.in_use)
+
+    def on_checkin(self, *args):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def on_connect(self, *args):
+        with self._lock:
+            self.connects += 1
+
+    def on_invalidate(self, *args):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_wait_avg_ms": (self.checkout_wait_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": self.checkout_wait_max * 1000,
+                "checkout_timeouts": self.checkout_timeouts,
+                "in_use": self.in_use,
+                "in_use_max": self.in_use_max,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+            }
+
+
+class _TimedCheckoutMixin:
+    """Mede quanto tempo cada checkout esperou por uma conexão livre"""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Mantém as métricas quando o pool é recriado (ex: engine.dispose())
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Argumentos de pool para create_engine/create_async_engine a partir do ambiente"""
+    if url.startswith("sqlite"):
+        # SQLite usa pools próprios (SingletonThreadPool/NullPool); sem dimensionamento
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+_instrumented: dict = {}
+
+def instrument_engine(name: str, engine) -> PoolMetrics:
+    """Registra listeners de pool na engine e a expõe em pool_stats()"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    metrics = PoolMetrics()
+    event.listen(sync_engine, "checkout", metrics.on_checkout)
+    event.listen(sync_engine, "checkin", metrics.on_checkin)
+    event.listen(sync_engine, "connect", metrics.on_connect)
+    event.listen(sync_engine, "invalidate", metrics.on_invalidate)
+    if isinstance(sync_engine.pool, _TimedCheckoutMixin):
+        sync_engine.pool.metrics = metrics
+    _instrumented[name] = sync_engine
+    sync_engine.pool_metrics = metrics
+    return metrics
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    Falha de conexão/banco indisponível (vale tentar de novo depois), e não
+    uma linha recusada pelo banco (DataError, IntegrityError...)
+    """
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, OperationalError)
+    return True
+
+def pool_stats() -> dict:
+    """Estado atual de cada pool registrado (por worker)"""
+    stats = {}
+    for name, sync_engine in _instrumented.items():
+        pool = sync_engine.pool
+        entry = {"pool_class": type(pool).__name__, **sync_engine.pool_metrics.snapshot()}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                # O QueuePool conta o overflow a partir de -pool_size
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        stats[name] = entry
+    return stats
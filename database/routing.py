@@ -0,0 +1,113 @@
+# database/routing.py
+"""
+Roteamento de leituras para a réplica.
+
+Funções de serviço marcadas com @replica_read mandam suas consultas para a
+engine da réplica (REPLICA_DATABASE_URL). Escritas, flushes e qualquer leitura
+fora dessas funções continuam no primário. Depois de um commit com escrita, o
+usuário que escreveu fica "preso" ao primário por REPLICA_STICKY_SECONDS, para
+não ler dados desatualizados pelo atraso de replicação (read-your-writes).
+
+Limitação: a janela é por processo. Com vários workers do gunicorn, uma
+leitura que cai em outro worker logo depois da escrita ainda pode ir para a
+réplica e não ver a escrita (até o atraso de replicação passar). Escritas
+fora de uma RoutingSession (ex: o WebSocket do chat, com AsyncSession) marcam
+a janela explicitamente com sticky_writes.mark.
+"""
+import functools
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+
+
+class StickyPrimaryTracker:
+    """Guarda, por usuário, até quando as leituras devem ir para o primário"""
+
+    def __init__(self, window_seconds: float = REPLICA_STICKY_SECONDS, max_size: int = 100000):
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self._until: dict = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) >= self.max_size:
+                # Descarta janelas já expiradas antes de crescer
+                self._until = {uid: until for uid, until in self._until.items() if until > now}
+            self._until[user_id] = now + self.window_seconds
+
+    def is_sticky(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._until.clear()
+
+
+sticky_writes = StickyPrimaryTracker()
+
+
+class RoutingSession(Session):
+    """
+    Session que escolhe a engine por operação: réplica para leituras marcadas
+    como somente leitura, primário para todo o resto.
+    """
+
+    def __init__(self, *args, replica=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._use_replica():
+            return self.replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+    def _use_replica(self) -> bool:
+        if self.replica is None or not self.info.get("read_only"):
+            return False
+        # Escritas pendentes ou já feitas nesta transação: lê do primário
+        if self._flushing or self.info.get("wrote") or self.new or self.dirty or self.deleted:
+            return False
+        principal_id = self.info.get("principal_id")
+        return principal_id is None or not sticky_writes.is_sticky(principal_id)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _record_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _record_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _start_sticky_window(session):
+    if session.info.pop("wrote", False):
+        principal_id = session.info.get("principal_id")
+        if principal_id is not None:
+            sticky_writes.mark(principal_id)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_write(session):
+    session.info.pop("wrote", None)
+
+
+def replica_read(fn):
+    """Marca uma função de serviço `fn(db, ...)` como somente leitura (pode ir para a réplica)"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        db = kwargs["db"] if "db" in kwargs else args[0]
+        previous = db.info.get("read_only", False)
+        db.info["read_only"] = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            db.info["read_only"] = previous
+    return wrapper
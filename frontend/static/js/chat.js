@@ -24,6 +24,22 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let websocket;
     let currentUser = null;
+    // Histórico paginado: a página inicial traz as mais recentes e o resto vem ao rolar para cima
+    const MESSAGES_PAGE_SIZE = 50;
+    let oldestMessageId = null;
+    let hasOlderMessages = false;
+    let loadingOlder = false;
+    // Última mensagem exibida; enviada ao servidor como "lida"
+    let lastMessageId = null;
+
+    // O servidor junta as marcações e grava em lote: pode mandar a cada mensagem
+    function markRead(messageId) {
+        if (messageId === null || messageId === undefined) return;
+        lastMessageId = Math.max(lastMessageId || 0, messageId);
+        if (websocket && websocket.readyState === WebSocket.OPEN && !document.hidden) {
+            websocket.send(JSON.stringify({ type: 'read', message_id: lastMessageId }));
+        }
+    }
 
     async function fetchCurrentUser() {
         try {
@@ -40,23 +56,59 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    async function fetchMessagesPage(beforeId = null) {
+        const query = beforeId === null
+            ? `limit=${MESSAGES_PAGE_SIZE}`
+            : `limit=${MESSAGES_PAGE_SIZE}&before_id=${beforeId}`;
+        const response = await fetch(`${API_URL}/chat/messages/${matchId}?${query}`, {
+            headers: { 'Authorization': `Bearer ${token}` },
+        });
+        if (!response.ok) throw new Error('Failed to load messages');
+
+        const messages = await response.json();
+        if (messages.length) {
+            oldestMessageId = messages[0].id;
+        }
+        hasOlderMessages = messages.length === MESSAGES_PAGE_SIZE;
+        return messages;
+    }
+
     async function loadMessages() {
         try {
-            const response = await fetch(`${API_URL}/chat/messages/${matchId}`, {
-                headers: { 'Authorization': `Bearer ${token}` },
-            });
-            if (!response.ok) throw new Error('Failed to load messages');
-            
-            const messages = await response.json();
+            const messages = await fetchMessagesPage();
             messages.forEach(message => {
                 const isOwn = message.sender_id === currentUser.id;
                 addMessage(message.content, isOwn ? 'own' : 'other', message.created_at);
             });
+            if (messages.length) {
+                lastMessageId = messages[messages.length - 1].id;
+            }
         } catch (error) {
             console.error('Error loading messages:', error);
         }
     }
 
+    // Página anterior ao chegar no topo, sem pular a posição de leitura
+    async function loadOlderMessages() {
+        if (!hasOlderMessages || loadingOlder) return;
+        loadingOlder = true;
+        try {
+            const messages = await fetchMessagesPage(oldestMessageId);
+            const previousHeight = chatMessages.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            messages.forEach(message => {
+                const isOwn = message.sender_id === currentUser.id;
+                fragment.appendChild(createMessageElement(message.content, isOwn ? 'own' : 'other', message.created_at));
+            });
+            chatMessages.insertBefore(fragment, chatMessages.firstChild);
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        } catch (error) {
+            console.error('Error loading older messages:', error);
+        } finally {
+            loadingOlder = false;
+        }
+    }
+
     // --- MUDANÇA 1: Passar o token na URL ---
     function connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
@@ -68,6 +120,7 @@ document.addEventListener('DOMContentLoaded', () => {
         websocket.onopen = () => {
             console.log('Conectado ao chat');
             addSystemMessage('Conectado!');
+            markRead(lastMessageId);
         };
         
         // onmessage agora é a *única* fonte de novas mensagens
@@ -78,6 +131,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     // O servidor nos diz quem enviou, então podemos saber se é nossa
                     const isOwn = data.sender_id === currentUser.id;
                     addMessage(data.content, isOwn ? 'own' : 'other', data.created_at);
+                    markRead(data.id);
                 }
             } catch (error) {
                 console.error('Error parsing WebSocket message:', error);
@@ -97,7 +151,7 @@ document.addEventListener('DOMContentLoaded', () => {
         };
     }
 
-    function addMessage(text, type, timestamp = null) {
+    function createMessageElement(text, type, timestamp = null) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${type}`;
         
@@ -106,8 +160,11 @@ document.addEventListener('DOMContentLoaded', () => {
             <div class="message-content">${text}</div>
             <div class="message-time">${timeStr}</div>
         `;
-        
-        chatMessages.appendChild(messageDiv);
+        return messageDiv;
+    }
+
+    function addMessage(text, type, timestamp = null) {
+        chatMessages.appendChild(createMessageElement(text, type, timestamp));
         chatMessages.scrollTop = chatMessages.scrollHeight; // Auto-scroll
     }
 
@@ -139,6 +196,12 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    chatMessages.addEventListener('scroll', () => {
+        if (chatMessages.scrollTop < 50) {
+            loadOlderMessages();
+        }
+    });
+
     sendButton.addEventListener('click', sendMessage);
     messageInput.addEventListener('keypress', (e) => {
         if (e.key === 'Enter') {
@@ -146,6 +209,9 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Mensagens que chegaram com a aba em segundo plano contam como lidas ao voltar
+    document.addEventListener('visibilitychange', () => markRead(lastMessageId));
+
     backButton.addEventListener('click', () => {
         window.location.href = '/game-selector.html';
     });
@@ -18,108 +18,99 @@ document.addEventListener('DOMContentLoaded', async () => {
     let userMatches = new Map();
     let userLikesSent = new Set();
     let userLikesReceived = new Set();
+    let lastRecommendations = [];
 
-    // Buscar dados do usuário atual
-    async function fetchUserData() {
+    // Completar o seletor com o catálogo do servidor (as opções fixas do HTML ficam como fallback)
+    async function fetchGameCatalog() {
         try {
-            const response = await fetch(`${API_URL}/auth/users/me`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                },
-            });
-
-            if (!response.ok) {
-                throw new Error('Failed to fetch user data');
-            }
-
-            const user = await response.json();
-            currentUser = user;
-            
-            // Se o usuário já tem um jogo, pré-selecionar
-            if (user.game) {
-                gameSelector.value = user.game;
-            }
-            
-            return user;
+            const response = await fetch(`${API_URL}/games`);
+            if (!response.ok) return;
+            const known = new Set(Array.from(gameSelector.options, option => option.value));
+            (await response.json())
+                .filter(game => !known.has(game.name))
+                .forEach(game => gameSelector.add(new Option(game.name, game.name)));
         } catch (error) {
             console.error(error);
-            localStorage.removeItem('accessToken');
-            window.location.href = '/';
         }
     }
 
-    // Buscar matches do usuário
-    async function fetchUserMatches() {
+    // Perfil, matches e curtidas pendentes em uma só requisição
+    async function fetchDashboard() {
         try {
-            const response = await fetch(`${API_URL}/matches/me`, {
+            const response = await fetch(`${API_URL}/me/dashboard`, {
                 headers: {
                     'Authorization': `Bearer ${token}`,
                 },
             });
 
             if (!response.ok) {
-                throw new Error('Failed to fetch matches');
+                throw new Error('Failed to fetch dashboard');
+            }
+
+            const dashboard = await response.json();
+            currentUser = dashboard.user;
+
+            // Se o usuário já tem um jogo, pré-selecionar
+            if (currentUser.game) {
+                gameSelector.value = currentUser.game;
             }
 
-            const matches = await response.json();
-            matches.forEach(match => {
+            dashboard.matches.forEach(match => {
                 if (match.status === 'matched') {
                     userMatches.set(match.user_a.id, match.id);
                     userMatches.set(match.user_b.id, match.id);
                 }
             });
-            return matches;
-        } catch (error) {
-            console.error('Error fetching matches:', error);
-            return [];
-        }
-    }
-
-    // Buscar likes enviados
-    async function fetchUserLikesSent() {
-        try {
-            const response = await fetch(`${API_URL}/matches/likes-sent`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                },
-            });
 
-            if (!response.ok) {
-                throw new Error('Failed to fetch likes sent');
+            // O painel traz a primeira página de cada lista; o resto continua pelo cursor
+            let likesSent = dashboard.likes_sent;
+            let likesReceived = dashboard.likes_received;
+            if (dashboard.likes_sent_next !== null) {
+                likesSent = likesSent.concat(await fetchAllLikePages(
+                    '/matches/likes-sent', 'Failed to fetch likes sent', dashboard.likes_sent_next
+                ));
             }
+            if (dashboard.likes_received_next !== null) {
+                likesReceived = likesReceived.concat(await fetchAllLikePages(
+                    '/matches/likes-received', 'Failed to fetch likes received', dashboard.likes_received_next
+                ));
+            }
+            likesSent.forEach(like => userLikesSent.add(like.liked_user_id));
+            likesReceived.forEach(like => userLikesReceived.add(like.liker_user_id));
 
-            const likes = await response.json();
-            likes.forEach(like => {
-                userLikesSent.add(like.liked_user_id);
-            });
-            return likes;
+            return dashboard;
         } catch (error) {
-            console.error('Error fetching likes sent:', error);
-            return [];
+            console.error(error);
+            localStorage.removeItem('accessToken');
+            window.location.href = '/';
+            // Quem chamou não pode seguir sem o painel
+            throw error;
         }
     }
 
-    // Buscar likes recebidos
-    async function fetchUserLikesReceived() {
-        try {
-            const response = await fetch(`${API_URL}/matches/likes-received`, {
+    // Percorre uma listagem paginada por keyset (`after` = like_id do último item)
+    async function fetchAllLikePages(path, errorText, after = null) {
+        const pageSize = 200;
+        let all = [];
+
+        while (true) {
+            const query = after === null ? `limit=${pageSize}` : `limit=${pageSize}&after=${after}`;
+            const response = await fetch(`${API_URL}${path}?${query}`, {
                 headers: {
                     'Authorization': `Bearer ${token}`,
                 },
             });
 
             if (!response.ok) {
-                throw new Error('Failed to fetch likes received');
+                throw new Error(errorText);
             }
 
-            const likes = await response.json();
-            likes.forEach(like => {
-                userLikesReceived.add(like.liker_user_id);
-            });
-            return likes;
-        } catch (error) {
-            console.error('Error fetching likes received:', error);
-            return [];
+            const page = await response.json();
+            all = all.concat(page);
+            if (page.length < pageSize) {
+                return all;
+            }
+            after = page[page.length - 1].like_id;
         }
     }
 
@@ -152,29 +143,19 @@ document.addEventListener('DOMContentLoaded', async () => {
                 throw new Error(errorData.detail || 'Failed to update game');
             }
 
-            const updatedUser = await updateResponse.json();
-            currentUser = updatedUser;
-
-            // 2. Buscar usuários com o mesmo jogo
-            const matchesResponse = await fetch(`${API_URL}/auth/users/match`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                },
-            });
+            // 2. Recarregar perfil, matches e likes
+            const { matches } = await fetchDashboard();
 
-            if (!matchesResponse.ok) {
-                throw new Error('Failed to fetch matches');
-            }
+            // 3. Primeira página do feed (já sem quem você curtiu ou deu match)
+            const page = await fetchDiscoveryPage(null);
 
-            const recommendations = await matchesResponse.json();
-            
-            // 3. Recarregar dados de matches e likes
-            await fetchUserMatches();
-            await fetchUserLikesSent();
-            await fetchUserLikesReceived();
+            // Matches do mesmo jogo continuam no topo, com o botão de chat
+            const matchedUsers = matches
+                .map(match => match.user_a.id === currentUser.id ? match.user_b : match.user_a)
+                .filter(user => user.game === selectedGame);
             
             // 4. Exibir recomendações
-            displayRecommendations(recommendations);
+            displayRecommendations(matchedUsers.concat(page.items));
             recommendationsContainer.style.display = 'block';
 
         } catch (error) {
@@ -186,41 +167,121 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
+    // Feed de descoberta paginado por cursor
+    const FEED_PAGE_SIZE = 20;
+    let nextCursor = null;
+
+    async function fetchDiscoveryPage(cursor) {
+        const params = new URLSearchParams({ limit: FEED_PAGE_SIZE });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        const response = await fetch(`${API_URL}/discovery/feed?${params}`, {
+            headers: {
+                'Authorization': `Bearer ${token}`,
+            },
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to fetch recommendations');
+        }
+
+        const page = await response.json();
+        nextCursor = page.next_cursor;
+        return page;
+    }
+
+    // Próxima página do feed, adicionada ao fim da lista
+    async function loadMoreRecommendations() {
+        if (!nextCursor) {
+            return;
+        }
+        try {
+            const page = await fetchDiscoveryPage(nextCursor);
+            displayRecommendations(lastRecommendations.concat(page.items));
+        } catch (error) {
+            console.error(error);
+            errorMessage.textContent = error.message || 'Erro ao buscar jogadores';
+        }
+    }
+
+    // Curtidas ficam numa fila e são enviadas juntas em POST /matches/likes:batch
+    const LIKE_BATCH_DELAY_MS = 800;
+    const LIKE_BATCH_MAX = 100;
+    let pendingLikes = [];
+    let likeFlushTimer = null;
+
     // Curtir usuário
-    async function likeUser(targetUserId) {
+    function likeUser(targetUserId) {
+        if (userLikesSent.has(targetUserId) || pendingLikes.includes(targetUserId)) {
+            alert('Você já curtiu este usuário!');
+            return;
+        }
+
+        // Marca o card como pendente na hora; o envio é feito em lote
+        pendingLikes.push(targetUserId);
+        userLikesSent.add(targetUserId);
+        displayRecommendations(lastRecommendations);
+
+        clearTimeout(likeFlushTimer);
+        if (pendingLikes.length >= LIKE_BATCH_MAX) {
+            flushLikes();
+        } else {
+            likeFlushTimer = setTimeout(flushLikes, LIKE_BATCH_DELAY_MS);
+        }
+    }
+
+    // Envia as curtidas da fila em uma única requisição
+    async function flushLikes({ keepalive = false } = {}) {
+        clearTimeout(likeFlushTimer);
+        const batch = pendingLikes.splice(0, LIKE_BATCH_MAX);
+        if (batch.length === 0) {
+            return;
+        }
+
         try {
-            const response = await fetch(`${API_URL}/matches/like/${targetUserId}`, {
+            const response = await fetch(`${API_URL}/matches/likes:batch`, {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${token}`,
                     'Content-Type': 'application/json',
                 },
+                body: JSON.stringify({ target_user_ids: batch }),
+                keepalive,
             });
 
             if (!response.ok) {
-                throw new Error('Failed to like user');
+                throw new Error('Failed to like users');
             }
 
-            const result = await response.json();
-            
-            if (result.status === 'MATCHED') {
-                alert('Match! Vocês se curtiram!');
-                userMatches.set(targetUserId, result.match_id);
-                userLikesSent.add(targetUserId);
+            const { results } = await response.json();
+            let matched = 0;
+
+            results.forEach(result => {
+                if (result.status === 'MATCHED') {
+                    matched += 1;
+                    userMatches.set(result.target_user_id, result.match_id);
+                } else if (result.status === 'ERROR' || result.status === 'NOT_FOUND') {
+                    userLikesSent.delete(result.target_user_id);
+                }
+            });
+
+            if (matched > 0) {
+                alert(matched === 1 ? 'Match! Vocês se curtiram!' : `${matched} novos matches!`);
                 // Recarregar recomendações
                 await updateGameAndSearch();
-            } else if (result.status === 'LIKED') {
-                alert('Curtida enviada! Aguarde o outro usuário responder.');
-                userLikesSent.add(targetUserId);
-                await updateGameAndSearch();
-            } else if (result.status === 'ALREADY_LIKED') {
-                alert('Você já curtiu este usuário!');
-            } else if (result.status === 'ERROR') {
-                alert(result.message);
+            } else {
+                displayRecommendations(lastRecommendations);
             }
         } catch (error) {
-            console.error('Error liking user:', error);
+            console.error('Error liking users:', error);
+            batch.forEach(id => userLikesSent.delete(id));
             alert('Erro ao curtir usuário');
+            displayRecommendations(lastRecommendations);
+        }
+
+        if (pendingLikes.length > 0) {
+            flushLikes({ keepalive });
         }
     }
 
@@ -237,6 +298,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     // Exibir recomendações
     function displayRecommendations(recommendations) {
+        lastRecommendations = recommendations;
         if (recommendations.length === 0) {
             usersList.innerHTML = '<p>Nenhum jogador encontrado para este jogo.</p>';
             return;
@@ -285,7 +347,9 @@ document.addEventListener('DOMContentLoaded', async () => {
                     </div>
                 </div>
             `;
-        }).join('');
+        }).join('') + (nextCursor ? `
+            <button class="load-more-button" onclick="loadMoreRecommendations()">Carregar mais</button>
+        ` : '');
     }
 
     // Event listeners
@@ -298,12 +362,14 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     // Tornar funções globais para uso nos botões
     window.likeUser = likeUser;
+    // Não perde curtidas ainda na fila ao sair da página
+    window.addEventListener('pagehide', () => flushLikes({ keepalive: true }));
     window.startChat = startChat;
+    window.loadMoreRecommendations = loadMoreRecommendations;
 
     // Carregar dados iniciais
-    await fetchUserData();
-    await fetchUserMatches();
-    await fetchUserLikesSent();
-    await fetchUserLikesReceived();
+    await fetchGameCatalog();
+    // Em caso de erro já redirecionou para o login
+    await fetchDashboard().catch(() => {});
 });
 
@@ -5,22 +5,69 @@ from config import load_secrets
 # Carrega secrets do AWS Secrets Manager (com fallback para .env)
 load_secrets()
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 # --- MUDANÇA 1: Limpeza e centralização das importações dos routers ---
 # Importe todos os módulos de rotas que você vai usar.
-from routers import auth, match, chat 
+from routers import auth, match, chat, discovery, games, dashboard, internal
 
-from database.connection import engine
+from database.connection import engine, SessionLocal, AsyncSessionLocal
 from database import models
+from auth.utils import HashingPoolSaturated
+from services.candidate_index import CANDIDATE_INDEX_ENABLED, keep_candidate_index_warm
+from services.feed_store import FEED_ENABLED, keep_feeds_fresh
+from services.read_cursors import read_cursor_writer, keep_read_cursors_flushed
+from services.chat_access import chat_access
+from services.message_writer import CHAT_WRITE_BEHIND, chat_message_writer, keep_chat_messages_flushed
 
 # Descomente apenas se precisar criar as tabelas sem usar o Alembic
 # models.Base.metadata.create_all(bind=engine) 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    # Índice de candidatos do feed: montado no startup e reconstruído periodicamente
+    if CANDIDATE_INDEX_ENABLED:
+        tasks.append(asyncio.create_task(keep_candidate_index_warm(SessionLocal)))
+    # Feeds pré-calculados dos usuários ativos (GET /discovery/next)
+    if FEED_ENABLED:
+        tasks.append(asyncio.create_task(keep_feeds_fresh(SessionLocal)))
+    # Cursores de leitura do chat, gravados em lote
+    tasks.append(asyncio.create_task(keep_read_cursors_flushed(SessionLocal)))
+    # Mensagens do chat gravadas em lote (write-behind, opcional)
+    if CHAT_WRITE_BEHIND:
+        tasks.append(asyncio.create_task(keep_chat_messages_flushed(AsyncSessionLocal)))
+    # Pub/sub do chat entre workers (LISTEN/NOTIFY no Postgres)
+    try:
+        await chat.manager.backend.start()
+    except Exception as e:
+        print(f"⚠ Erro ao conectar o pub/sub do chat: {e}")
+    # Revogações de acesso ao chat chegam (e saem) pelo mesmo pub/sub
+    chat_access.bind(chat.manager.backend, asyncio.get_running_loop())
+    yield
+    await chat.manager.backend.stop()
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Não perde as mensagens aceitas e ainda não gravadas
+    try:
+        await chat_message_writer.flush(AsyncSessionLocal)
+    except Exception as e:
+        print(f"⚠ Erro ao gravar mensagens do chat: {e}")
+    # Não perde as marcações de leitura ainda em memória
+    try:
+        await run_in_threadpool(read_cursor_writer.flush, SessionLocal)
+    except Exception as e:
+        print(f"⚠ Erro ao gravar cursores de leitura do chat: {e}")
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuração do CORS (está correto)
 app.add_middleware(
@@ -31,6 +78,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pool de hashing (bcrypt) cheio: falha rápido em vez de enfileirar sem limite
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication service busy, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
 # --- MUDANÇA 2: Inclusão de TODOS os routers da API ---
 # Aqui você "conecta" os arquivos de rotas à sua aplicação principal.
 # Cada `include_router` faz com que todos os endpoints (@app.get, @app.post, etc.)
@@ -38,6 +94,10 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(match.router) # <-- ESTA LINHA É ESSENCIAL E ESTAVA FALTANDO
 app.include_router(chat.router)  # <-- Adicionando para quando for implementar o chat
+app.include_router(discovery.router)
+app.include_router(games.router)
+app.include_router(dashboard.router)
+app.include_router(internal.router)
 
 # --------------------------------------------------------------------
 # --- SEÇÃO DO FRONTEND (Servindo os arquivos HTML, CSS, JS) ---
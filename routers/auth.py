@@ -2,12 +2,15 @@
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
 from schemas import user as user_schema, token as token_schema
 from services import user_service
 from auth import utils as auth_utils
+from auth.cache import principal_cache
 from database.connection import get_db # Importe sua dependência get_db
 
 router = APIRouter(
@@ -17,61 +20,174 @@ router = APIRouter(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-# Função de dependência para obter o usuário atual
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def decode_token(token: str):
+    """Decodifica o JWT (v1 ou v2) e retorna TokenData, ou None se for inválido"""
+    try:
+        payload = jwt.decode(token, auth_utils.SECRET_KEY, algorithms=[auth_utils.ALGORITHM])
+    except JWTError:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    return token_schema.TokenData(
+        email=email,
+        user_id=payload.get("uid"),
+        game=payload.get("game"),
+        is_active=payload.get("act"),
+        version=payload.get("ver", 1),
+        issued_at=payload.get("iat"),
+    )
+
+def resolve_principal(token: str, db: Session, fresh: bool = False):
+    """
+    Resolve o usuário a partir do token JWT. Retorna None se o token for inválido.
+
+    Tokens v2 recentes carregam id/jogo/status, então o principal é montado
+    direto dos claims sem tocar no banco (ver auth/cache.py). Com `fresh=True`,
+    tokens v1 (só email), tokens velhos ou de usuários alterados depois da
+    emissão, o usuário vem do cache de principais ou, em caso de miss, do banco.
+    """
+    token_data = decode_token(token)
+    if token_data is None:
+        return None
+
+    principal = _principal_without_db(token_data, fresh)
+    if principal is not None:
+        return principal
+
+    if token_data.user_id is not None:
+        user = user_service.get_user_by_id(db, user_id=token_data.user_id)
+    else:
+        user = user_service.get_user_by_email(db, email=token_data.email)
+    return _cache_principal(token_data, user)
+
+async def resolve_principal_async(token: str, db: AsyncSession, fresh: bool = False):
+    """Versão assíncrona de resolve_principal (ex: WebSocket)"""
+    token_data = decode_token(token)
+    if token_data is None:
+        return None
+
+    principal = _principal_without_db(token_data, fresh)
+    if principal is not None:
+        return principal
+
+    if token_data.user_id is not None:
+        user = await user_service.get_user_by_id_async(db, user_id=token_data.user_id)
+    else:
+        user = await user_service.get_user_by_email_async(db, email=token_data.email)
+    return _cache_principal(token_data, user)
+
+def _principal_without_db(token_data: token_schema.TokenData, fresh: bool):
+    """Principal montado dos claims (token v2) ou vindo do cache; None se precisar do banco"""
+    if (not fresh and token_data.version >= 2 and token_data.user_id is not None
+            and principal_cache.claims_usable(token_data.user_id, token_data.issued_at)):
+        # Claims assinados por nós: dispensa a validação do schema
+        return user_schema.User.model_construct(
+            id=token_data.user_id,
+            email=token_data.email,
+            is_active=bool(token_data.is_active),
+            game=token_data.game,
+        )
+    return principal_cache.get(token_data.email)
+
+def _cache_principal(token_data: token_schema.TokenData, user):
+    if user is None:
+        return None
+    # Guarda um snapshot (não a instância ORM, que fica presa à sessão)
+    principal = user_schema.User.model_validate(user)
+    principal_cache.set(token_data.email, principal)
+    return principal
+
+def _inactive_user_exception():
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, auth_utils.SECRET_KEY, algorithms=[auth_utils.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = token_schema.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    
-    user = user_service.get_user_by_email(db, email=token_data.email)
+
+# Função de dependência para obter o usuário atual
+# (principal leve, montado dos claims do token quando possível)
+def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+    user = resolve_principal(token, db)
+    if user is None:
+        raise _credentials_exception()
+    if not user.is_active:
+        raise _inactive_user_exception()
+    # Usado pelo roteamento de réplica (janela sticky após escritas do usuário)
+    db.info["principal_id"] = user.id
+    return user
+
+# Dependência para rotas que precisam dos dados atuais do usuário
+# (ex: feed pelo jogo atual após um update), buscando por chave primária
+def get_current_user_fresh(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+    user = get_current_profile(token, db)
+    if not user.is_active:
+        raise _inactive_user_exception()
+    return user
+
+# Só para o próprio perfil (/auth/users/me): aceita usuários desativados,
+# é por aqui que a conta pode ser reativada
+def get_current_profile(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+    user = resolve_principal(token, db, fresh=True)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    db.info["principal_id"] = user.id
     return user
 
 # Endpoint de Registro
 @router.post("/register", response_model=user_schema.User)
-def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
-    db_user = user_service.get_user_by_email(db, email=user.email)
+async def register_user(user: user_schema.UserCreate, db: Session = Depends(get_db)):
+    # Como /token: o bcrypt roda no pool de hashing sem segurar uma thread do
+    # AnyIO; o acesso ao banco (síncrono) vai para o threadpool
+    db_user = await run_in_threadpool(user_service.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return user_service.create_user(db=db, user=user)
+    hashed_password = await auth_utils.get_password_hash_async(user.password)
+    created = await run_in_threadpool(user_service.create_user, db, user, hashed_password)
+    # Serializa no threadpool: os jogos do usuário podem precisar de lazy load
+    return await run_in_threadpool(user_schema.User.model_validate, created)
 
 # Endpoint de Login (Token)
 @router.post("/token", response_model=token_schema.Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Session = Depends(get_db)
 ):
-    user = user_service.get_user_by_email(db, email=form_data.username)
-    if not user or not auth_utils.verify_password(form_data.password, user.hashed_password):
+    # Async para que a espera pelo bcrypt não segure uma thread do AnyIO;
+    # o acesso ao banco (síncrono) continua indo para o threadpool
+    user = await run_in_threadpool(user_service.get_user_by_email, db, email=form_data.username)
+    if not user or not await auth_utils.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = auth_utils.create_access_token(data={"sub": user.email})
+    access_token = auth_utils.create_user_access_token(user)
+
+    # Rehash transparente se o hash salvo usa um custo desatualizado
+    if auth_utils.password_needs_rehash(user.hashed_password):
+        try:
+            new_hash = await auth_utils.get_password_hash_async(form_data.password)
+        except auth_utils.HashingPoolSaturated:
+            new_hash = None  # Tenta de novo no próximo login
+        if new_hash:
+            await run_in_threadpool(user_service.update_password_hash, db, user, new_hash)
+
     return {"access_token": access_token, "token_type": "bearer"}
 
 # Endpoint Protegido - Obter dados do usuário atual
 @router.get("/users/me", response_model=user_schema.User)
-def read_users_me(current_user: Annotated[user_schema.User, Depends(get_current_user)]):
+def read_users_me(current_user: Annotated[user_schema.User, Depends(get_current_profile)]):
     return current_user
 
 # Endpoint Protegido - Atualizar dados do usuário atual
 @router.put("/users/me", response_model=user_schema.User)
 def update_user_me(
     user_update: user_schema.UserUpdate,
-    current_user: Annotated[user_schema.User, Depends(get_current_user)],
+    current_user: Annotated[user_schema.User, Depends(get_current_profile)],
     db: Session = Depends(get_db)
 ):
     # Verifica se o email já existe em outro usuário (se estiver sendo alterado)
@@ -87,12 +203,13 @@ def update_user_me(
     return updated_user
 
 # Endpoint Protegido - Buscar usuários com mesmo jogo (matches)
-@router.get("/users/match", response_model=list[user_schema.User])
+# Obsoleto: lista sem limite; use GET /discovery/feed (paginado, sem quem já foi curtido)
+@router.get("/users/match", response_model=list[user_schema.User], deprecated=True)
 def get_matches(
-    current_user: Annotated[user_schema.User, Depends(get_current_user)],
+    current_user: Annotated[user_schema.User, Depends(get_current_user_fresh)],
     db: Session = Depends(get_db)
 ):
-    """Busca usuários que jogam o mesmo jogo que o usuário logado"""
+    """Busca usuários que jogam o mesmo jogo que o usuário logado (obsoleto)"""
     matches = user_service.get_users_with_same_game(
         db, 
         current_user.id, 
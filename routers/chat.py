@@ -1,108 +1,222 @@
 # routers/chat.py
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Awaitable, Callable, List, Optional
+from datetime import datetime
+import asyncio
 import json
+import os
 
 from database.connection import get_db
 from schemas import chat as chat_schema, user as user_schema
 from services import chat_service
-from routers.auth import get_current_user
+from services.read_cursors import read_cursor_writer
+from services.chat_access import chat_access
+from services.message_writer import CHAT_WRITE_BEHIND, chat_message_writer
+from services.broadcast import BroadcastBackend, PayloadTooLarge, create_broadcast_backend, encode_frame
+from routers.auth import get_current_user, resolve_principal_async
 
-from database.connection import SessionLocal
+from database.connection import AsyncSessionLocal
+from database.routing import sticky_writes
 from fastapi import status
-from auth.utils import SECRET_KEY, ALGORITHM
-from jose import jwt, JWTError
-from services import user_service
 
-# Classe para gerenciar conexões WebSocket
+# Mensagens que podem esperar na fila de saída de cada socket
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 100))
+
+
+class ClientConnection:
+    """Socket com fila de saída limitada e uma task própria que escreve nele"""
+
+    def __init__(self, websocket: WebSocket, match_id: int, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.match_id = match_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+
+
+# Classe para gerenciar conexões WebSocket deste worker; o fan-out entre
+# workers passa pelo backend de pub/sub (services/broadcast.py).
+# Entregar é só enfileirar: um cliente lento não atrasa os outros nem o
+# loop de recepção, e quem estoura a fila é desconectado.
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[int, List[WebSocket]] = {}
+    def __init__(self, backend: BroadcastBackend, queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.active_connections: dict[int, List[ClientConnection]] = {}
+        self.backend = backend
+        self.queue_size = queue_size
+        self.sent = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+        self.send_errors = 0
+        self.publish_errors = 0
+        backend.subscribe(self.deliver_local)
 
     async def connect(self, websocket: WebSocket, match_id: int, user_id: int):
         await websocket.accept()
-        if match_id not in self.active_connections:
-            self.active_connections[match_id] = []
-        
-        # Armazena informações do usuário junto com a conexão
-        websocket.user_id = user_id
-        self.active_connections[match_id].append(websocket)
+        connection = ClientConnection(websocket, match_id, user_id, self.queue_size)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections.setdefault(match_id, []).append(connection)
+        return connection
 
     def disconnect(self, websocket: WebSocket, match_id: int):
-        if match_id in self.active_connections:
-            self.active_connections[match_id] = [
-                conn for conn in self.active_connections[match_id] 
-                if conn != websocket
-            ]
-
-    async def broadcast(self, message_data: dict, match_id: int, exclude_user: int = None):
-        """Envia mensagem para todos os usuários conectados no match"""
-        if match_id in self.active_connections:
-            for connection in self.active_connections[match_id]:
-                if exclude_user and hasattr(connection, 'user_id') and connection.user_id == exclude_user:
-                    continue
+        for connection in list(self.active_connections.get(match_id, [])):
+            if connection.websocket is websocket:
+                self._remove(connection)
+
+    def _remove(self, connection: ClientConnection):
+        connections = self.active_connections.get(connection.match_id, [])
+        if connection in connections:
+            connections.remove(connection)
+            if not connections:
+                del self.active_connections[connection.match_id]
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _write(self, connection: ClientConnection):
+        """Task de escrita de um socket: esvazia a fila na ordem de chegada"""
+        try:
+            while True:
+                frame = await connection.queue.get()
                 try:
-                    await connection.send_text(json.dumps(message_data))
-                except:
-                    # Remove conexões que falharam
-                    self.active_connections[match_id] = [
-                        conn for conn in self.active_connections[match_id] 
-                        if conn != connection
-                    ]
+                    await connection.websocket.send_text(frame)
+                    self.sent += 1
+                finally:
+                    connection.queue.task_done()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket fechado/quebrado: sai das conexões deste worker
+            self.send_errors += 1
+            self._remove(connection)
+
+    async def close(self, connection: ClientConnection, code: int):
+        """Fecha o socket ignorando erros (ele pode já estar fechado)"""
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
 
+    def close_revoked(self, connection: ClientConnection):
+        """Acesso revogado (services/chat_access.py): sai das entregas na hora e o socket é fechado"""
+        self._remove(connection)
+        asyncio.create_task(self.close(connection, status.WS_1008_POLICY_VIOLATION))
 
-def get_user_from_websocket_token(token: str, db: Session):
+    async def broadcast(self, frame: str, match_id: int, exclude_user: int = None, message_id: int = None,
+                        before_reference: Optional[Callable[[], Awaitable]] = None):
+        """
+        Publica um frame já codificado (encode_frame) uma vez; cada worker
+        entrega o mesmo frame aos seus sockets do match. `message_id` permite
+        o fallback por referência quando o frame não cabe no backend;
+        `before_reference` roda antes dele (ex: gravar a mensagem ainda
+        pendente no write-behind, para os workers a lerem do banco).
+
+        Se o backend falhar (ex: conexão do LISTEN caída), o frame ainda é
+        entregue aos sockets deste worker; os outros workers perdem esse
+        evento, e quem envia não é desconectado.
+        """
+        event = {"match_id": match_id, "exclude_user": exclude_user, "frame": frame}
+        try:
+            try:
+                await self.backend.publish(event)
+            except PayloadTooLarge:
+                if message_id is None:
+                    raise
+                # Mensagem grande demais para o NOTIFY: publica só o id e cada worker lê do banco
+                if before_reference is not None:
+                    await before_reference()
+                await self.backend.publish({"match_id": match_id, "exclude_user": exclude_user, "message_id": message_id})
+        except Exception as e:
+            self.publish_errors += 1
+            print(f"⚠ Erro ao publicar mensagem do chat; entrega só neste worker: {e!r}")
+            await self.deliver_local(event)
+
+    async def deliver_local(self, event: dict):
+        """Entrega um evento publicado aos sockets deste worker (só enfileira, nunca espera)"""
+        if event.get("type") == "revoke":
+            return
+        match_id = event["match_id"]
+        if match_id not in self.active_connections:
+            return
+        frame = event.get("frame")
+        if frame is None:
+            async with AsyncSessionLocal() as db:
+                message_data = await chat_service.get_broadcast_message_async(db, event["message_id"])
+            if message_data is None:
+                return
+            frame = encode_frame(message_data)
+        exclude_user = event.get("exclude_user")
+        for connection in list(self.active_connections.get(match_id, [])):
+            if exclude_user is not None and connection.user_id == exclude_user:
+                continue
+            try:
+                connection.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Consumidor lento: perde a mensagem e a conexão (o cliente reconecta e recarrega o histórico)
+                self.dropped += 1
+                self.slow_disconnects += 1
+                self._remove(connection)
+                asyncio.create_task(self.close(connection, status.WS_1013_TRY_AGAIN_LATER))
+
+    def stats(self) -> dict:
+        depths = [connection.queue.qsize() for connections in self.active_connections.values() for connection in connections]
+        return {
+            "rooms": len(self.active_connections),
+            "connections": len(depths),
+            "queue_size": self.queue_size,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "send_errors": self.send_errors,
+            "publish_errors": self.publish_errors,
+        }
+
+
+async def get_user_from_websocket_token(token: str, db):
+    """Principal atual (do banco/cache, não dos claims); None se inválido ou desativado"""
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        user = user_service.get_user_by_email(db, email=email)
-        return user
-    except JWTError:
+    user = await resolve_principal_async(token, db, fresh=True)
+    if user is None or not user.is_active:
         return None
+    return user
 
-manager = ConnectionManager()
+manager = ConnectionManager(create_broadcast_backend())
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 @router.get("/rooms", response_model=List[chat_schema.ChatRoom])
 def get_chat_rooms(
+    before_activity: Optional[datetime] = None,
+    before_match_id: Optional[int] = None,
+    limit: int = Query(chat_service.ROOMS_PAGE_DEFAULT, ge=1, le=chat_service.ROOMS_PAGE_MAX),
     db: Session = Depends(get_db),
     current_user: user_schema.User = Depends(get_current_user)
 ):
-    """Retorna todas as salas de chat do usuário"""
-    chats = chat_service.get_user_chats(db, current_user.id)
-    
-    rooms = []
-    for match in chats:
-        # Determina qual é o outro usuário
-        other_user = match.user_a if match.user_b_id == current_user.id else match.user_b
-        
-        # Busca a última mensagem
-        messages = chat_service.get_chat_messages(db, match.id, current_user.id)
-        last_message = messages[-1] if messages else None
-        
-        room = chat_schema.ChatRoom(
-            match_id=match.id,
-            other_user=other_user,
-            last_message=last_message,
-            unread_count=0  # TODO: Implementar contagem de mensagens não lidas
-        )
-        rooms.append(room)
-    
-    return rooms
+    """
+    Salas de chat do usuário, da atividade mais recente para a mais antiga.
+    Próxima página: passe `last_activity_at` e `match_id` do último item em
+    `before_activity` e `before_match_id`.
+    """
+    if (before_activity is None) != (before_match_id is None):
+        raise HTTPException(status_code=400, detail="before_activity and before_match_id must be sent together")
+    return chat_service.get_chat_rooms(db, current_user.id, before_activity, before_match_id, limit)
 
 @router.get("/messages/{match_id}", response_model=List[chat_schema.ChatMessage])
 def get_chat_messages(
     match_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(chat_service.MESSAGES_PAGE_DEFAULT, ge=1, le=chat_service.MESSAGES_PAGE_MAX),
     db: Session = Depends(get_db),
     current_user: user_schema.User = Depends(get_current_user)
 ):
-    """Retorna mensagens de um chat específico"""
-    messages = chat_service.get_chat_messages(db, match_id, current_user.id)
+    """
+    Mensagens de um chat, em ordem crescente. Sem parâmetros, as mais recentes;
+    `before_id` (id da mais antiga recebida) busca as anteriores e `after_id`
+    (id da mais nova) as seguintes.
+    """
+    messages = chat_service.get_chat_messages(db, match_id, current_user.id, before_id, after_id, limit)
     if messages is None:
         raise HTTPException(status_code=404, detail="Chat not found or access denied")
     return messages
@@ -114,56 +228,85 @@ async def websocket_endpoint(
     token: str  # O token virá como query param: .../ws/123?token=XYZ
 ):
 
-    db = SessionLocal() # Cria uma sessão de banco SÓ para esta conexão
+    # Sessão assíncrona SÓ para esta conexão: o I/O de banco não bloqueia o event loop
+    db = AsyncSessionLocal()
+    session = None
     try:
         # 1. AUTENTICAR
-        current_user = get_user_from_websocket_token(token, db)
+        current_user = await get_user_from_websocket_token(token, db)
         if not current_user:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
-        # 2. AUTORIZAR
-        match = chat_service.get_match_by_id_and_user(db, match_id, current_user.id)
+        # 2. AUTORIZAR (uma vez: as mensagens seguintes não repetem a consulta)
+        match = await chat_service.get_match_by_id_and_user_async(db, match_id, current_user.id)
         if not match:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
-        # Conexão autorizada
-        await manager.connect(websocket, match_id, current_user.id)
+        # Conexão autorizada; se o acesso for revogado, o manager fecha o socket na hora
+        connection = await manager.connect(websocket, match_id, current_user.id)
+        session = chat_access.authorize(match_id, current_user.id, on_revoke=lambda: manager.close_revoked(connection))
 
         while True:
-            # Cliente envia: {"content": "Olá!"}
+            # Cliente envia: {"content": "Olá!"} ou {"type": "read", "message_id": 123}
             data = await websocket.receive_text()
             message_data = json.loads(data)
 
-            # 3. PERSISTIR
-            saved_message = chat_service.save_chat_message(
-                db=db,
-                match_id=match_id,
-                sender_id=current_user.id,
-                content=message_data.get("content", "")
-            )
+            # Acesso revogado depois de conectar (match desfeito, usuário desativado)
+            if session.revoked:
+                manager.disconnect(websocket, match_id)
+                await manager.close(connection, status.WS_1008_POLICY_VIOLATION)
+                break
+
+            if message_data.get("type") == "read":
+                # Só em memória; o writer grava em lote (services/read_cursors.py)
+                # Ids fora do INTEGER da coluna são ignorados pelo writer
+                message_id = message_data.get("message_id")
+                if isinstance(message_id, int) and not isinstance(message_id, bool):
+                    read_cursor_writer.mark(match_id, current_user.id, message_id)
+                continue
+
+            # 3. PERSISTIR (só o INSERT; a sessão já foi autorizada)
+            content = chat_service.message_content(message_data.get("content", ""))
+            if CHAT_WRITE_BEHIND:
+                # Id e horário do servidor; gravada em lote logo depois (services/message_writer.py)
+                saved_message = await chat_message_writer.add(AsyncSessionLocal, match_id, current_user.id, content)
+            else:
+                saved_message = await chat_service.insert_chat_message_async(
+                    db=db,
+                    match_id=match_id,
+                    sender_id=current_user.id,
+                    content=content
+                )
 
             if saved_message:
+                # Quem responde leu tudo até aqui
+                read_cursor_writer.mark(match_id, current_user.id, saved_message.id)
+                # Read-your-writes: o próximo GET /chat/messages de quem enviou vai ao primário
+                # (a AsyncSession do socket não passa pelos eventos da RoutingSession)
+                sticky_writes.mark(current_user.id)
+
                 # 4. DISTRIBUIR
-                # Prepara a mensagem com os dados oficiais do banco
-                broadcast_data = {
-                    "type": "message",
-                    "id": saved_message.id,
-                    "sender_id": saved_message.sender_id,
-                    "content": saved_message.content,
-                    "created_at": saved_message.created_at.isoformat(),
-                    "sender_email": current_user.email 
-                }
-
-                # Envia para todos na sala (inclusive quem enviou)
-                await manager.broadcast(broadcast_data, match_id)
+                # Prepara a mensagem com os dados oficiais do banco, codificada uma vez só
+                frame = encode_frame(chat_service.broadcast_payload(saved_message, current_user.email))
+
+                # Envia para todos na sala (inclusive quem enviou). Com o write-behind,
+                # o envio por referência precisa da mensagem já gravada
+                before_reference = (lambda: chat_message_writer.flush(AsyncSessionLocal)) if CHAT_WRITE_BEHIND else None
+                await manager.broadcast(frame, match_id, message_id=saved_message.id, before_reference=before_reference)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket, match_id)
     except Exception as e:
-        print(f"Erro no WebSocket: {e}") # Bom para debug
-        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        manager.disconnect(websocket, match_id)
+        if session is None or not session.revoked:
+            print(f"Erro no WebSocket: {e}") # Bom para debug
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        # Revogado: o manager já fechou o socket, e o receive falha por isso
     finally:
+        if session is not None:
+            chat_access.release(session)
         # Garante que a sessão do banco seja fechada quando o user desconectar
-        db.close()
\ No newline at end of file
+        # (shield: termina mesmo se a task do socket for cancelada no meio)
+        await asyncio.shield(db.close())
\ No newline at end of file
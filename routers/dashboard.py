@@ -0,0 +1,25 @@
+# routers/dashboard.py
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from schemas import dashboard as dashboard_schema, user as user_schema
+from services import dashboard_service
+from routers.auth import get_current_user
+
+router = APIRouter(
+    prefix="/me",
+    tags=["Dashboard"]
+)
+
+@router.get("/dashboard", response_model=dashboard_schema.Dashboard)
+def get_my_dashboard(
+    current_user: Annotated[user_schema.User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    """Perfil, matches e curtidas pendentes (com perfis) em uma só requisição"""
+    dashboard = dashboard_service.get_dashboard(db, current_user.id)
+    if dashboard is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return dashboard
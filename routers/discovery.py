@@ -0,0 +1,45 @@
+# routers/discovery.py
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from schemas import discovery as discovery_schema, user as user_schema
+from services import discovery_service, feed_store
+from routers.auth import get_current_user_fresh
+
+router = APIRouter(
+    prefix="/discovery",
+    tags=["Discovery"]
+)
+
+@router.get("/feed", response_model=discovery_schema.DiscoveryPage)
+def get_discovery_feed(
+    current_user: Annotated[user_schema.User, Depends(get_current_user_fresh)],
+    cursor: Optional[str] = None,
+    limit: int = Query(discovery_service.FEED_PAGE_DEFAULT, ge=1, le=discovery_service.FEED_PAGE_MAX),
+    ranked: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Jogadores do mesmo jogo que você ainda não curtiu, paginados por cursor.
+    Com `ranked=true`, cada página traz os mais compatíveis primeiro.
+    """
+    try:
+        return discovery_service.get_discovery_page(
+            db, current_user.id, current_user.game, cursor=cursor, limit=limit, ranked=ranked
+        )
+    except discovery_service.InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/next", response_model=discovery_schema.NextCards)
+def get_next_cards(
+    current_user: Annotated[user_schema.User, Depends(get_current_user_fresh)],
+    count: int = Query(1, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """Próximas cartas do feed pré-calculado (os mais compatíveis primeiro)"""
+    return feed_store.next_cards(db, current_user.id, current_user.game, count)
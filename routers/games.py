@@ -0,0 +1,19 @@
+# routers/games.py
+from typing import List
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from schemas import game as game_schema
+from services import game_service
+
+router = APIRouter(
+    prefix="/games",
+    tags=["Games"]
+)
+
+@router.get("", response_model=List[game_schema.Game])
+def get_games(response: Response, db: Session = Depends(get_db)):
+    """Catálogo de jogos para o seletor (em cache no servidor e no navegador)"""
+    response.headers["Cache-Control"] = f"public, max-age={int(game_service.GAME_CATALOG_TTL_SECONDS)}"
+    return game_service.get_catalog(db)
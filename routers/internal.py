@@ -0,0 +1,71 @@
+# routers/internal.py
+"""
+Endpoints internos de observabilidade (métricas por worker).
+
+Desligados por padrão: só respondem com INTERNAL_METRICS_TOKEN definida e o
+mesmo valor no header X-Internal-Token. Sem a variável, tudo aqui é 404.
+"""
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from auth.cache import principal_cache
+from database.pool import pool_stats
+from services.candidate_index import candidate_index
+from services.feed_store import feed_store
+from services.read_cursors import read_cursor_writer
+from services.chat_access import chat_access
+from services.message_writer import chat_message_writer
+from routers.chat import manager as chat_manager
+
+INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN", "")
+
+
+def require_internal_access(x_internal_token: Optional[str] = Header(None)):
+    if not INTERNAL_METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_internal_token or not secrets.compare_digest(x_internal_token, INTERNAL_METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["Internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal_access)]
+)
+
+@router.get("/auth/cache")
+def get_auth_cache_stats():
+    """Contadores do cache de usuários autenticados deste worker"""
+    return {"pid": os.getpid(), **principal_cache.stats()}
+
+@router.get("/db/pool")
+def get_db_pool_stats():
+    """Estado e métricas dos pools de conexão deste worker"""
+    return {"pid": os.getpid(), "pools": pool_stats()}
+
+@router.get("/discovery/index")
+def get_candidate_index_stats():
+    """Tamanho e memória do índice de candidatos do feed deste worker"""
+    return {"pid": os.getpid(), **candidate_index.footprint()}
+
+@router.get("/discovery/feeds")
+def get_feed_store_stats():
+    """Feeds pré-calculados deste worker (tamanho, acertos e recálculos)"""
+    return {"pid": os.getpid(), **feed_store.stats()}
+
+@router.get("/chat/read-cursors")
+def get_read_cursor_stats():
+    """Marcações de leitura deste worker (pendentes, recebidas e gravadas)"""
+    return {"pid": os.getpid(), **read_cursor_writer.stats()}
+
+@router.get("/chat/connections")
+def get_chat_connection_stats():
+    """Sockets do chat deste worker: filas de saída, entregas, descartes e sessões autorizadas"""
+    return {"pid": os.getpid(), **chat_manager.stats(), **chat_access.stats()}
+
+@router.get("/chat/messages")
+def get_chat_message_writer_stats():
+    """Write-behind das mensagens do chat deste worker (pendentes, lotes e falhas)"""
+    return {"pid": os.getpid(), **chat_message_writer.stats()}
@@ -1,7 +1,7 @@
 # routers/match.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from database.connection import get_db
 from schemas import match as match_schema, user as user_schema
@@ -21,8 +21,20 @@ def like_user_endpoint(
 ):
     """Curtir um usuário - sistema atômico de matches"""
     result = match_service.like_user(db, current_user.id, target_user_id)
+    if result["status"] == "NOT_FOUND":
+        raise HTTPException(status_code=404, detail=result["message"])
     return result
 
+@router.post("/likes:batch", response_model=match_schema.LikeBatchResponse, response_model_exclude_none=True)
+def like_users_batch_endpoint(
+    batch: match_schema.LikeBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """Curtir vários usuários de uma vez - mesmo resultado por alvo que /like/{id}"""
+    results = match_service.like_users_batch(db, current_user.id, batch.target_user_ids)
+    return {"results": results}
+
 @router.get("/me", response_model=List[match_schema.Match])
 def get_my_matches(
     db: Session = Depends(get_db),
@@ -31,20 +43,34 @@ def get_my_matches(
     """Retorna apenas matches confirmados"""
     return match_service.get_user_matches(db, current_user.id)
 
-@router.get("/likes-sent")
+# Paginação keyset: passe o `like_id` do último item recebido em `after`
+LIKES_PAGE_DEFAULT = 50
+LIKES_PAGE_MAX = 200
+
+@router.get("/likes-sent", response_model=List[match_schema.LikeSent])
 def get_my_likes_sent(
+    after: Optional[int] = None,
+    limit: int = Query(LIKES_PAGE_DEFAULT, ge=1, le=LIKES_PAGE_MAX),
     db: Session = Depends(get_db),
     current_user: user_schema.User = Depends(get_current_user)
 ):
     """Retorna usuários que você curtiu (aguardando resposta)"""
-    likes = match_service.get_user_likes(db, current_user.id)
-    return [{"liked_user_id": like.liked_id, "liked_at": like.created_at} for like in likes]
+    likes = match_service.get_user_likes(db, current_user.id, after=after, limit=limit)
+    return [
+        {"like_id": like.id, "liked_user_id": like.liked_id, "liked_at": like.created_at, "liked_user": like.liked}
+        for like in likes
+    ]
 
-@router.get("/likes-received")
+@router.get("/likes-received", response_model=List[match_schema.LikeReceived])
 def get_my_likes_received(
+    after: Optional[int] = None,
+    limit: int = Query(LIKES_PAGE_DEFAULT, ge=1, le=LIKES_PAGE_MAX),
     db: Session = Depends(get_db),
     current_user: user_schema.User = Depends(get_current_user)
 ):
     """Retorna usuários que curtiram você (você pode curtir de volta)"""
-    likes = match_service.get_user_liked_by(db, current_user.id)
-    return [{"liker_user_id": like.liker_id, "liked_at": like.created_at} for like in likes]
\ No newline at end of file
+    likes = match_service.get_user_liked_by(db, current_user.id, after=after, limit=limit)
+    return [
+        {"like_id": like.id, "liker_user_id": like.liker_id, "liked_at": like.created_at, "liker_user": like.liker}
+        for like in likes
+    ]
\ No newline at end of file
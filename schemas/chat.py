@@ -22,6 +22,8 @@ class ChatRoom(BaseModel):
     match_id: int
     other_user: User
     last_message: Optional[ChatMessage] = None
+    # Última mensagem (ou o match, se a sala está vazia); ordena e pagina a lista
+    last_activity_at: Optional[datetime] = None
     unread_count: int = 0
 
     class Config:
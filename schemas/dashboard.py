@@ -0,0 +1,15 @@
+# schemas/dashboard.py
+from typing import List, Optional
+from pydantic import BaseModel
+from .user import User
+from .match import Match, LikeSent, LikeReceived
+
+# Tudo o que a página do seletor de jogos precisa ao abrir (GET /me/dashboard).
+# Os `*_next` são o `after` para continuar em /matches/likes-sent|received
+class Dashboard(BaseModel):
+    user: User
+    matches: List[Match]
+    likes_sent: List[LikeSent]
+    likes_sent_next: Optional[int] = None
+    likes_received: List[LikeReceived]
+    likes_received_next: Optional[int] = None
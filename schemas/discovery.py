@@ -0,0 +1,14 @@
+# schemas/discovery.py
+from typing import List, Optional
+from pydantic import BaseModel
+from .user import User
+
+# Página do feed de descoberta; passe `next_cursor` para buscar a próxima
+class DiscoveryPage(BaseModel):
+    items: List[User]
+    next_cursor: Optional[str] = None
+
+# Próximas cartas do feed pré-calculado (GET /discovery/next)
+class NextCards(BaseModel):
+    items: List[User]
+    remaining: int
@@ -0,0 +1,10 @@
+# schemas/game.py
+from pydantic import BaseModel
+
+# Jogo do catálogo (seletor de jogos)
+class Game(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        from_attributes = True
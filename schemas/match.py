@@ -1,6 +1,8 @@
 # schemas/match.py
 import enum
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from .user import User # Importe o schema do usuário
 
 class MatchStatus(str, enum.Enum):
@@ -15,4 +17,34 @@ class Match(BaseModel):
     status: MatchStatus
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Curtidas em lote: POST /matches/likes:batch
+LIKES_BATCH_MAX = 100
+
+class LikeBatchRequest(BaseModel):
+    target_user_ids: List[int] = Field(..., min_length=1, max_length=LIKES_BATCH_MAX)
+
+class LikeBatchItem(BaseModel):
+    target_user_id: int
+    status: str
+    message: str
+    like_id: Optional[int] = None
+    match_id: Optional[int] = None
+
+class LikeBatchResponse(BaseModel):
+    results: List[LikeBatchItem]
+
+
+# Curtidas pendentes com o perfil do outro usuário embutido
+class LikeSent(BaseModel):
+    like_id: int
+    liked_user_id: int
+    liked_at: datetime
+    liked_user: User
+
+class LikeReceived(BaseModel):
+    like_id: int
+    liker_user_id: int
+    liked_at: datetime
+    liker_user: User
@@ -7,4 +7,9 @@ class Token(BaseModel):
     token_type: str
 
 class TokenData(BaseModel):
-    email: str | None = None
\ No newline at end of file
+    email: str | None = None
+    user_id: int | None = None
+    game: str | None = None
+    is_active: bool | None = None
+    version: int = 1
+    issued_at: int | None = None
\ No newline at end of file
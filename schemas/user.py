@@ -1,18 +1,22 @@
 # schemas/schemas.py
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import List, Optional
 
 # Esquema para a criação de um usuário
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
     game: Optional[str] = None
+    # Todos os jogos do usuário; o `game` (principal) sempre entra no conjunto
+    games: Optional[List[str]] = None
 
 # Esquema para atualizar dados do usuário
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     is_active: Optional[bool] = None
     game: Optional[str] = None
+    # Substitui o conjunto de jogos; só `game` troca o jogo principal e o acrescenta ao conjunto
+    games: Optional[List[str]] = None
 
 # Esquema para ler/retornar dados do usuário (sem a senha!)
 class User(BaseModel):
@@ -20,6 +24,13 @@ class User(BaseModel):
     email: EmailStr
     is_active: bool
     game: Optional[str] = None
+    games: List[str] = []
+
+    @field_validator("games", mode="before")
+    @classmethod
+    def game_names(cls, games):
+        # Do ORM vem a lista de models.Game; a API expõe só os nomes
+        return [getattr(game, "name", game) for game in games or []]
 
     class Config:
         from_attributes = True # Antigo orm_mode = True
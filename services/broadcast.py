@@ -0,0 +1,180 @@
+# services/broadcast.py
+"""
+Fan-out das mensagens do chat entre workers (pub/sub).
+
+O ConnectionManager (routers/chat.py) guarda só os sockets deste worker. Cada
+mensagem é publicada uma vez no backend; todo worker inscrito (inclusive o
+que publicou) recebe o evento e entrega aos seus sockets locais da sala.
+
+- InMemoryBroadcast: um processo só (desenvolvimento e testes)
+- PostgresBroadcast: LISTEN/NOTIFY em uma conexão asyncpg dedicada por
+  worker; funciona entre workers e entre hosts que usam o mesmo banco
+
+BROADCAST_BACKEND escolhe o backend ("memory" ou "postgres"); por padrão é
+"postgres" quando a DATABASE_URL é Postgres e "memory" caso contrário.
+
+A mensagem vai no evento já serializada ("frame"): é codificada uma vez por
+quem publica e o mesmo frame é enfileirado para todos os sockets da sala, em
+todos os workers. Com orjson instalado a codificação usa ele.
+
+O frame fica em str: no ASGI um frame de texto só aceita str, e o servidor
+(uvicorn) o codifica em UTF-8 a cada envio. Mandar os bytes prontos exigiria
+frames binários, e o cliente (chat.js faz JSON.parse(event.data)) espera
+texto. O que se economiza é a serialização JSON, feita uma vez só.
+"""
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, List, Optional
+import asyncpg
+from sqlalchemy.engine import make_url
+
+try:
+    import orjson
+except ImportError:  # opcional: cai no json da biblioteca padrão
+    orjson = None
+
+# O Postgres recusa payloads de NOTIFY a partir de 8000 bytes
+NOTIFY_PAYLOAD_MAX_BYTES = 7999
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "chat_events")
+BROADCAST_RECONNECT_SECONDS = float(os.getenv("BROADCAST_RECONNECT_SECONDS", 2))
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+def encode_frame(data) -> str:
+    """JSON compacto de um frame do chat; serializado uma vez e o mesmo str vai para todos os envios"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode()
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def encode_event(event: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(event, default=str)
+    return json.dumps(event, separators=(",", ":"), default=str).encode()
+
+
+class PayloadTooLarge(ValueError):
+    """Evento grande demais para o backend (ex: limite do NOTIFY)"""
+
+
+class BroadcastBackend:
+    """Interface: inscrição local de handlers, start/stop da conexão e publish"""
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+
+    def subscribe(self, handler: Handler) -> None:
+        """Registra quem entrega os eventos aos sockets deste worker"""
+        self._handlers.append(handler)
+
+    async def _dispatch(self, event: dict) -> None:
+        for handler in self._handlers:
+            try:
+                await handler(event)
+            except Exception as e:
+                print(f"⚠ Erro ao entregar evento do chat: {e}")
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, event: dict) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBroadcast(BroadcastBackend):
+    """Entrega direta aos handlers do próprio processo"""
+
+    async def publish(self, event: dict) -> None:
+        await self._dispatch(event)
+
+
+class PostgresBroadcast(BroadcastBackend):
+    """
+    LISTEN/NOTIFY: cada worker mantém uma conexão asyncpg escutando o canal e
+    publica com pg_notify pela mesma conexão. Se a conexão cair, reconecta em
+    segundo plano; eventos publicados nesse intervalo são perdidos (o
+    histórico continua no banco).
+    """
+
+    def __init__(self, dsn: str, channel: str = BROADCAST_CHANNEL):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._connection = None
+        # asyncpg não aceita operações concorrentes na mesma conexão
+        self._lock = asyncio.Lock()
+        self._tasks: set = set()
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Conecta e escuta o canal; se falhar, continua tentando em segundo plano"""
+        self._stopping = False
+        try:
+            await self._connect()
+        except Exception:
+            self._spawn(self._reconnect())
+            raise
+
+    async def _connect(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(self.channel, self._on_notify)
+        connection.add_termination_listener(self._on_terminated)
+        self._connection = connection
+
+    async def stop(self) -> None:
+        self._stopping = True
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            await connection.close()
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def publish(self, event: dict) -> None:
+        payload = encode_event(event)
+        if len(payload) > NOTIFY_PAYLOAD_MAX_BYTES:
+            raise PayloadTooLarge(f"{len(payload)} bytes")
+        if self._connection is None:
+            raise RuntimeError("PostgresBroadcast não foi iniciado")
+        async with self._lock:
+            await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, payload.decode())
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._spawn(self._dispatch(json.loads(payload)))
+
+    def _on_terminated(self, connection) -> None:
+        if not self._stopping:
+            self._connection = None
+            self._spawn(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(BROADCAST_RECONNECT_SECONDS)
+            try:
+                await self._connect()
+                return
+            except Exception as e:
+                print(f"⚠ Erro ao reconectar o LISTEN do chat: {e}")
+
+
+def _asyncpg_dsn(url: str) -> str:
+    """DSN do asyncpg a partir da URL do SQLAlchemy (sem o driver)"""
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+def create_broadcast_backend(database_url: Optional[str] = None, kind: Optional[str] = None) -> BroadcastBackend:
+    database_url = database_url or os.getenv("DATABASE_URL", "")
+    is_postgres = make_url(database_url).get_backend_name() == "postgresql" if database_url else False
+    kind = kind or os.getenv("BROADCAST_BACKEND") or ("postgres" if is_postgres else "memory")
+    if kind == "postgres":
+        return PostgresBroadcast(_asyncpg_dsn(database_url))
+    if kind == "memory":
+        return InMemoryBroadcast()
+    raise ValueError(f"BROADCAST_BACKEND desconhecido: {kind}")
@@ -0,0 +1,327 @@
+# services/candidate_index.py
+"""
+Índice em memória (por processo) dos candidatos do feed de descoberta.
+
+- Por jogo (games.id): array('i') ordenado com os ids dos usuários ativos.
+- Por usuário: array('i') com os ids dos seus jogos e array('i') ordenado com
+  os ids que ele já curtiu ou com quem tem match (o que o feed exclui).
+
+Uma página de candidatos sai de um bisect em cada array dos jogos do usuário,
+intercalando (merge) os arrays e pulando os ids excluídos, sem consultar o
+banco. O índice é montado uma vez no startup (warm) e atualizado
+incrementalmente pelos serviços (create_user, update_user, like_user).
+Escritas feitas em outros workers entram pelo refresh a cada
+CANDIDATE_INDEX_REFRESH_SECONDS, que lê só o que mudou: curtidas e matches
+com id acima do último visto e usuários com updated_at recente (com uma
+margem de CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS para transações que
+demoraram a commitar). Até lá o feed ainda confere as exclusões ao carregar
+os perfis da página, e um usuário que este worker não conhece (ou cujo jogo
+principal não bate com o do índice) é servido pelo banco e indexado na hora.
+"""
+import asyncio
+import heapq
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from typing import Iterable, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import models
+
+CANDIDATE_INDEX_ENABLED = os.getenv("CANDIDATE_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+CANDIDATE_INDEX_REFRESH_SECONDS = float(os.getenv("CANDIDATE_INDEX_REFRESH_SECONDS", 60))
+CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS = float(os.getenv("CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS", 60))
+
+# Linhas por lote ao ler do banco no warm
+_WARM_BATCH_SIZE = 10000
+
+
+def _sorted_insert(values: array, value: int) -> None:
+    position = bisect_left(values, value)
+    if position == len(values) or values[position] != value:
+        values.insert(position, value)
+
+def _sorted_remove(values: array, value: int) -> None:
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        del values[position]
+
+def _iter_after(values: array, after: Optional[int]):
+    """Itera o array ordenado a partir do primeiro valor maior que `after`"""
+    start = bisect_right(values, after) if after is not None else 0
+    for position in range(start, len(values)):
+        yield values[position]
+
+def _sorted_contains(values: array, value: int) -> bool:
+    position = bisect_left(values, value)
+    return position < len(values) and values[position] == value
+
+
+class CandidateIndex:
+    """Jogo → ids ativos e usuário → ids excluídos, em arrays ordenados"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._games: dict = {}
+        self._user_games: dict = {}
+        self._excluded: dict = {}
+        # Mudanças recebidas durante uma leitura do banco; reaplicadas no fim
+        self._pending: Optional[list] = None
+        # Até onde o banco já foi lido (refresh incremental)
+        self._last_like_id = 0
+        self._last_match_id = 0
+        self._users_since = None
+        self.ready = False
+        self.refreshes = 0
+
+    # --- Atualizações incrementais (chamadas pelos serviços) ---
+
+    def user_changed(self, user_id: int, previous_game_ids: Iterable[int], game_ids: Iterable[int], is_active: bool) -> None:
+        """Usuário criado/atualizado: sai dos jogos anteriores e entra nos atuais se estiver ativo"""
+        previous_game_ids, game_ids = list(previous_game_ids), sorted(game_ids)
+        with self._lock:
+            if not self._tracking():
+                return
+            if self._pending is not None:
+                self._pending.append(("user", user_id, previous_game_ids, game_ids, is_active))
+            self._apply_user(user_id, previous_game_ids, game_ids, is_active)
+
+    def liked(self, liker_id: int, liked_ids: Iterable[int]) -> None:
+        """Curtidas gravadas: os alvos saem do feed de quem curtiu"""
+        liked_ids = list(liked_ids)
+        with self._lock:
+            if not self._tracking():
+                return
+            if self._pending is not None:
+                self._pending.append(("liked", liker_id, liked_ids))
+            self._apply_liked(liker_id, liked_ids)
+
+    def _tracking(self) -> bool:
+        # Antes do primeiro warm (ou com o índice desligado) não há o que manter
+        return self.ready or self._pending is not None
+
+    def _apply_user(self, user_id, previous_game_ids, game_ids, is_active):
+        for game_id in set(previous_game_ids) | set(game_ids) | set(self._user_games.get(user_id, ())):
+            if game_id in self._games:
+                _sorted_remove(self._games[game_id], user_id)
+                if not self._games[game_id]:
+                    del self._games[game_id]
+        if game_ids:
+            self._user_games[user_id] = array("i", game_ids)
+        else:
+            self._user_games.pop(user_id, None)
+        if is_active:
+            for game_id in game_ids:
+                _sorted_insert(self._games.setdefault(game_id, array("i")), user_id)
+
+    def _apply_liked(self, liker_id, liked_ids):
+        excluded = self._excluded.setdefault(liker_id, array("i"))
+        for liked_id in liked_ids:
+            _sorted_insert(excluded, liked_id)
+
+    # --- Leitura ---
+
+    def user_games(self, user_id: int) -> Optional[List[int]]:
+        """Ids dos jogos do usuário no índice; None se este worker ainda não o conhece"""
+        with self._lock:
+            game_ids = self._user_games.get(user_id)
+            return list(game_ids) if game_ids is not None else None
+
+    def page(self, user_id: int, after_id: Optional[int], limit: int) -> List[int]:
+        """
+        Até `limit` ids que jogam algum jogo em comum com o usuário, depois de
+        `after_id`, sem o próprio usuário e os excluídos
+        """
+        with self._lock:
+            arrays = [self._games[g] for g in self._user_games.get(user_id, ()) if g in self._games]
+            excluded = self._excluded.get(user_id, array("i"))
+            # Um iterador por jogo a partir do cursor, intercalados em ordem de id
+            ranges = [_iter_after(ids, after_id) for ids in arrays]
+            page, previous = [], None
+            for candidate in heapq.merge(*ranges):
+                if len(page) >= limit:
+                    break
+                # O mesmo usuário aparece uma vez por jogo em comum
+                if candidate == previous:
+                    continue
+                previous = candidate
+                if candidate != user_id and not _sorted_contains(excluded, candidate):
+                    page.append(candidate)
+            return page
+
+    # --- Construção a partir do banco ---
+
+    def warm(self, db: Session) -> None:
+        """Constrói o índice inteiro a partir do banco e passa a servir o feed"""
+        with self._lock:
+            self._pending = []
+        try:
+            watermarks = self._watermarks(db)
+            games, user_games, excluded = self._load(db)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._games, self._user_games, self._excluded = games, user_games, excluded
+            self._last_like_id, self._last_match_id, self._users_since = watermarks
+            self._replay_pending()
+            self.ready = True
+
+    def refresh(self, db: Session) -> None:
+        """Aplica só o que mudou no banco desde a última leitura (escritas de outros workers)"""
+        if not self.ready:
+            self.warm(db)
+            return
+        with self._lock:
+            self._pending = []
+            last_like_id, last_match_id, users_since = self._last_like_id, self._last_match_id, self._users_since
+        try:
+            watermarks = self._watermarks(db)
+            users = self._load_changed_users(db, users_since)
+            likes = db.execute(
+                select(models.Like.liker_id, models.Like.liked_id).where(models.Like.id > last_like_id)
+            ).all()
+            matches = db.execute(
+                select(models.Match.user_a_id, models.Match.user_b_id).where(models.Match.id > last_match_id)
+            ).all()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for user_id, (game_ids, is_active) in users.items():
+                self._apply_user(user_id, [], game_ids, is_active)
+            for liker_id, liked_id in likes:
+                self._apply_liked(liker_id, [liked_id])
+            for user_a_id, user_b_id in matches:
+                self._apply_liked(user_a_id, [user_b_id])
+                self._apply_liked(user_b_id, [user_a_id])
+            self._last_like_id, self._last_match_id, self._users_since = watermarks
+            # Mudanças locais feitas durante a leitura são mais novas que ela
+            self._replay_pending()
+            self.refreshes += 1
+
+    def _replay_pending(self) -> None:
+        pending, self._pending = self._pending, None
+        for change in pending:
+            if change[0] == "user":
+                self._apply_user(*change[1:])
+            else:
+                self._apply_liked(*change[1:])
+
+    @staticmethod
+    def _watermarks(db: Session):
+        """Maior id de curtida/match e início da janela de usuários alterados, lidos antes dos dados"""
+        last_like_id = db.scalar(select(func.max(models.Like.id))) or 0
+        last_match_id = db.scalar(select(func.max(models.Match.id))) or 0
+        users_since = db.scalar(select(func.max(models.User.updated_at)))
+        if users_since is not None:
+            users_since -= timedelta(seconds=CANDIDATE_INDEX_REFRESH_OVERLAP_SECONDS)
+        return last_like_id, last_match_id, users_since
+
+    @staticmethod
+    def _load_changed_users(db: Session, since) -> dict:
+        """user_id → (ids dos jogos, ativo) dos usuários alterados desde `since`"""
+        query = select(models.User.id, models.User.is_active)
+        if since is not None:
+            query = query.where(models.User.updated_at >= since)
+        users = {user_id: ([], is_active) for user_id, is_active in db.execute(query)}
+        ids = sorted(users)
+        for start in range(0, len(ids), _WARM_BATCH_SIZE):
+            memberships = db.execute(
+                select(models.UserGame.user_id, models.UserGame.game_id)
+                .where(models.UserGame.user_id.in_(ids[start:start + _WARM_BATCH_SIZE]))
+                .order_by(models.UserGame.user_id, models.UserGame.game_id)
+            )
+            for user_id, game_id in memberships:
+                users[user_id][0].append(game_id)
+        return users
+
+    @staticmethod
+    def _load(db: Session):
+        games, user_games, excluded = {}, {}, {}
+
+        memberships = db.execute(
+            select(models.UserGame.user_id, models.UserGame.game_id, models.User.is_active)
+            .join(models.User, models.User.id == models.UserGame.user_id)
+            .order_by(models.UserGame.user_id, models.UserGame.game_id)
+            .execution_options(yield_per=_WARM_BATCH_SIZE)
+        )
+        for user_id, game_id, is_active in memberships:
+            user_games.setdefault(user_id, array("i")).append(game_id)
+            if is_active:
+                # Ordenado por usuário: append mantém cada array de jogo ordenado
+                games.setdefault(game_id, array("i")).append(user_id)
+
+        likes = db.execute(
+            select(models.Like.liker_id, models.Like.liked_id)
+            .order_by(models.Like.liker_id, models.Like.liked_id)
+            .execution_options(yield_per=_WARM_BATCH_SIZE)
+        )
+        for liker_id, liked_id in likes:
+            excluded.setdefault(liker_id, array("i")).append(liked_id)
+
+        # Matches sem curtida correspondente (dados antigos) também saem do feed
+        matches = db.execute(
+            select(models.Match.user_a_id, models.Match.user_b_id)
+            .execution_options(yield_per=_WARM_BATCH_SIZE)
+        )
+        for user_a_id, user_b_id in matches:
+            for owner, other in ((user_a_id, user_b_id), (user_b_id, user_a_id)):
+                _sorted_insert(excluded.setdefault(owner, array("i")), other)
+
+        return games, user_games, excluded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._games.clear()
+            self._user_games.clear()
+            self._excluded.clear()
+            self._pending = None
+            self._last_like_id = self._last_match_id = 0
+            self._users_since = None
+            self.ready = False
+            self.refreshes = 0
+
+    def footprint(self) -> dict:
+        """Tamanho do índice e memória aproximada (arrays + dicionários)"""
+        with self._lock:
+            game_arrays = sum(sys.getsizeof(ids) for ids in self._games.values())
+            user_game_arrays = sum(sys.getsizeof(ids) for ids in self._user_games.values())
+            excluded_arrays = sum(sys.getsizeof(ids) for ids in self._excluded.values())
+            dicts = sys.getsizeof(self._games) + sys.getsizeof(self._user_games) + sys.getsizeof(self._excluded)
+            return {
+                "ready": self.ready,
+                "refreshes": self.refreshes,
+                "games": len(self._games),
+                "indexed_users": len(self._user_games),
+                "excluded_pairs": sum(len(ids) for ids in self._excluded.values()),
+                "bytes": game_arrays + user_game_arrays + excluded_arrays + dicts,
+            }
+
+
+candidate_index = CandidateIndex()
+
+
+def refresh_candidate_index(session_factory) -> None:
+    """Monta o índice global (primeira vez) ou aplica as mudanças, com uma sessão nova"""
+    with session_factory() as db:
+        candidate_index.refresh(db)
+
+async def keep_candidate_index_warm(session_factory, interval: float = CANDIDATE_INDEX_REFRESH_SECONDS):
+    """
+    Tarefa de fundo do lifespan: monta o índice no startup e depois aplica as
+    mudanças a cada `interval` segundos. Se o warm falhar, o feed continua
+    indo ao banco e a próxima rodada tenta montar de novo.
+    """
+    while True:
+        try:
+            await run_in_threadpool(refresh_candidate_index, session_factory)
+        except Exception as e:
+            print(f"⚠ Erro ao montar o índice de candidatos: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,118 @@
+# services/chat_access.py
+"""
+Sessões de chat já autorizadas (um WebSocket aberto = uma sessão).
+
+O WebSocket confere que o usuário faz parte do match uma vez, ao conectar;
+depois disso cada mensagem é só o INSERT. Para a autorização não ficar
+velha, quem muda o acesso (desativar o usuário, desfazer um match) chama
+chat_access.revoke: as sessões deste worker são marcadas na hora e o evento
+vai pelo pub/sub do chat (services/broadcast.py) para os outros workers. O
+callback `on_revoke` de cada sessão revogada (o socket sai das entregas e é
+fechado) roda no event loop em que ela foi autorizada.
+
+revoke pode ser chamado de código síncrono (threadpool): a publicação é
+agendada no event loop registrado em bind (lifespan). Sem bind, só as
+sessões deste worker são revogadas.
+"""
+import asyncio
+import threading
+from typing import Callable, Optional
+from services.broadcast import BroadcastBackend
+
+
+class AuthorizedSession:
+    """Um socket autorizado a escrever em um match"""
+
+    def __init__(self, match_id: int, user_id: int, on_revoke: Optional[Callable[[], None]] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.match_id = match_id
+        self.user_id = user_id
+        self.revoked = False
+        self.on_revoke = on_revoke
+        self.loop = loop
+
+
+class ChatAccess:
+    """Sessões autorizadas deste worker, por usuário, e revogação delas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: dict = {}
+        self._backend: Optional[BroadcastBackend] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.revocations = 0
+
+    def bind(self, backend: BroadcastBackend, loop: asyncio.AbstractEventLoop) -> None:
+        """Recebe e publica revogações pelo backend de pub/sub do chat"""
+        if self._backend is not backend:
+            backend.subscribe(self._on_event)
+        self._backend, self._loop = backend, loop
+
+    def authorize(self, match_id: int, user_id: int,
+                  on_revoke: Optional[Callable[[], None]] = None) -> AuthorizedSession:
+        """
+        Registra um socket cuja participação no match já foi conferida.
+        `on_revoke` é chamado uma vez, no event loop atual, se a sessão for revogada.
+        """
+        loop = asyncio.get_running_loop() if on_revoke is not None else None
+        session = AuthorizedSession(match_id, user_id, on_revoke, loop)
+        with self._lock:
+            self._sessions.setdefault(user_id, set()).add(session)
+        return session
+
+    def release(self, session: AuthorizedSession) -> None:
+        with self._lock:
+            sessions = self._sessions.get(session.user_id)
+            if sessions is not None:
+                sessions.discard(session)
+                if not sessions:
+                    del self._sessions[session.user_id]
+
+    def revoke(self, user_id: Optional[int] = None, match_id: Optional[int] = None) -> None:
+        """Revoga as sessões do usuário (todas ou só as do match) ou todas as de um match, em todos os workers"""
+        event = {"type": "revoke", "user_id": user_id, "match_id": match_id}
+        self._apply(event)
+        backend, loop = self._backend, self._loop
+        if backend is not None and loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(lambda: loop.create_task(self._publish(backend, event)))
+
+    async def _publish(self, backend: BroadcastBackend, event: dict) -> None:
+        try:
+            await backend.publish(event)
+        except Exception as e:
+            print(f"⚠ Erro ao publicar revogação do chat: {e}")
+
+    async def _on_event(self, event: dict) -> None:
+        if event.get("type") == "revoke":
+            self._apply(event)
+
+    def _apply(self, event: dict) -> None:
+        user_id, match_id = event.get("user_id"), event.get("match_id")
+        revoked = []
+        with self._lock:
+            if user_id is not None:
+                candidates = list(self._sessions.get(user_id, ()))
+            else:
+                candidates = [session for sessions in self._sessions.values() for session in sessions]
+            for session in candidates:
+                if match_id is None or session.match_id == match_id:
+                    if not session.revoked:
+                        session.revoked = True
+                        self.revocations += 1
+                        revoked.append(session)
+        # Fora do lock; revoke pode vir de uma thread do threadpool
+        for session in revoked:
+            if session.on_revoke is not None and not session.loop.is_closed():
+                session.loop.call_soon_threadsafe(session.on_revoke)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = sum(len(sessions) for sessions in self._sessions.values())
+        return {"sessions": sessions, "revocations": self.revocations}
+
+
+chat_access = ChatAccess()
@@ -1,77 +1,251 @@
 # services/chat_service.py
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, aliased, contains_eager, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, case, func
 from database import models
+from database.routing import replica_read
 from datetime import datetime
+from typing import Optional
 
-def get_chat_messages(db: Session, match_id: int, user_id: int):
-    """Busca mensagens de um chat específico, verificando se o usuário tem acesso"""
-    
-    # Verifica se o usuário pertence ao match
-    match = db.query(models.Match).filter(
+# Paginação de /chat/rooms por última atividade
+ROOMS_PAGE_DEFAULT = 50
+ROOMS_PAGE_MAX = 200
+
+# Paginação do histórico (keyset por id)
+MESSAGES_PAGE_DEFAULT = 50
+MESSAGES_PAGE_MAX = 200
+
+# --- Consultas compartilhadas entre as versões síncrona e assíncrona ---
+
+def _matched_membership_query(match_id: int, user_id: int):
+    """Match confirmado do qual o usuário faz parte"""
+    return select(models.Match).where(
+        models.Match.id == match_id,
+        models.Match.status == models.MatchStatus.MATCHED,
+        (models.Match.user_a_id == user_id) | (models.Match.user_b_id == user_id)
+    ).limit(1)
+
+def _chat_messages_query(match_id: int, before_id: Optional[int], after_id: Optional[int], limit: int):
+    """
+    Uma página do histórico pelo índice (match_id, id). Com `after_id`, as
+    `limit` seguintes; senão as `limit` mais recentes (antes de `before_id`,
+    se vier). A consulta desce do fim quando não há `after_id`; quem chama
+    devolve a página em ordem crescente.
+    """
+    query = select(models.ChatMessage).where(
+        models.ChatMessage.match_id == match_id
+    ).options(selectinload(models.ChatMessage.sender).selectinload(models.User.games))
+    if before_id is not None:
+        query = query.where(models.ChatMessage.id < before_id)
+    if after_id is not None:
+        return query.where(models.ChatMessage.id > after_id).order_by(models.ChatMessage.id.asc()).limit(limit)
+    return query.order_by(models.ChatMessage.id.desc()).limit(limit)
+
+def _ascending(messages, after_id: Optional[int]):
+    return list(messages) if after_id is not None else list(reversed(messages))
+
+def _user_chats_query(user_id: int):
+    return select(models.Match).where(
         and_(
-            models.Match.id == match_id,
-            models.Match.status == models.MatchStatus.MATCHED,
-            (models.Match.user_a_id == user_id) | (models.Match.user_b_id == user_id)
+            (models.Match.user_a_id == user_id) | (models.Match.user_b_id == user_id),
+            models.Match.status == models.MatchStatus.MATCHED
         )
-    ).first()
-    
+    )
+
+def _chat_rooms_query(user_id: int, before_activity: Optional[datetime], before_match_id: Optional[int], limit: int):
+    """
+    Salas do usuário com o outro usuário e a última mensagem, em uma consulta,
+    da atividade mais recente para a mais antiga (keyset por atividade, match_id).
+
+    A última mensagem de cada sala é uma subconsulta correlacionada com
+    LIMIT 1 sobre o índice (match_id, created_at): equivale a um LATERAL JOIN,
+    lê uma entrada do índice por sala e funciona no Postgres e no SQLite.
+    """
+    other_user_id = case(
+        (models.Match.user_a_id == user_id, models.Match.user_b_id),
+        else_=models.Match.user_a_id
+    )
+    last_message_id = select(models.ChatMessage.id).where(
+        models.ChatMessage.match_id == models.Match.id
+    ).order_by(
+        models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()
+    ).limit(1).correlate(models.Match).scalar_subquery()
+    rooms = select(
+        models.Match.id.label("match_id"),
+        models.Match.created_at.label("matched_at"),
+        other_user_id.label("other_user_id"),
+        last_message_id.label("last_message_id")
+    ).where(
+        (models.Match.user_a_id == user_id) | (models.Match.user_b_id == user_id),
+        models.Match.status == models.MatchStatus.MATCHED
+    ).subquery()
+
+    sender = aliased(models.User)
+    # Sala sem mensagens conta a partir do match
+    last_activity = func.coalesce(models.ChatMessage.created_at, rooms.c.matched_at)
+    query = select(
+        rooms.c.match_id, last_activity.label("last_activity_at"), models.User, models.ChatMessage
+    ).join(
+        models.User, models.User.id == rooms.c.other_user_id
+    ).outerjoin(
+        models.ChatMessage, models.ChatMessage.id == rooms.c.last_message_id
+    ).outerjoin(
+        sender, sender.id == models.ChatMessage.sender_id
+    ).options(
+        selectinload(models.User.games),
+        contains_eager(models.ChatMessage.sender.of_type(sender)).selectinload(sender.games)
+    )
+    if before_activity is not None:
+        query = query.where(or_(
+            last_activity < before_activity,
+            and_(last_activity == before_activity, rooms.c.match_id < before_match_id)
+        ))
+    return query.order_by(last_activity.desc(), rooms.c.match_id.desc()).limit(limit)
+
+def _unread_counts_query(user_id: int, match_ids):
+    """
+    Não lidas de várias salas em uma agregação: mensagens do outro usuário
+    depois do cursor de leitura (sem cursor, todas). Cada sala é um intervalo
+    no índice (match_id, id).
+    """
+    cursor = models.ChatReadCursor
+    return select(
+        models.ChatMessage.match_id, func.count()
+    ).outerjoin(
+        cursor, and_(cursor.match_id == models.ChatMessage.match_id, cursor.user_id == user_id)
+    ).where(
+        models.ChatMessage.match_id.in_(match_ids),
+        models.ChatMessage.id > func.coalesce(cursor.last_read_message_id, 0),
+        models.ChatMessage.sender_id != user_id
+    ).group_by(models.ChatMessage.match_id)
+
+def _chat_rooms(rows, unread_counts):
+    return [
+        {
+            "match_id": match_id,
+            "last_activity_at": last_activity_at,
+            "other_user": other_user,
+            "last_message": last_message,
+            "unread_count": unread_counts.get(match_id, 0),
+        }
+        for match_id, last_activity_at, other_user, last_message in rows
+    ]
+
+@replica_read
+def get_chat_messages(db: Session, match_id: int, user_id: int, before_id: Optional[int] = None,
+                      after_id: Optional[int] = None, limit: int = MESSAGES_PAGE_DEFAULT):
+    """Busca uma página de mensagens de um chat, verificando se o usuário tem acesso"""
+
+    # Verifica se o usuário pertence ao match
+    match = db.scalars(_matched_membership_query(match_id, user_id)).first()
+
     if not match:
         return None
-    
-    # Busca as mensagens do chat
-    messages = db.query(models.ChatMessage).filter(
-        models.ChatMessage.match_id == match_id
-    ).order_by(models.ChatMessage.created_at.asc()).all()
-    
-    return messages
+
+    # Busca as mensagens do chat (em ordem crescente de id)
+    return _ascending(db.scalars(_chat_messages_query(match_id, before_id, after_id, limit)).all(), after_id)
 
 def save_chat_message(db: Session, match_id: int, sender_id: int, content: str):
     """Salva uma mensagem no chat"""
-    
+
     # Verifica se o usuário pertence ao match
-    match = db.query(models.Match).filter(
-        and_(
-            models.Match.id == match_id,
-            models.Match.status == models.MatchStatus.MATCHED,
-            (models.Match.user_a_id == sender_id) | (models.Match.user_b_id == sender_id)
-        )
-    ).first()
-    
+    match = db.scalars(_matched_membership_query(match_id, sender_id)).first()
+
     if not match:
         return None
-    
+
     # Cria a mensagem
     message = models.ChatMessage(
         match_id=match_id,
         sender_id=sender_id,
         content=content
     )
-    
+
     db.add(message)
     db.commit()
     db.refresh(message)
-    
+
     return message
 
+def message_content(raw) -> str:
+    """Conteúdo vindo do cliente, pronto para gravar: texto e sem NUL (o Postgres recusa NUL em text)"""
+    content = raw if isinstance(raw, str) else str(raw)
+    return content.replace("\x00", "")
+
+def broadcast_payload(message: models.ChatMessage, sender_email: str) -> dict:
+    """Mensagem como é enviada aos sockets da sala"""
+    return {
+        "type": "message",
+        "id": message.id,
+        "sender_id": message.sender_id,
+        "content": message.content,
+        "created_at": message.created_at.isoformat(),
+        "sender_email": sender_email
+    }
+
 def get_user_chats(db: Session, user_id: int):
     """Retorna todos os chats (matches) do usuário"""
-    matches = db.query(models.Match).filter(
-        and_(
-            (models.Match.user_a_id == user_id) | (models.Match.user_b_id == user_id),
-            models.Match.status == models.MatchStatus.MATCHED
-        )
-    ).all()
-    
-    return matches
+    return db.scalars(_user_chats_query(user_id)).all()
+
+@replica_read
+def get_unread_counts(db: Session, user_id: int, match_ids) -> dict:
+    """match_id → mensagens não lidas (salas sem não lidas ficam de fora)"""
+    if not match_ids:
+        return {}
+    return dict(db.execute(_unread_counts_query(user_id, match_ids)).all())
+
+@replica_read
+def get_chat_rooms(db: Session, user_id: int, before_activity: Optional[datetime] = None,
+                   before_match_id: Optional[int] = None, limit: int = ROOMS_PAGE_DEFAULT):
+    """Uma página de salas (outro usuário, última mensagem e não lidas), mais recentes primeiro"""
+    rows = db.execute(_chat_rooms_query(user_id, before_activity, before_match_id, limit)).all()
+    return _chat_rooms(rows, get_unread_counts(db, user_id, [row.match_id for row in rows]))
 
 def get_match_by_id_and_user(db: Session, match_id: int, user_id: int):
     """
-    Verifica se um match existe, está 'MATCHED' e se o usuário 
+    Verifica se um match existe, está 'MATCHED' e se o usuário
     especificado faz parte dele.
     """
-    return db.query(models.Match).filter(
-        models.Match.id == match_id,
-        models.Match.status == models.MatchStatus.MATCHED,
-        (models.Match.user_a_id == user_id) | (models.Match.user_b_id == user_id)
-    ).first()
+    return db.scalars(_matched_membership_query(match_id, user_id)).first()
+
+# --- Versões assíncronas (AsyncSession), para rotas que rodam no event loop ---
+
+async def save_chat_message_async(db: AsyncSession, match_id: int, sender_id: int, content: str):
+    """Versão assíncrona de save_chat_message"""
+    match = (await db.scalars(_matched_membership_query(match_id, sender_id))).first()
+    if not match:
+        return None
+    return await insert_chat_message_async(db, match_id, sender_id, content)
+
+async def insert_chat_message_async(db: AsyncSession, match_id: int, sender_id: int, content: str):
+    """
+    Só o INSERT, sem conferir o match: para um socket já autorizado
+    (services/chat_access.py), que é revogado se o acesso mudar.
+    """
+    message = models.ChatMessage(
+        match_id=match_id,
+        sender_id=sender_id,
+        content=content
+    )
+    db.add(message)
+    # expire_on_commit=False: id e created_at já vêm do flush, sem refresh
+    # (que abriria outra transação e seguraria a conexão entre mensagens)
+    await db.commit()
+    return message
+
+async def get_broadcast_message_async(db: AsyncSession, message_id: int):
+    """Relê uma mensagem publicada só pelo id (evento grande demais para o pub/sub)"""
+    row = (await db.execute(
+        select(models.ChatMessage, models.User.email)
+        .join(models.User, models.User.id == models.ChatMessage.sender_id)
+        .where(models.ChatMessage.id == message_id)
+    )).first()
+    return broadcast_payload(*row) if row else None
+
+async def get_user_chats_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_user_chats"""
+    return (await db.scalars(_user_chats_query(user_id))).all()
+
+async def get_match_by_id_and_user_async(db: AsyncSession, match_id: int, user_id: int):
+    """Versão assíncrona de get_match_by_id_and_user"""
+    return (await db.scalars(_matched_membership_query(match_id, user_id))).first()
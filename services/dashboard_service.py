@@ -0,0 +1,62 @@
+# services/dashboard_service.py
+"""
+Painel da página do seletor de jogos: perfil, matches e curtidas pendentes em
+uma única resposta, com uma única sessão.
+
+Cada lista sai de uma consulta; os perfis de todos os usuários citados
+(incluindo o próprio) vêm juntos em uma só consulta IN e são montados na
+resposta a partir dela, sem lazy load de match.user_a/user_b por item.
+"""
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from database import models
+from database.routing import replica_read
+from . import match_service
+
+# Curtidas de cada lista no painel; o restante vem paginado pelos endpoints de likes
+DASHBOARD_LIKES_LIMIT = 200
+
+
+def _next_after(likes, limit: int) -> Optional[int]:
+    """Cursor para continuar a listagem, se a página veio cheia"""
+    return likes[-1].id if len(likes) == limit else None
+
+@replica_read
+def get_dashboard(db: Session, user_id: int, likes_limit: int = DASHBOARD_LIKES_LIMIT) -> Optional[dict]:
+    # Sem os perfis por listagem: eles vêm todos juntos logo abaixo
+    matches = match_service.get_user_matches(db, user_id, with_profiles=False)
+    likes_sent = match_service.get_user_likes(db, user_id, limit=likes_limit, with_profiles=False)
+    likes_received = match_service.get_user_liked_by(db, user_id, limit=likes_limit, with_profiles=False)
+
+    user_ids = {user_id}
+    user_ids.update(match.user_a_id for match in matches)
+    user_ids.update(match.user_b_id for match in matches)
+    user_ids.update(like.liked_id for like in likes_sent)
+    user_ids.update(like.liker_id for like in likes_received)
+    users = {
+        user.id: user
+        for user in db.scalars(
+            select(models.User).where(models.User.id.in_(user_ids)).options(selectinload(models.User.games))
+        )
+    }
+    if user_id not in users:
+        return None
+
+    return {
+        "user": users[user_id],
+        "matches": [
+            {"id": match.id, "user_a": users[match.user_a_id], "user_b": users[match.user_b_id], "status": match.status}
+            for match in matches
+        ],
+        "likes_sent": [
+            {"like_id": like.id, "liked_user_id": like.liked_id, "liked_at": like.created_at, "liked_user": users[like.liked_id]}
+            for like in likes_sent
+        ],
+        "likes_sent_next": _next_after(likes_sent, likes_limit),
+        "likes_received": [
+            {"like_id": like.id, "liker_user_id": like.liker_id, "liked_at": like.created_at, "liker_user": users[like.liker_id]}
+            for like in likes_received
+        ],
+        "likes_received_next": _next_after(likes_received, likes_limit),
+    }
@@ -0,0 +1,274 @@
+# services/discovery_service.py
+"""
+Feed de descoberta: jogadores com algum jogo em comum com o usuário
+(user_games) que ele ainda não curtiu nem deu match, paginados por keyset
+(users.id). A exclusão é feita no SQL e cada página custa uma consulta
+limitada, não importa o tamanho do jogo. O cursor fica amarrado ao jogo
+principal do usuário.
+
+Com o índice em memória pronto (services/candidate_index.py), os ids da página
+saem do índice e o banco só carrega esses perfis pela chave primária. Se o
+índice deste worker ainda não conhece o usuário, ou o jogo principal dele não
+está entre os jogos indexados (cadastro ou troca feitos em outro worker), a
+página sai do banco e o usuário é indexado na hora.
+
+Com ranked=True os candidatos são ranqueados (services/ranking.py) em janelas
+de até DISCOVERY_RANKING_WINDOW ids. Cada página traz os próximos `limit` da
+janela em ordem de score; o cursor guarda a janela (início e fim), o instante
+do ranking e o (score, id) do último servido, então a janela inteira é
+servida, sem repetir nem pular ninguém, antes de passar para a próxima.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import select, exists, and_, or_
+from sqlalchemy.orm import Session, aliased, selectinload
+from database import models
+from database.routing import replica_read
+from schemas import user as user_schema
+from .candidate_index import candidate_index
+from . import game_service, ranking
+
+FEED_PAGE_DEFAULT = 20
+FEED_PAGE_MAX = 100
+DISCOVERY_RANKING_WINDOW = int(os.getenv("DISCOVERY_RANKING_WINDOW", 500))
+
+
+class InvalidCursor(ValueError):
+    """Cursor malformado ou de outro jogo"""
+
+
+def _encode(payload: dict) -> str:
+    payload = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode(cursor: str, game: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        cursor_game = payload["g"]
+        payload["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if cursor_game != game:
+        raise InvalidCursor("Invalid cursor")
+    return payload
+
+def encode_cursor(game: str, last_user_id: int) -> str:
+    """Cursor opaco: jogo + último id entregue"""
+    return _encode({"g": game, "id": last_user_id})
+
+def decode_cursor(cursor: str, game: str) -> int:
+    """Retorna o último id entregue; o cursor só vale para o jogo em que foi gerado"""
+    last_user_id = _decode(cursor, game)["id"]
+    if not isinstance(last_user_id, int):
+        raise InvalidCursor("Invalid cursor")
+    return last_user_id
+
+def encode_ranked_cursor(game: str, window_after: Optional[int], window_end: int,
+                         ranked_at: datetime, last_score: float, last_id: int) -> str:
+    """Cursor do feed ranqueado no meio de uma janela"""
+    return _encode({
+        "g": game, "id": window_after, "end": window_end,
+        "at": ranked_at.isoformat(), "s": last_score, "u": last_id,
+    })
+
+def decode_ranked_cursor(cursor: str, game: str) -> dict:
+    """
+    Estado do feed ranqueado: {"after", "end", "at", "last"}. Um cursor simples
+    (encode_cursor) começa uma janela nova depois do id dele.
+    """
+    payload = _decode(cursor, game)
+    try:
+        state = {"after": payload["id"], "end": payload.get("end"), "at": None, "last": None}
+        if "at" in payload:
+            state["at"] = datetime.fromisoformat(payload["at"])
+            state["last"] = (float(payload["s"]), int(payload["u"]))
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    ints = [state["after"], state["end"]]
+    if any(value is not None and not isinstance(value, int) for value in ints):
+        raise InvalidCursor("Invalid cursor")
+    if state["at"] is not None and state["end"] is None:
+        raise InvalidCursor("Invalid cursor")
+    return state
+
+def _already_seen_filter(user_id: int):
+    """Exclui quem o usuário já curtiu ou com quem já tem match"""
+    liked = exists().where(
+        models.Like.liker_id == user_id,
+        models.Like.liked_id == models.User.id
+    )
+    matched = exists().where(
+        or_(
+            and_(models.Match.user_a_id == user_id, models.Match.user_b_id == models.User.id),
+            and_(models.Match.user_b_id == user_id, models.Match.user_a_id == models.User.id)
+        )
+    )
+    return and_(~liked, ~matched)
+
+def _shares_a_game_filter(user_id: int):
+    """Candidato joga pelo menos um dos jogos do usuário (interseção em user_games)"""
+    mine = aliased(models.UserGame)
+    theirs = aliased(models.UserGame)
+    return exists().where(
+        theirs.user_id == models.User.id,
+        theirs.game_id == mine.game_id,
+        mine.user_id == user_id
+    )
+
+def _feed_query(user_id: int, after_id: Optional[int], limit: int, entity=models.User):
+    query = select(entity).where(
+        _shares_a_game_filter(user_id),
+        models.User.is_active == True,
+        models.User.id != user_id,
+        _already_seen_filter(user_id)
+    )
+    if after_id is not None:
+        query = query.where(models.User.id > after_id)
+    if entity is models.User:
+        # Perfis serializados: jogos de todos em uma consulta IN
+        query = query.options(selectinload(models.User.games))
+    # Um a mais para saber se existe próxima página
+    return query.order_by(models.User.id.asc()).limit(limit + 1)
+
+def _feed_page(users, game: str, limit: int) -> dict:
+    items = list(users[:limit])
+    next_cursor = encode_cursor(game, items[-1].id) if len(users) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+def _profiles_query(user_id: int, candidate_ids):
+    """
+    Perfis dos candidatos vindos do índice. Repete os filtros do feed: o índice
+    deste worker pode não ter visto escritas feitas em outro worker.
+    """
+    return select(models.User).where(
+        models.User.id.in_(candidate_ids),
+        _shares_a_game_filter(user_id),
+        models.User.is_active == True,
+        _already_seen_filter(user_id)
+    ).options(selectinload(models.User.games)).order_by(models.User.id.asc())
+
+def _indexed_page(profiles, candidate_ids, game: str, limit: int) -> dict:
+    # O cursor avança pelos ids do índice, mesmo que algum perfil tenha sido filtrado
+    next_cursor = encode_cursor(game, candidate_ids[limit - 1]) if len(candidate_ids) > limit else None
+    return {"items": list(profiles), "next_cursor": next_cursor}
+
+def _ranking_window(fetched, state: Optional[dict]):
+    """
+    Ids da janela atual e se existe janela depois dela. `fetched` são até
+    DISCOVERY_RANKING_WINDOW + 1 candidatos depois do início da janela; numa
+    janela já começada, ids acima do fim dela (entraram no lugar de quem foi
+    curtido) ficam para a próxima.
+    """
+    end = state["end"] if state else None
+    if end is None:
+        window = list(fetched[:DISCOVERY_RANKING_WINDOW])
+        return window, (window[-1] if window else None), len(fetched) > DISCOVERY_RANKING_WINDOW
+    window = [candidate for candidate in fetched if candidate <= end]
+    return window, end, len(window) < len(fetched)
+
+def _ranked_page(profiles, ranked, window_after, window_end, more_windows,
+                 ranked_at, game: str, limit: int) -> dict:
+    # `ranked` traz limit + 1 pares (id, score): o extra diz se a janela continua
+    served = ranked[:limit]
+    by_id = {profile.id: profile for profile in profiles}
+    items = [by_id[user_id] for user_id, _ in served if user_id in by_id]
+    if len(ranked) > limit:
+        # Ainda há gente desta janela: continua do último servido
+        last_id, last_score = served[-1]
+        next_cursor = encode_ranked_cursor(game, window_after, window_end, ranked_at, last_score, last_id)
+    elif more_windows:
+        next_cursor = encode_cursor(game, window_end)
+    else:
+        next_cursor = None
+    return {"items": items, "next_cursor": next_cursor}
+
+def _index_user(db: Session, user_id: int) -> None:
+    """Indexa o usuário com os jogos atuais do banco (escrito em outro worker)"""
+    rows = db.execute(
+        select(models.User.is_active, models.UserGame.game_id)
+        .outerjoin(models.UserGame, models.UserGame.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    ).all()
+    if rows:
+        game_ids = [game_id for _, game_id in rows if game_id is not None]
+        candidate_index.user_changed(user_id, [], game_ids, rows[0].is_active)
+
+def _index_serves(db: Session, user_id: int, game: str) -> bool:
+    """
+    O índice responde pelo usuário só se já o conhece com o jogo pedido. Senão
+    a página vai ao banco e o usuário é indexado para as próximas.
+    """
+    if not candidate_index.ready:
+        return False
+    game_ids = candidate_index.user_games(user_id)
+    if game_ids is not None and game_service.catalog_game_id(db, game) in game_ids:
+        return True
+    _index_user(db, user_id)
+    return False
+
+def _fetch_ranking_window(db: Session, user_id: int, game: str, after_id: Optional[int]):
+    """Até DISCOVERY_RANKING_WINDOW + 1 candidatos depois de `after_id`, do índice ou do banco"""
+    if _index_serves(db, user_id, game):
+        return candidate_index.page(user_id, after_id, DISCOVERY_RANKING_WINDOW + 1)
+    return db.scalars(_feed_query(user_id, after_id, DISCOVERY_RANKING_WINDOW, models.User.id)).all()
+
+def _ranked_discovery_page(db: Session, user_id: int, game: str, state: Optional[dict], limit: int) -> dict:
+    after_id = state["after"] if state else None
+    ranked_at = state["at"] if state and state["at"] else datetime.utcnow()
+    window, window_end, more_windows = _ranking_window(_fetch_ranking_window(db, user_id, game, after_id), state)
+    features = ranking.load_features(db, user_id, window, ranked_at)
+    ranked = ranking.top_k_after(features.ids, ranking.score_candidates(features), limit + 1,
+                                 state["last"] if state else None)
+    ranked_ids = [candidate for candidate, _ in ranked[:limit]]
+    profiles = db.scalars(_profiles_query(user_id, ranked_ids)).all() if ranked_ids else []
+    return _ranked_page(profiles, ranked, after_id, window_end, more_windows, ranked_at, game, limit)
+
+@replica_read
+def get_discovery_page(db: Session, user_id: int, game: Optional[str],
+                       cursor: Optional[str] = None, limit: int = FEED_PAGE_DEFAULT, ranked: bool = False):
+    """Uma página do feed de descoberta. Levanta InvalidCursor se o cursor não servir"""
+    if not game:
+        return {"items": [], "next_cursor": None}
+    if ranked:
+        state = decode_ranked_cursor(cursor, game) if cursor else None
+        return _ranked_discovery_page(db, user_id, game, state, limit)
+    after_id = decode_cursor(cursor, game) if cursor else None
+    if _index_serves(db, user_id, game):
+        candidate_ids = candidate_index.page(user_id, after_id, limit + 1)
+        if not candidate_ids:
+            return {"items": [], "next_cursor": None}
+        profiles = db.scalars(_profiles_query(user_id, candidate_ids[:limit])).all()
+        return _indexed_page(profiles, candidate_ids, game, limit)
+    users = db.scalars(_feed_query(user_id, after_id, limit)).all()
+    return _feed_page(users, game, limit)
+
+@replica_read
+def compute_feed(db: Session, user_id: int, game: str, size: int, cursor: Optional[str] = None,
+                 exclude: Iterable[int] = ()) -> Tuple[list, Optional[str]]:
+    """
+    Os próximos `size` candidatos do feed ranqueado a partir de `cursor`
+    (snapshots dos perfis), para o feed pré-calculado, e o cursor de onde o
+    próximo cálculo continua (None = chegou ao fim). Ids em `exclude` (já na
+    fila) não entram.
+    """
+    skip = set(exclude)
+    cards = []
+    while len(cards) < size:
+        state = decode_ranked_cursor(cursor, game) if cursor else None
+        page = _ranked_discovery_page(db, user_id, game, state, size - len(cards))
+        cards.extend(user_schema.User.model_validate(user) for user in page["items"] if user.id not in skip)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    return cards, cursor
+
+@replica_read
+def refresh_cards(db: Session, user_id: int, candidate_ids: List[int]) -> list:
+    """Snapshots novos de cartas já na fila; somem as que deixaram de ser candidatas"""
+    profiles = db.scalars(_profiles_query(user_id, candidate_ids)).all() if candidate_ids else []
+    return [user_schema.User.model_validate(user) for user in profiles]
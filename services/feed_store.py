@@ -0,0 +1,235 @@
+# services/feed_store.py
+"""
+Feeds de descoberta pré-calculados (por processo).
+
+Um job de fundo calcula, para cada usuário ativo, os próximos FEED_SIZE
+candidatos já ranqueados (services/ranking.py) e guarda os perfis em memória.
+GET /discovery/next só tira cartas da fila: O(1), sem consulta ao banco.
+
+- like_user/like_users_batch removem os alvos curtidos da fila (consume)
+- update_user com troca de jogo ou desativação descarta o feed (invalidate)
+- o job recalcula só quem leu o feed recentemente e está com a fila baixa ou
+  velha; feeds sem leitura por FEED_IDLE_SECONDS são descartados
+
+Cada feed guarda o cursor do feed ranqueado logo depois da última carta da
+fila. O recálculo atualiza os perfis das cartas ainda na fila e completa a
+fila a partir do cursor: cartas já tiradas não voltam e o feed chega aos
+candidatos das janelas seguintes. Quando o cursor chega ao fim e a fila
+esvazia, o próximo cálculo começa uma nova rodada do início.
+
+Como o índice de candidatos, cada worker do gunicorn tem o seu próprio store.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from database import models
+from . import discovery_service
+
+FEED_ENABLED = os.getenv("FEED_PRECOMPUTE_ENABLED", "true").lower() in ("1", "true", "yes")
+FEED_SIZE = int(os.getenv("FEED_SIZE", 50))
+FEED_LOW_WATERMARK = int(os.getenv("FEED_LOW_WATERMARK", 10))
+FEED_MAX_AGE_SECONDS = float(os.getenv("FEED_MAX_AGE_SECONDS", 600))
+FEED_IDLE_SECONDS = float(os.getenv("FEED_IDLE_SECONDS", 1800))
+FEED_REFRESH_INTERVAL_SECONDS = float(os.getenv("FEED_REFRESH_INTERVAL_SECONDS", 5))
+FEED_REFRESH_BATCH = int(os.getenv("FEED_REFRESH_BATCH", 100))
+
+
+class PrecomputedFeed:
+    """Fila de cartas de um usuário"""
+
+    def __init__(self, game: str, cards: Iterable, computed_at: float, cursor: Optional[str] = None):
+        self.game = game
+        self.cards = deque(cards)
+        self.computed_at = computed_at
+        # Onde o próximo cálculo continua; None = candidatos esgotados nesta rodada
+        self.cursor = cursor
+
+
+class FeedStore:
+    """Usuário → fila de candidatos pré-calculada, com agenda de recálculo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._feeds: dict = {}
+        # Última leitura de cada usuário (define quem é "ativo")
+        self._last_read: dict = {}
+        # Incrementado a cada invalidação: descarta cálculos já em andamento
+        self._versions: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def take(self, user_id: int, game: str, count: int) -> Optional[List]:
+        """Tira até `count` cartas da fila; None se não há feed, acabou ou é de outro jogo"""
+        with self._lock:
+            self._last_read[user_id] = time.monotonic()
+            feed = self._feeds.get(user_id)
+            if feed is None or feed.game != game or not feed.cards:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return [feed.cards.popleft() for _ in range(min(count, len(feed.cards)))]
+
+    def remaining(self, user_id: int) -> int:
+        feed = self._feeds.get(user_id)
+        return len(feed.cards) if feed is not None else 0
+
+    def version(self, user_id: int) -> int:
+        """Versão atual do feed; passe para store() ao terminar o cálculo"""
+        return self._versions.get(user_id, 0)
+
+    def resume_point(self, user_id: int, game: str) -> Tuple[List[int], Optional[str], bool]:
+        """
+        Ids na fila, cursor e se o cálculo deve continuar do cursor. Sem feed
+        deste jogo, ou com a rodada esgotada e a fila vazia, começa do início.
+        """
+        with self._lock:
+            feed = self._feeds.get(user_id)
+            if feed is None or feed.game != game:
+                return [], None, True
+            queued = [card.id for card in feed.cards]
+            if feed.cursor is None and not queued:
+                return [], None, True
+            return queued, feed.cursor, feed.cursor is not None
+
+    def store(self, user_id: int, game: str, cards: List, version: int,
+              cursor: Optional[str] = None, refreshed: Optional[List] = None) -> bool:
+        """
+        Acrescenta `cards` ao fim da fila, a menos que o feed tenha sido
+        invalidado no meio. `refreshed` são os perfis atualizados das cartas
+        que já estavam na fila: as que não vierem saem. Cartas tiradas
+        durante o cálculo continuam fora.
+        """
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return False
+            feed = self._feeds.get(user_id)
+            queued = list(feed.cards) if feed is not None and feed.game == game else []
+            if refreshed is not None:
+                fresh = {card.id: card for card in refreshed}
+                queued = [fresh[card.id] for card in queued if card.id in fresh]
+            self._feeds[user_id] = PrecomputedFeed(game, queued + list(cards), time.monotonic(), cursor)
+            self.refreshes += 1
+            return True
+
+    def consume(self, user_id: int, target_ids: Iterable[int]) -> None:
+        """Alvos curtidos saem da fila de quem curtiu"""
+        with self._lock:
+            feed = self._feeds.get(user_id)
+            if feed is None:
+                return
+            targets = set(target_ids)
+            feed.cards = deque(card for card in feed.cards if card.id not in targets)
+
+    def invalidate(self, user_id: int) -> None:
+        """Descarta o feed (ex: troca de jogo); o próximo acesso recalcula"""
+        with self._lock:
+            self._feeds.pop(user_id, None)
+            if user_id in self._last_read:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            else:
+                # Sem leitor, não há cálculo em andamento a descartar
+                self._versions.pop(user_id, None)
+
+    def due_for_refresh(self, limit: int = FEED_REFRESH_BATCH) -> List[int]:
+        """
+        Usuários ativos cujo feed precisa ser recalculado: fila abaixo de
+        FEED_LOW_WATERMARK ou mais velha que FEED_MAX_AGE_SECONDS. Os que
+        estão há mais tempo sem atualização vêm primeiro. Feeds ociosos são
+        descartados aqui.
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for user_id, last_read in list(self._last_read.items()):
+                if now - last_read > FEED_IDLE_SECONDS:
+                    del self._last_read[user_id]
+                    self._feeds.pop(user_id, None)
+                    self._versions.pop(user_id, None)
+                    continue
+                feed = self._feeds.get(user_id)
+                if feed is None:
+                    due.append((0.0, user_id))
+                elif len(feed.cards) < FEED_LOW_WATERMARK or now - feed.computed_at > FEED_MAX_AGE_SECONDS:
+                    due.append((feed.computed_at, user_id))
+        due.sort()
+        return [user_id for _, user_id in due[:limit]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._feeds.clear()
+            self._last_read.clear()
+            self._versions.clear()
+            self.hits = self.misses = self.refreshes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "feeds": len(self._feeds),
+                "active_users": len(self._last_read),
+                "cards": sum(len(feed.cards) for feed in self._feeds.values()),
+                "versions": len(self._versions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+            }
+
+
+feed_store = FeedStore()
+
+
+def _compute_and_store(db: Session, user_id: int, game: str, version: int) -> None:
+    """Atualiza as cartas da fila e completa até FEED_SIZE a partir do cursor do feed"""
+    queued, cursor, resume = feed_store.resume_point(user_id, game)
+    refreshed = discovery_service.refresh_cards(db, user_id, queued) if queued else None
+    missing = FEED_SIZE - len(refreshed or ())
+    if resume and missing > 0:
+        cards, cursor = discovery_service.compute_feed(db, user_id, game, missing, cursor, exclude=queued)
+    else:
+        cards = []
+    feed_store.store(user_id, game, cards, version, cursor, refreshed)
+
+
+def next_cards(db: Session, user_id: int, game: Optional[str], count: int) -> dict:
+    """
+    Próximas cartas do usuário. Sem feed pronto (primeiro acesso, fila vazia
+    ou após invalidação), calcula na hora; daí em diante o job mantém a fila.
+    """
+    if not game:
+        return {"items": [], "remaining": 0}
+    cards = feed_store.take(user_id, game, count)
+    if cards is None:
+        _compute_and_store(db, user_id, game, feed_store.version(user_id))
+        cards = feed_store.take(user_id, game, count) or []
+    return {"items": cards, "remaining": feed_store.remaining(user_id)}
+
+def refresh_feed(session_factory, user_id: int) -> None:
+    """Recalcula o feed de um usuário com uma sessão nova"""
+    version = feed_store.version(user_id)
+    with session_factory() as db:
+        user = db.get(models.User, user_id)
+        if user is None or not user.is_active or not user.game:
+            feed_store.invalidate(user_id)
+            return
+        _compute_and_store(db, user_id, user.game, version)
+
+def refresh_due_feeds(session_factory) -> int:
+    """Uma rodada do job: recalcula os feeds agendados; retorna quantos"""
+    due = feed_store.due_for_refresh()
+    for user_id in due:
+        refresh_feed(session_factory, user_id)
+    return len(due)
+
+async def keep_feeds_fresh(session_factory, interval: float = FEED_REFRESH_INTERVAL_SECONDS):
+    """Tarefa de fundo do lifespan que roda refresh_due_feeds periodicamente"""
+    while True:
+        try:
+            await run_in_threadpool(refresh_due_feeds, session_factory)
+        except Exception as e:
+            print(f"⚠ Erro ao recalcular feeds de descoberta: {e}")
+        await asyncio.sleep(interval)
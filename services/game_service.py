@@ -0,0 +1,95 @@
+# services/game_service.py
+"""
+Catálogo de jogos e jogos de cada usuário (tabelas games/user_games).
+
+O catálogo muda pouco e é lido a cada abertura do seletor de jogos, então
+fica em cache por processo (GAME_CATALOG_TTL_SECONDS); criar um jogo novo
+neste worker invalida o cache na hora.
+"""
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import models
+
+GAME_CATALOG_TTL_SECONDS = float(os.getenv("GAME_CATALOG_TTL_SECONDS", 300))
+
+
+class GameCatalogCache:
+    """Lista de jogos (id, nome) em memória, com TTL"""
+
+    def __init__(self, ttl_seconds: float = GAME_CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._games: Optional[list] = None
+        self._expires_at = 0.0
+
+    def get(self, db: Session) -> list:
+        now = time.monotonic()
+        games = self._games
+        if games is not None and now < self._expires_at:
+            return games
+        rows = db.execute(select(models.Game.id, models.Game.name).order_by(models.Game.name)).all()
+        games = [{"id": game_id, "name": name} for game_id, name in rows]
+        with self._lock:
+            self._games, self._expires_at = games, now + self.ttl_seconds
+        return games
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._games = None
+
+
+game_catalog = GameCatalogCache()
+
+
+def get_catalog(db: Session) -> list:
+    return game_catalog.get(db)
+
+def catalog_game_id(db: Session, name: str) -> Optional[int]:
+    """Id do jogo pelo nome no catálogo em cache; None se ainda não está nele"""
+    return next((game["id"] for game in game_catalog.get(db) if game["name"] == name), None)
+
+def get_or_create_games(db: Session, names: Iterable[str]) -> List[models.Game]:
+    """Jogos do catálogo com esses nomes, criando os que faltam (sem commit)"""
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        return []
+    by_name = {game.name: game for game in db.scalars(select(models.Game).where(models.Game.name.in_(names)))}
+    for name in names:
+        if name in by_name:
+            continue
+        try:
+            # Savepoint: outro worker pode ter criado o mesmo jogo agora
+            with db.begin_nested():
+                game = models.Game(name=name)
+                db.add(game)
+            by_name[name] = game
+        except IntegrityError:
+            by_name[name] = db.scalars(select(models.Game).where(models.Game.name == name)).one()
+        game_catalog.invalidate()
+    return [by_name[name] for name in names]
+
+def resolve_games(main_game: Optional[str], games: Optional[List[str]]):
+    """
+    Normaliza (jogo principal, conjunto de jogos). Só `game` (clientes antigos)
+    vira um conjunto de um jogo; o jogo principal sempre faz parte do conjunto.
+    """
+    if games is None:
+        return main_game, [main_game] if main_game else []
+    games = [name for name in dict.fromkeys(games) if name]
+    if main_game and main_game not in games:
+        games.insert(0, main_game)
+    if not main_game and games:
+        main_game = games[0]
+    return main_game, games
+
+def set_user_games(db: Session, db_user: models.User, names: List[str]) -> None:
+    """Substitui os jogos do usuário (sem commit)"""
+    db_user.games = get_or_create_games(db, names)
+
+def user_game_ids(db_user: models.User) -> List[int]:
+    return sorted(game.id for game in db_user.games)
@@ -1,8 +1,184 @@
 # services/match_service.py
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List
+from datetime import datetime
+from sqlalchemy import or_, and_, select, exists, func, literal, true, cast, case, values, column, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from database import models
+from database.routing import replica_read
 from . import user_service
+from .candidate_index import candidate_index
+from .feed_store import feed_store
+
+# --- Consultas compartilhadas entre as versões síncrona e assíncrona ---
+
+def _user_matches_query(user_id: int, with_profiles: bool = True):
+    query = select(models.Match).where(
+        and_(
+            or_(models.Match.user_a_id == user_id, models.Match.user_b_id == user_id),
+            models.Match.status == models.MatchStatus.MATCHED
+        )
+    )
+    if with_profiles:
+        # Perfis dos dois lados em consultas IN (selectin), e não um lazy load por match
+        query = query.options(
+            selectinload(models.Match.user_a).selectinload(models.User.games),
+            selectinload(models.Match.user_b).selectinload(models.User.games)
+        )
+    return query
+
+def _unmatched_pair_filter():
+    """Anti-join: curtidas cujo par ainda não virou match (em qualquer ordem)"""
+    return ~exists().where(
+        or_(
+            and_(models.Match.user_a_id == models.Like.liker_id, models.Match.user_b_id == models.Like.liked_id),
+            and_(models.Match.user_a_id == models.Like.liked_id, models.Match.user_b_id == models.Like.liker_id)
+        )
+    )
+
+def _pending_likes_query(user_column, user_id: int, after: Optional[int], limit: Optional[int], profile=None):
+    """
+    Curtidas pendentes (sem match) em uma única consulta, paginadas por id (keyset).
+    `profile` (Like.liked/Like.liker) carrega o outro usuário de todas em uma consulta IN.
+    """
+    query = select(models.Like).where(
+        user_column == user_id,
+        _unmatched_pair_filter()
+    )
+    if profile is not None:
+        query = query.options(selectinload(profile).selectinload(models.User.games))
+    if after is not None:
+        query = query.where(models.Like.id > after)
+    query = query.order_by(models.Like.id.asc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def _likes_sent_query(user_id: int, after: Optional[int] = None, limit: Optional[int] = None, with_profiles: bool = True):
+    return _pending_likes_query(models.Like.liker_id, user_id, after, limit, models.Like.liked if with_profiles else None)
+
+def _likes_received_query(user_id: int, after: Optional[int] = None, limit: Optional[int] = None, with_profiles: bool = True):
+    return _pending_likes_query(models.Like.liked_id, user_id, after, limit, models.Like.liker if with_profiles else None)
+
+# Dialetos com INSERT ... ON CONFLICT/RETURNING; os demais usam o caminho genérico
+UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+def _dialect_insert(dialect_name: str):
+    """INSERT com suporte a ON CONFLICT/RETURNING do dialeto (Postgres ou SQLite)"""
+    return UPSERT_INSERTS[dialect_name]
+
+def _add_unless_duplicate(db: Session, row) -> bool:
+    """INSERT simples em um savepoint; False se a constraint única já tinha a linha"""
+    try:
+        with db.begin_nested():
+            db.add(row)
+    except IntegrityError:
+        return False
+    return True
+
+def _like_pair_generic(db: Session, current_user_id: int, target_user_id: int):
+    """
+    Caminho genérico (dialetos sem ON CONFLICT): grava a curtida e, se houver
+    reciprocidade, o match, deixando as constraints únicas barrarem duplicatas.
+    Não faz commit. Retorna (like_id, match_id) ou None se já tinha curtido.
+    Sem o advisory lock, duas curtidas recíprocas simultâneas podem não se
+    enxergar e deixar o match para a próxima curtida.
+    """
+    like = models.Like(liker_id=current_user_id, liked_id=target_user_id)
+    if not _add_unless_duplicate(db, like):
+        return None
+
+    reciprocal = db.scalar(select(models.Like.id).where(
+        models.Like.liker_id == target_user_id,
+        models.Like.liked_id == current_user_id
+    ))
+    if reciprocal is None:
+        return like.id, None
+
+    user_a, user_b = min(current_user_id, target_user_id), max(current_user_id, target_user_id)
+    match = models.Match(user_a_id=user_a, user_b_id=user_b, status=models.MatchStatus.MATCHED)
+    if not _add_unless_duplicate(db, match):
+        match = db.scalars(select(models.Match).where(
+            models.Match.user_a_id == user_a,
+            models.Match.user_b_id == user_b
+        )).one()
+        match.status = models.MatchStatus.MATCHED
+        db.flush()
+    return like.id, match.id
+
+def _insert_like_statement(dialect_name: str, current_user_id: int, target_user_id: int):
+    """
+    Statement 1: grava a curtida, ignorando se ela já existe (constraint única).
+    Só insere se o usuário alvo existir. Retorna o id da curtida criada.
+
+    No Postgres o INSERT também pega um advisory lock transacional do par
+    ordenado: duas curtidas recíprocas simultâneas ficam serializadas, e a
+    segunda enxerga a primeira no statement seguinte (READ COMMITTED).
+    No SQLite os escritores já são serializados pelo lock do banco.
+    """
+    values = select(
+        literal(current_user_id),
+        literal(target_user_id),
+        literal(datetime.utcnow(), models.Like.created_at.type)
+    ).select_from(models.User).where(models.User.id == target_user_id)
+
+    if dialect_name == "postgresql":
+        pair_lock = select(
+            func.pg_advisory_xact_lock(
+                min(current_user_id, target_user_id),
+                max(current_user_id, target_user_id)
+            ).label("locked")
+        ).cte("pair_lock")
+        values = values.join(pair_lock, true())
+
+    return (
+        _dialect_insert(dialect_name)(models.Like)
+        .from_select(["liker_id", "liked_id", "created_at"], values)
+        .on_conflict_do_nothing(index_elements=["liker_id", "liked_id"])
+        .returning(models.Like.id)
+    )
+
+def _insert_match_if_reciprocal_statement(dialect_name: str, current_user_id: int, target_user_id: int):
+    """
+    Statement 2: cria o match (par ordenado) somente se existir a curtida
+    recíproca. Se o match já existir, apenas confirma o status. Retorna o id.
+    """
+    reciprocal = select(
+        literal(min(current_user_id, target_user_id)),
+        literal(max(current_user_id, target_user_id)),
+        cast(literal(models.MatchStatus.MATCHED, models.Match.status.type), models.Match.status.type),
+        literal(datetime.utcnow(), models.Match.created_at.type)
+    ).where(
+        models.Like.liker_id == target_user_id,
+        models.Like.liked_id == current_user_id
+    )
+    insert = _dialect_insert(dialect_name)(models.Match).from_select(
+        ["user_a_id", "user_b_id", "status", "created_at"], reciprocal
+    )
+    return insert.on_conflict_do_update(
+        index_elements=["user_a_id", "user_b_id"],
+        set_={"status": insert.excluded.status}
+    ).returning(models.Match.id)
+
+def _like_result(like_id, match_id):
+    if match_id is not None:
+        return {
+            "status": "MATCHED",
+            "message": "It's a match!",
+            "match_id": match_id
+        }
+    return {
+        "status": "LIKED",
+        "message": "Like sent! Waiting for response.",
+        "like_id": like_id
+    }
+
+SELF_LIKE_RESULT = {"status": "ERROR", "message": "Cannot like yourself"}
+ALREADY_LIKED_RESULT = {"status": "ALREADY_LIKED", "message": "You already liked this user"}
+USER_NOT_FOUND_RESULT = {"status": "NOT_FOUND", "message": "User not found"}
 
 def like_user(db: Session, current_user_id: int, target_user_id: int):
     """
@@ -10,117 +186,221 @@ def like_user(db: Session, current_user_id: int, target_user_id: int):
     1. Usuário A curte Usuário B → Cria Like
     2. Se Usuário B já curtiu Usuário A → Cria Match
     3. Se não há reciprocidade → Apenas Like
+
+    Usa as constraints únicas com INSERT ... ON CONFLICT: no máximo dois
+    statements e uma transação, sem check-then-insert.
     """
-    
+
     # Não pode curtir a si mesmo
     if current_user_id == target_user_id:
-        return {"status": "ERROR", "message": "Cannot like yourself"}
-    
-    # Verifica se já curtiu este usuário
-    existing_like = db.query(models.Like).filter(
-        models.Like.liker_id == current_user_id,
-        models.Like.liked_id == target_user_id
-    ).first()
-    
-    if existing_like:
-        return {"status": "ALREADY_LIKED", "message": "You already liked this user"}
-    
-    # Verifica se o usuário alvo já curtiu o usuário atual (reciprocidade)
-    reciprocal_like = db.query(models.Like).filter(
-        models.Like.liker_id == target_user_id,
-        models.Like.liked_id == current_user_id
-    ).first()
-    
-    # Cria a curtida
-    new_like = models.Like(
-        liker_id=current_user_id,
-        liked_id=target_user_id
-    )
-    db.add(new_like)
-    
-    if reciprocal_like:
-        # Há reciprocidade! Criar match
-        # Garante ordem consistente dos IDs
-        user1_id = min(current_user_id, target_user_id)
-        user2_id = max(current_user_id, target_user_id)
-        
-        new_match = models.Match(
-            user_a_id=user1_id,
-            user_b_id=user2_id,
-            status=models.MatchStatus.MATCHED
-        )
-        db.add(new_match)
+        return dict(SELF_LIKE_RESULT)
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name not in UPSERT_INSERTS:
+        if db.get(models.User, target_user_id) is None:
+            return dict(USER_NOT_FOUND_RESULT)
+        pair = _like_pair_generic(db, current_user_id, target_user_id)
+        if pair is None:
+            db.rollback()
+            return dict(ALREADY_LIKED_RESULT)
+        like_id, match_id = pair
         db.commit()
-        db.refresh(new_match)
-        
-        return {
-            "status": "MATCHED", 
-            "message": "It's a match!",
-            "match_id": new_match.id
-        }
-    else:
-        # Apenas curtida, sem reciprocidade
+        candidate_index.liked(current_user_id, [target_user_id])
+        feed_store.consume(current_user_id, [target_user_id])
+        return _like_result(like_id, match_id)
+
+    like_id = db.execute(_insert_like_statement(dialect_name, current_user_id, target_user_id)).scalar()
+
+    if like_id is None:
+        # Nada inserido: já curtiu (caminho raro, pode custar uma consulta a mais)
+        db.rollback()
+        if db.get(models.User, target_user_id) is None:
+            return dict(USER_NOT_FOUND_RESULT)
+        return dict(ALREADY_LIKED_RESULT)
+
+    match_id = db.execute(_insert_match_if_reciprocal_statement(dialect_name, current_user_id, target_user_id)).scalar()
+    db.commit()
+    candidate_index.liked(current_user_id, [target_user_id])
+    feed_store.consume(current_user_id, [target_user_id])
+
+    return _like_result(like_id, match_id)
+
+# --- Curtidas em lote (mesma semântica do like_user, com SQL por conjunto) ---
+
+def _pair_locks_statement(current_user_id: int, target_ids: List[int]):
+    """
+    Postgres: advisory locks de todos os pares ordenados, sempre na mesma ordem
+    (a mesma chave usada pelo like_user), para não haver deadlock entre lotes.
+    """
+    pairs = values(
+        column("key_a", Integer), column("key_b", Integer), name="pairs"
+    ).data(sorted({(min(current_user_id, t), max(current_user_id, t)) for t in target_ids}))
+    return select(
+        func.pg_advisory_xact_lock(pairs.c.key_a, pairs.c.key_b)
+    ).order_by(pairs.c.key_a, pairs.c.key_b)
+
+def _insert_likes_batch_statement(dialect_name: str, current_user_id: int, target_ids: List[int]):
+    """Grava as curtidas para todos os alvos existentes; retorna (id, liked_id) das novas"""
+    rows = select(
+        literal(current_user_id),
+        models.User.id,
+        literal(datetime.utcnow(), models.Like.created_at.type)
+    ).where(models.User.id.in_(target_ids))
+    return (
+        _dialect_insert(dialect_name)(models.Like)
+        .from_select(["liker_id", "liked_id", "created_at"], rows)
+        .on_conflict_do_nothing(index_elements=["liker_id", "liked_id"])
+        .returning(models.Like.id, models.Like.liked_id)
+    )
+
+def _insert_matches_batch_statement(dialect_name: str, current_user_id: int, liked_ids: List[int]):
+    """Cria os matches de todos os alvos que já tinham curtido o usuário; retorna (id, outro usuário)"""
+    other = models.Like.liker_id
+    rows = select(
+        case((other < current_user_id, other), else_=current_user_id),
+        case((other > current_user_id, other), else_=current_user_id),
+        cast(literal(models.MatchStatus.MATCHED, models.Match.status.type), models.Match.status.type),
+        literal(datetime.utcnow(), models.Match.created_at.type)
+    ).where(
+        models.Like.liked_id == current_user_id,
+        other.in_(liked_ids)
+    )
+    insert = _dialect_insert(dialect_name)(models.Match).from_select(
+        ["user_a_id", "user_b_id", "status", "created_at"], rows
+    )
+    return insert.on_conflict_do_update(
+        index_elements=["user_a_id", "user_b_id"],
+        set_={"status": insert.excluded.status}
+    ).returning(models.Match.id, models.Match.user_a_id, models.Match.user_b_id)
+
+def _existing_users_query(user_ids: List[int]):
+    return select(models.User.id).where(models.User.id.in_(user_ids))
+
+def _batch_targets(current_user_id: int, target_user_ids: List[int]):
+    """Alvos sem repetição, na ordem recebida, e os que podem ser curtidos"""
+    ordered = list(dict.fromkeys(target_user_ids))
+    return ordered, [t for t in ordered if t != current_user_id]
+
+def _like_users_generic(db: Session, current_user_id: int, targets: List[int]):
+    """Lote no caminho genérico: uma curtida por alvo existente, mesmo formato do SQL por conjunto"""
+    existing = set(db.scalars(_existing_users_query(targets)).all())
+    likes, matches = [], []
+    for target in targets:
+        if target not in existing:
+            continue
+        pair = _like_pair_generic(db, current_user_id, target)
+        if pair is None:
+            continue
+        like_id, match_id = pair
+        likes.append((like_id, target))
+        if match_id is not None:
+            matches.append((match_id, min(current_user_id, target), max(current_user_id, target)))
+    return likes, matches, existing
+
+def _batch_results(current_user_id, ordered, likes, matches, existing):
+    """Monta o resultado por alvo, com os mesmos status do like_user"""
+    like_ids = {liked_id: like_id for like_id, liked_id in likes}
+    match_ids = {
+        (user_a if user_b == current_user_id else user_b): match_id
+        for match_id, user_a, user_b in matches
+    }
+    results = []
+    for target in ordered:
+        if target == current_user_id:
+            result = dict(SELF_LIKE_RESULT)
+        elif target in like_ids:
+            result = _like_result(like_ids[target], match_ids.get(target))
+        elif target in existing:
+            result = dict(ALREADY_LIKED_RESULT)
+        else:
+            result = dict(USER_NOT_FOUND_RESULT)
+        results.append({"target_user_id": target, **result})
+    return results
+
+def like_users_batch(db: Session, current_user_id: int, target_user_ids: List[int]):
+    """
+    Curte vários usuários em uma transação. Cada alvo recebe o mesmo resultado
+    que like_user daria, mas com um INSERT para as curtidas e um para os
+    matches recíprocos (mais os locks no Postgres), em vez de N chamadas.
+    """
+    ordered, targets = _batch_targets(current_user_id, target_user_ids)
+    likes, matches, existing = [], [], set()
+
+    if targets:
+        dialect_name = db.get_bind().dialect.name
+        if dialect_name not in UPSERT_INSERTS:
+            likes, matches, existing = _like_users_generic(db, current_user_id, targets)
+            db.commit()
+            liked_ids = sorted(liked_id for _, liked_id in likes)
+            candidate_index.liked(current_user_id, liked_ids)
+            feed_store.consume(current_user_id, liked_ids)
+            return _batch_results(current_user_id, ordered, likes, matches, existing)
+        if dialect_name == "postgresql":
+            db.execute(_pair_locks_statement(current_user_id, targets))
+        likes = db.execute(_insert_likes_batch_statement(dialect_name, current_user_id, targets)).all()
+        newly_liked = {liked_id for _, liked_id in likes}
+        liked_ids = sorted(newly_liked)
+        if liked_ids:
+            matches = db.execute(_insert_matches_batch_statement(dialect_name, current_user_id, liked_ids)).all()
+        if len(liked_ids) < len(targets):
+            # Alvos sem curtida nova: já curtidos ou inexistentes
+            missing = [t for t in targets if t not in newly_liked]
+            existing = set(db.scalars(_existing_users_query(missing)).all())
         db.commit()
-        db.refresh(new_like)
-        
-        return {
-            "status": "LIKED", 
-            "message": "Like sent! Waiting for response.",
-            "like_id": new_like.id
-        }
+        candidate_index.liked(current_user_id, liked_ids)
+        feed_store.consume(current_user_id, liked_ids)
+
+    return _batch_results(current_user_id, ordered, likes, matches, existing)
 
-def get_user_matches(db: Session, user_id: int):
+@replica_read
+def get_user_matches(db: Session, user_id: int, with_profiles: bool = True):
     """ Retorna apenas os matches confirmados do usuário """
-    matches = db.query(models.Match).filter(
-        and_(
-            or_(models.Match.user_a_id == user_id, models.Match.user_b_id == user_id),
-            models.Match.status == models.MatchStatus.MATCHED
-        )
-    ).all()
-    return matches
+    return db.scalars(_user_matches_query(user_id, with_profiles)).all()
 
-def get_user_likes(db: Session, user_id: int):
+@replica_read
+def get_user_likes(db: Session, user_id: int, after: Optional[int] = None, limit: Optional[int] = None, with_profiles: bool = True):
     """ Retorna usuários que o usuário curtiu (mas ainda não deram match) """
-    # Busca curtidas que ainda não viraram match
-    likes = db.query(models.Like).filter(
-        models.Like.liker_id == user_id
-    ).all()
-    
-    # Filtra apenas os que não têm match correspondente
-    pending_likes = []
-    for like in likes:
-        # Verifica se já existe match entre esses usuários
-        match_exists = db.query(models.Match).filter(
-            or_(
-                and_(models.Match.user_a_id == like.liker_id, models.Match.user_b_id == like.liked_id),
-                and_(models.Match.user_a_id == like.liked_id, models.Match.user_b_id == like.liker_id)
-            )
-        ).first()
-        
-        if not match_exists:
-            pending_likes.append(like)
-    
-    return pending_likes
-
-def get_user_liked_by(db: Session, user_id: int):
+    return db.scalars(_likes_sent_query(user_id, after, limit, with_profiles)).all()
+
+@replica_read
+def get_user_liked_by(db: Session, user_id: int, after: Optional[int] = None, limit: Optional[int] = None, with_profiles: bool = True):
     """ Retorna usuários que curtiram o usuário (mas ainda não deram match) """
-    # Busca curtidas recebidas que ainda não viraram match
-    likes = db.query(models.Like).filter(
-        models.Like.liked_id == user_id
-    ).all()
-    
-    # Filtra apenas os que não têm match correspondente
-    pending_likes = []
-    for like in likes:
-        # Verifica se já existe match entre esses usuários
-        match_exists = db.query(models.Match).filter(
-            or_(
-                and_(models.Match.user_a_id == like.liker_id, models.Match.user_b_id == like.liked_id),
-                and_(models.Match.user_a_id == like.liked_id, models.Match.user_b_id == like.liker_id)
-            )
-        ).first()
-        
-        if not match_exists:
-            pending_likes.append(like)
-    
-    return pending_likes
\ No newline at end of file
+    return db.scalars(_likes_received_query(user_id, after, limit, with_profiles)).all()
+
+# --- Versões assíncronas (AsyncSession), para rotas que rodam no event loop ---
+
+async def like_user_async(db: AsyncSession, current_user_id: int, target_user_id: int):
+    """Versão assíncrona de like_user"""
+    if current_user_id == target_user_id:
+        return dict(SELF_LIKE_RESULT)
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name not in UPSERT_INSERTS:
+        return await db.run_sync(like_user, current_user_id, target_user_id)
+
+    like_id = (await db.execute(_insert_like_statement(dialect_name, current_user_id, target_user_id))).scalar()
+
+    if like_id is None:
+        await db.rollback()
+        if await db.get(models.User, target_user_id) is None:
+            return dict(USER_NOT_FOUND_RESULT)
+        return dict(ALREADY_LIKED_RESULT)
+
+    match_id = (await db.execute(_insert_match_if_reciprocal_statement(dialect_name, current_user_id, target_user_id))).scalar()
+    await db.commit()
+    candidate_index.liked(current_user_id, [target_user_id])
+    feed_store.consume(current_user_id, [target_user_id])
+
+    return _like_result(like_id, match_id)
+
+async def get_user_matches_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_user_matches"""
+    return (await db.scalars(_user_matches_query(user_id))).all()
+
+async def get_user_likes_async(db: AsyncSession, user_id: int, after: Optional[int] = None, limit: Optional[int] = None):
+    """Versão assíncrona de get_user_likes"""
+    return (await db.scalars(_likes_sent_query(user_id, after, limit))).all()
+
+async def get_user_liked_by_async(db: AsyncSession, user_id: int, after: Optional[int] = None, limit: Optional[int] = None):
+    """Versão assíncrona de get_user_liked_by"""
+    return (await db.scalars(_likes_received_query(user_id, after, limit))).all()
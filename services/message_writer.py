@@ -0,0 +1,201 @@
+# services/message_writer.py
+"""
+Gravação write-behind das mensagens do chat (opcional, CHAT_WRITE_BEHIND=1).
+
+No caminho normal cada mensagem é uma transação (INSERT + commit). Com o
+write-behind a mensagem recebe id e created_at no próprio servidor, é
+distribuída na hora e fica em memória; um job do lifespan grava as pendentes
+em um INSERT de várias linhas quando juntam CHAT_WRITE_BEHIND_BATCH_SIZE ou a
+cada CHAT_WRITE_BEHIND_FLUSH_SECONDS, o que vier primeiro. No shutdown o que
+estiver pendente é gravado antes de sair.
+
+Durabilidade: uma mensagem já entregue pode se perder se o processo morrer
+antes do flush (no máximo um intervalo ou um lote). Acima de
+CHAT_WRITE_BEHIND_MAX_PENDING quem envia espera o flush, em vez de a fila
+crescer sem limite. Se o banco estiver fora, o flush devolve as mensagens à
+fila; se ele recusar o lote (uma linha inválida), o flush grava linha a linha
+e descarta, com log, só as recusadas. O conteúdo já chega limpo
+(chat_service.message_content), então isso é a exceção.
+
+Ids: no Postgres vêm da sequência de chat_messages em blocos de
+CHAT_WRITE_BEHIND_ID_BLOCK (um statement por bloco). Com vários workers os
+blocos se intercalam e a ordem por id deixa de ser a ordem de envio entre
+workers; CHAT_WRITE_BEHIND_ID_BLOCK=1 mantém a ordem (um nextval por
+mensagem, ainda sem commit). Em outros bancos o id parte do max(id) da
+tabela: serve só para um processo (desenvolvimento e testes).
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, insert, select, text
+from database import models
+from database.pool import is_connection_error
+
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", 200))
+CHAT_WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("CHAT_WRITE_BEHIND_FLUSH_SECONDS", 0.05))
+CHAT_WRITE_BEHIND_MAX_PENDING = int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", 5000))
+CHAT_WRITE_BEHIND_ID_BLOCK = int(os.getenv("CHAT_WRITE_BEHIND_ID_BLOCK", 50))
+
+
+class ChatMessageWriter:
+    """Mensagens aceitas e ainda não gravadas, com ids reservados no servidor"""
+
+    def __init__(self, batch_size: int = CHAT_WRITE_BEHIND_BATCH_SIZE,
+                 max_pending: int = CHAT_WRITE_BEHIND_MAX_PENDING,
+                 id_block: int = CHAT_WRITE_BEHIND_ID_BLOCK):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.id_block = id_block
+        self._pending: List[dict] = []
+        self._ids: List[int] = []
+        self._next_id: Optional[int] = None
+        self._id_lock: Optional[asyncio.Lock] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self.accepted = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def _locks(self):
+        # Criados no event loop que usa o writer
+        if self._id_lock is None:
+            self._id_lock, self._flush_lock, self._batch_ready = asyncio.Lock(), asyncio.Lock(), asyncio.Event()
+        return self._id_lock, self._flush_lock, self._batch_ready
+
+    async def _allocate_id(self, session_factory) -> int:
+        id_lock, _, _ = self._locks()
+        async with id_lock:
+            if not self._ids:
+                async with session_factory() as db:
+                    self._ids = await self._reserve_ids(db)
+            return self._ids.pop(0)
+
+    async def _reserve_ids(self, db) -> List[int]:
+        if db.get_bind().dialect.name == "postgresql":
+            rows = await db.scalars(
+                text("SELECT nextval(pg_get_serial_sequence('chat_messages', 'id')) FROM generate_series(1, :n)"),
+                {"n": self.id_block}
+            )
+            return sorted(rows)
+        if self._next_id is None:
+            self._next_id = ((await db.scalar(select(func.max(models.ChatMessage.id)))) or 0) + 1
+        ids = list(range(self._next_id, self._next_id + self.id_block))
+        self._next_id += self.id_block
+        return ids
+
+    async def add(self, session_factory, match_id: int, sender_id: int, content: str) -> models.ChatMessage:
+        """Aceita a mensagem: id e created_at do servidor, gravação depois"""
+        _, _, batch_ready = self._locks()
+        if len(self._pending) >= self.max_pending:
+            await self.flush(session_factory)
+        message = models.ChatMessage(
+            id=await self._allocate_id(session_factory),
+            match_id=match_id,
+            sender_id=sender_id,
+            content=content,
+            created_at=datetime.utcnow()
+        )
+        self._pending.append({
+            "id": message.id, "match_id": match_id, "sender_id": sender_id,
+            "content": content, "created_at": message.created_at,
+        })
+        self.accepted += 1
+        if len(self._pending) >= self.batch_size:
+            batch_ready.set()
+        return message
+
+    async def flush(self, session_factory) -> int:
+        """Grava as mensagens pendentes em INSERTs de várias linhas; retorna quantas"""
+        _, flush_lock, batch_ready = self._locks()
+        async with flush_lock:
+            batch_ready.clear()
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            try:
+                try:
+                    async with session_factory() as db:
+                        for start in range(0, len(pending), self.batch_size):
+                            await db.execute(insert(models.ChatMessage).values(pending[start:start + self.batch_size]))
+                        await db.commit()
+                    written = len(pending)
+                    self.rows_written += written
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    written = await self._flush_rows(session_factory, pending)
+            except BaseException:
+                # Devolve à frente da fila, na ordem de chegada (inclusive se a task for cancelada)
+                self._pending[:0] = pending
+                self.failed_flushes += 1
+                raise
+            self.flushes += 1
+            return written
+
+    async def _flush_rows(self, session_factory, pending: List[dict]) -> int:
+        """
+        Lote recusado pelo banco: grava uma mensagem por vez e descarta as
+        recusadas. `pending` fica só com as que faltam, se a conexão cair no meio.
+        """
+        written = 0
+        async with session_factory() as db:
+            while pending:
+                row = pending[0]
+                try:
+                    await db.execute(insert(models.ChatMessage).values(row))
+                    await db.commit()
+                    written += 1
+                    self.rows_written += 1
+                except Exception as e:
+                    await db.rollback()
+                    if is_connection_error(e):
+                        raise
+                    self.dropped += 1
+                    print(f"⚠ Mensagem do chat descartada (id {row['id']}, sala {row['match_id']}): {e}")
+                del pending[0]
+        return written
+
+    async def wait_for_batch(self, timeout: float) -> None:
+        """Espera um lote cheio ou o fim do intervalo"""
+        _, _, batch_ready = self._locks()
+        try:
+            await asyncio.wait_for(batch_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._ids.clear()
+        self._next_id = None
+        self._id_lock = self._flush_lock = self._batch_ready = None
+        self.accepted = self.flushes = self.rows_written = self.failed_flushes = self.dropped = 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CHAT_WRITE_BEHIND,
+            "pending": len(self._pending),
+            "reserved_ids": len(self._ids),
+            "accepted": self.accepted,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+
+chat_message_writer = ChatMessageWriter()
+
+
+async def keep_chat_messages_flushed(session_factory, interval: float = CHAT_WRITE_BEHIND_FLUSH_SECONDS):
+    """Tarefa de fundo do lifespan: grava as mensagens pendentes por tamanho ou tempo"""
+    while True:
+        await chat_message_writer.wait_for_batch(interval)
+        try:
+            await chat_message_writer.flush(session_factory)
+        except Exception as e:
+            print(f"⚠ Erro ao gravar mensagens do chat: {e}")
+            await asyncio.sleep(interval)
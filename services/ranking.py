@@ -0,0 +1,147 @@
+# services/ranking.py
+"""
+Ranking de candidatos do feed de descoberta.
+
+As features de cada candidato vêm de uma única consulta (subconsultas
+correlacionadas sobre likes/matches) e viram arrays NumPy; o score é uma soma
+ponderada calculada de uma vez para o lote inteiro, e o top-K sai de um
+argpartition (ordenação parcial) em vez de ordenar todos os candidatos.
+
+Features (todas normalizadas em [0, 1]):
+- recency: decaimento exponencial desde a última curtida enviada pelo candidato
+- like_back: 1 se o candidato já curtiu o usuário; senão a taxa suavizada de
+  curtidas recebidas que viraram match
+- mutual: matches em comum entre o usuário e o candidato (saturando)
+"""
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select, func, exists, or_, and_, case
+from sqlalchemy.orm import Session
+from database import models
+
+RECENCY_HALF_LIFE_HOURS = 72.0
+MUTUAL_SATURATION = 3.0
+
+DEFAULT_WEIGHTS = {
+    "recency": 0.30,
+    "like_back": 0.50,
+    "mutual": 0.20,
+}
+
+
+class CandidateFeatures:
+    """Features brutas de um lote de candidatos, uma posição por candidato"""
+
+    def __init__(self, ids, last_active_hours, liked_me, likes_received, matches, mutual):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        # Horas desde a última atividade (NaN = nunca)
+        self.last_active_hours = np.asarray(last_active_hours, dtype=np.float64)
+        self.liked_me = np.asarray(liked_me, dtype=np.float64)
+        self.likes_received = np.asarray(likes_received, dtype=np.float64)
+        self.matches = np.asarray(matches, dtype=np.float64)
+        self.mutual = np.asarray(mutual, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows, now: datetime) -> "CandidateFeatures":
+        columns = list(zip(*rows)) if rows else [()] * 6
+        ids, last_like_at, liked_me, likes_received, matches, mutual = columns
+        hours = [
+            (now - at).total_seconds() / 3600 if at is not None else np.nan
+            for at in last_like_at
+        ]
+        return cls(ids, hours, liked_me, likes_received, matches, mutual)
+
+
+def score_candidates(features: CandidateFeatures, weights: dict = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Score de cada candidato (vetorizado); maior = melhor"""
+    recency = np.exp2(-np.clip(features.last_active_hours, 0, None) / RECENCY_HALF_LIFE_HOURS)
+    recency = np.nan_to_num(recency, nan=0.0)
+    # Suavização de Laplace: quem nunca foi curtido fica em 0.5
+    like_back_rate = (features.matches + 1) / (features.likes_received + 2)
+    like_back = np.where(features.liked_me > 0, 1.0, like_back_rate)
+    mutual = 1 - np.exp(-features.mutual / MUTUAL_SATURATION)
+    return (
+        weights["recency"] * recency
+        + weights["like_back"] * like_back
+        + weights["mutual"] * mutual
+    )
+
+def top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[int]:
+    """Ids dos k maiores scores, em ordem (empate: menor id primeiro), via ordenação parcial"""
+    if k <= 0 or len(ids) == 0:
+        return []
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    order = best[np.lexsort((ids[best], -scores[best]))]
+    return ids[order].tolist()
+
+def top_k_after(ids: np.ndarray, scores: np.ndarray, k: int,
+                after: Optional[Tuple[float, int]] = None) -> List[Tuple[int, float]]:
+    """
+    Como top_k, mas só com quem vem depois de `after` = (score, id) na ordem
+    (score desc, id asc): continua um ranking já servido em parte sem repetir
+    nem pular ninguém. Retorna pares (id, score).
+    """
+    if after is not None:
+        last_score, last_id = after
+        remaining = (scores < last_score) | ((scores == last_score) & (ids > last_id))
+        ids, scores = ids[remaining], scores[remaining]
+    best = top_k(ids, scores, k)
+    score_by_id = dict(zip(ids.tolist(), scores.tolist()))
+    return [(user_id, score_by_id[user_id]) for user_id in best]
+
+
+def _features_query(user_id: int, candidate_ids: Sequence[int]):
+    """Uma linha de features por candidato, em uma única consulta"""
+    candidate = models.User.id
+    last_like_at = select(func.max(models.Like.created_at)).where(
+        models.Like.liker_id == candidate
+    ).scalar_subquery()
+    liked_me = exists().where(
+        models.Like.liker_id == candidate,
+        models.Like.liked_id == user_id
+    )
+    likes_received = select(func.count()).select_from(models.Like).where(
+        models.Like.liked_id == candidate
+    ).scalar_subquery()
+    matches = select(func.count()).select_from(models.Match).where(
+        models.Match.status == models.MatchStatus.MATCHED,
+        or_(models.Match.user_a_id == candidate, models.Match.user_b_id == candidate)
+    ).scalar_subquery()
+
+    # Parceiros de match do usuário e do candidato; mutual = interseção
+    my_partners = select(
+        case((models.Match.user_a_id == user_id, models.Match.user_b_id), else_=models.Match.user_a_id)
+    ).where(
+        models.Match.status == models.MatchStatus.MATCHED,
+        or_(models.Match.user_a_id == user_id, models.Match.user_b_id == user_id)
+    )
+    candidate_match = models.Match.__table__.alias("candidate_match")
+    mutual = select(func.count()).select_from(candidate_match).where(
+        candidate_match.c.status == models.MatchStatus.MATCHED,
+        or_(
+            and_(candidate_match.c.user_a_id == candidate, candidate_match.c.user_b_id.in_(my_partners)),
+            and_(candidate_match.c.user_b_id == candidate, candidate_match.c.user_a_id.in_(my_partners))
+        )
+    ).scalar_subquery()
+
+    return select(
+        candidate,
+        last_like_at,
+        case((liked_me, 1), else_=0),
+        likes_received,
+        matches,
+        mutual
+    ).where(candidate.in_(candidate_ids))
+
+def load_features(db: Session, user_id: int, candidate_ids: Sequence[int],
+                  now: Optional[datetime] = None) -> CandidateFeatures:
+    """Features dos candidatos; `now` fixo mantém a recência estável entre páginas do mesmo ranking"""
+    rows = db.execute(_features_query(user_id, candidate_ids)).all() if candidate_ids else []
+    return CandidateFeatures.from_rows(rows, now or datetime.utcnow())
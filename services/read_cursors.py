@@ -0,0 +1,183 @@
+# services/read_cursors.py
+"""
+Cursores de leitura do chat (chat_read_cursors), gravados com coalescência.
+
+O cliente manda um "marcar como lida" pelo WebSocket a cada mensagem exibida;
+gravar cada um seria uma escrita por mensagem. O ReadCursorWriter guarda em
+memória só o maior id por (sala, usuário) e um job do lifespan grava tudo a
+cada READ_CURSOR_FLUSH_SECONDS em um único upsert (o cursor nunca volta).
+No shutdown o que estiver pendente é gravado antes de sair.
+
+Ids fora de (0, MAX_MESSAGE_ID] são ignorados ao marcar. Se o banco recusar
+o lote mesmo assim, o flush tenta linha a linha e descarta (com log) as que
+forem recusadas; só falhas de conexão devolvem as marcações à fila.
+
+As contagens de não lidas (chat_service) podem atrasar até um intervalo em
+relação à última marcação. Cada worker tem o seu próprio writer.
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import case, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from database import models
+from database.pool import is_connection_error
+
+READ_CURSOR_FLUSH_SECONDS = float(os.getenv("READ_CURSOR_FLUSH_SECONDS", 2))
+# chat_read_cursors.last_read_message_id é INTEGER
+MAX_MESSAGE_ID = 2**31 - 1
+
+
+class ReadCursorWriter:
+    """(sala, usuário) → maior id marcado como lido, ainda não gravado"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict = {}
+        self.marks = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+
+    def mark(self, match_id: int, user_id: int, message_id: int) -> bool:
+        """Guarda a marcação; False (ignorada) se o id não cabe na coluna"""
+        if not 0 < message_id <= MAX_MESSAGE_ID:
+            return False
+        key = (match_id, user_id)
+        with self._lock:
+            self.marks += 1
+            if message_id > self._pending.get(key, 0):
+                self._pending[key] = message_id
+        return True
+
+    def _drain(self) -> dict:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def _restore(self, pending: dict) -> None:
+        """Devolve marcações não gravadas (sem passar por cima de outras mais novas)"""
+        with self._lock:
+            for key, message_id in pending.items():
+                if message_id > self._pending.get(key, 0):
+                    self._pending[key] = message_id
+
+    def flush(self, session_factory) -> int:
+        """Grava as marcações pendentes em um upsert; retorna quantos cursores"""
+        pending = self._drain()
+        if not pending:
+            return 0
+        try:
+            with session_factory() as db:
+                write_read_cursors(db, pending)
+            written = len(pending)
+        except Exception as e:
+            if is_connection_error(e):
+                self._restore(pending)
+                raise
+            written = self._flush_rows(session_factory, pending)
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += written
+        return written
+
+    def _flush_rows(self, session_factory, pending: dict) -> int:
+        """Lote recusado pelo banco: grava linha a linha e descarta as recusadas"""
+        rows = sorted(pending.items())
+        written = 0
+        with session_factory() as db:
+            for position, (key, message_id) in enumerate(rows):
+                try:
+                    write_read_cursors(db, {key: message_id})
+                    written += 1
+                except Exception as e:
+                    db.rollback()
+                    if is_connection_error(e):
+                        self._restore(dict(rows[position:]))
+                        raise
+                    with self._lock:
+                        self.dropped += 1
+                    print(f"⚠ Cursor de leitura descartado (sala {key[0]}, usuário {key[1]}, id {message_id}): {e.orig}")
+        return written
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self.marks = self.flushes = self.rows_written = self.dropped = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "marks": self.marks,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "dropped": self.dropped,
+            }
+
+
+read_cursor_writer = ReadCursorWriter()
+
+
+UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+def _write_read_cursors_generic(db: Session, cursors: dict, now: datetime) -> None:
+    """Dialetos sem ON CONFLICT: lê os cursores existentes e atualiza ou insere"""
+    keys = sorted(cursors)
+    existing = {
+        (cursor.match_id, cursor.user_id): cursor
+        for cursor in db.scalars(select(models.ChatReadCursor).where(
+            models.ChatReadCursor.match_id.in_({match_id for match_id, _ in keys}),
+            models.ChatReadCursor.user_id.in_({user_id for _, user_id in keys})
+        ))
+    }
+    for key in keys:
+        cursor = existing.get(key)
+        if cursor is None:
+            match_id, user_id = key
+            db.add(models.ChatReadCursor(
+                match_id=match_id, user_id=user_id,
+                last_read_message_id=cursors[key], updated_at=now
+            ))
+        elif cursors[key] > cursor.last_read_message_id:
+            cursor.last_read_message_id = cursors[key]
+            cursor.updated_at = now
+
+def write_read_cursors(db: Session, cursors: dict) -> None:
+    """Upsert de {(match_id, user_id): last_read_message_id}; mantém o maior id"""
+    now = datetime.utcnow()
+    insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        _write_read_cursors_generic(db, cursors, now)
+        db.commit()
+        return
+    statement = insert(models.ChatReadCursor).values([
+        {"match_id": match_id, "user_id": user_id, "last_read_message_id": message_id, "updated_at": now}
+        for (match_id, user_id), message_id in sorted(cursors.items())
+    ])
+    current = models.ChatReadCursor.last_read_message_id
+    statement = statement.on_conflict_do_update(
+        index_elements=["match_id", "user_id"],
+        set_={
+            "last_read_message_id": case(
+                (statement.excluded.last_read_message_id > current, statement.excluded.last_read_message_id),
+                else_=current
+            ),
+            "updated_at": statement.excluded.updated_at,
+        }
+    )
+    db.execute(statement)
+    db.commit()
+
+async def keep_read_cursors_flushed(session_factory, interval: float = READ_CURSOR_FLUSH_SECONDS):
+    """Tarefa de fundo do lifespan que grava as marcações pendentes periodicamente"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(read_cursor_writer.flush, session_factory)
+        except Exception as e:
+            print(f"⚠ Erro ao gravar cursores de leitura do chat: {e}")
@@ -1,8 +1,18 @@
 # services/user_service.py
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, exists
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import models
+from database.routing import replica_read
 from schemas import user as user_schema
 from auth.utils import get_password_hash
+from auth.cache import principal_cache
+from services.chat_access import chat_access
+from .candidate_index import candidate_index
+from .feed_store import feed_store
+from . import game_service
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
@@ -10,17 +20,36 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_id(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
-def create_user(db: Session, user: user_schema.UserCreate):
-    hashed_password = get_password_hash(user.password)
+# Sem lazy load no async: os jogos do principal vêm junto
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    query = select(models.User).where(models.User.email == email).options(selectinload(models.User.games))
+    return (await db.scalars(query.limit(1))).first()
+
+async def get_user_by_id_async(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id, options=[selectinload(models.User.games)])
+
+def create_user(db: Session, user: user_schema.UserCreate, hashed_password: Optional[str] = None):
+    """Cria o usuário; `hashed_password` já calculado (ex: pelo pool de hashing, no async) evita o bcrypt aqui"""
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
+    main_game, games = game_service.resolve_games(user.game, user.games)
     db_user = models.User(
         email=user.email, 
         hashed_password=hashed_password,
         is_active=True,
-        game=user.game
+        game=main_game
     )
     db.add(db_user)
+    game_service.set_user_games(db, db_user, games)
     db.commit()
     db.refresh(db_user)
+    candidate_index.user_changed(db_user.id, [], game_service.user_game_ids(db_user), db_user.is_active)
+    return db_user
+
+def update_password_hash(db: Session, db_user: models.User, hashed_password: str):
+    """Troca o hash da senha (ex: rehash transparente com novo custo do bcrypt)"""
+    db_user.hashed_password = hashed_password
+    db.commit()
     return db_user
 
 def update_user(db: Session, user_id: int, user_update: user_schema.UserUpdate):
@@ -28,24 +57,55 @@ def update_user(db: Session, user_id: int, user_update: user_schema.UserUpdate):
     if not db_user:
         return None
     
+    previous_email = db_user.email
+    previous_game = db_user.game
+    previous_game_ids = game_service.user_game_ids(db_user)
     # Atualiza apenas os campos fornecidos
     update_data = user_update.dict(exclude_unset=True)
+    games = update_data.pop("games", None)
+    if games is None and update_data.get("game"):
+        # Só `game` (clientes antigos): vira o jogo principal sem apagar os outros
+        games = [game.name for game in db_user.games]
+    if "game" in update_data or games is not None:
+        # Só `games`: mantém o jogo principal se ele continuar no conjunto
+        main_game = update_data.get("game", db_user.game if db_user.game in (games or []) else None)
+        update_data["game"], games = game_service.resolve_games(main_game, games)
+        game_service.set_user_games(db, db_user, games)
     for field, value in update_data.items():
         setattr(db_user, field, value)
+    # Mudar só os jogos não altera a linha de users: marca a mudança explicitamente
+    db_user.updated_at = datetime.utcnow()
     
     db.commit()
     db.refresh(db_user)
+    game_ids = game_service.user_game_ids(db_user)
+    # Invalida o principal em cache (email antigo e novo) para que
+    # mudanças de jogo/email/desativação apareçam na próxima requisição
+    principal_cache.invalidate(previous_email, db_user.email)
+    principal_cache.revoke_claims(db_user.id)
+    candidate_index.user_changed(db_user.id, previous_game_ids, game_ids, db_user.is_active)
+    if db_user.game != previous_game or game_ids != previous_game_ids or not db_user.is_active:
+        feed_store.invalidate(db_user.id)
+    if not db_user.is_active:
+        # Sockets de chat já autorizados deixam de poder escrever
+        chat_access.revoke(user_id=db_user.id)
     return db_user
 
+@replica_read
 def get_users_with_same_game(db: Session, current_user_id: int, current_user_game: str):
-    """Busca usuários que jogam o mesmo jogo, excluindo o usuário atual"""
+    """Busca usuários que têm o jogo entre os seus (user_games), excluindo o usuário atual"""
     if not current_user_game:
         return []
     
+    plays_game = exists().where(
+        models.UserGame.user_id == models.User.id,
+        models.UserGame.game_id == models.Game.id,
+        models.Game.name == current_user_game
+    )
     users = db.query(models.User).filter(
-        models.User.game == current_user_game,
+        plays_game,
         models.User.id != current_user_id,
         models.User.is_active == True
-    ).all()
+    ).options(selectinload(models.User.games)).all()
     
     return users
\ No newline at end of file
@@ -2,38 +2,66 @@
 Configuração global de testes - fixtures compartilhadas
 """
 import os
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
 # Configurar variáveis de ambiente para testes ANTES de importar main
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 os.environ["SECRET_KEY"] = "test-secret-key-for-testing-only"
 os.environ["ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "30"
+# Custo mínimo do bcrypt para os testes não ficarem lentos
+os.environ["BCRYPT_ROUNDS"] = "4"
+# O índice de candidatos é montado explicitamente nos testes que o usam
+os.environ["CANDIDATE_INDEX_ENABLED"] = "false"
+os.environ["FEED_PRECOMPUTE_ENABLED"] = "false"
 
 from main import app
-from database.connection import Base, get_db
+from database.connection import Base, get_db, get_async_db
 from database import models
+from auth.cache import principal_cache
+from services.candidate_index import candidate_index
+from services.feed_store import feed_store
+from services.game_service import game_catalog
+from services.read_cursors import read_cursor_writer
+from services.chat_access import chat_access
+from services.message_writer import chat_message_writer
 
-# Database de teste em memória (SQLite)
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Database de teste em arquivo temporário (SQLite), compartilhado entre a
+# engine síncrona e a assíncrona (aiosqlite) usada pelo WebSocket
+TEST_DB_PATH = os.path.join(tempfile.gettempdir(), f"gamerlink_test_{os.getpid()}.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: cada TestClient roda em um event loop próprio, então conexões
+# aiosqlite não podem ser reaproveitadas entre testes
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="function")
 def db():
     """Cria um banco de dados de teste limpo para cada teste"""
     # Cria todas as tabelas
     Base.metadata.create_all(bind=engine)
+    # O cache de principais é por processo: evita vazar usuários entre testes
+    principal_cache.clear()
+    candidate_index.clear()
+    feed_store.clear()
+    read_cursor_writer.clear()
+    chat_access.clear()
+    chat_message_writer.clear()
+    game_catalog.invalidate()
     
     # Cria uma sessão
     db = TestingSessionLocal()
@@ -54,32 +82,71 @@ def client(db):
         finally:
             pass
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as async_db:
+            yield async_db
+    
     # Override do get_db para usar o banco de teste
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     
-    # Override do SessionLocal para WebSocket também usar o banco de teste
-    # O WebSocket usa SessionLocal() diretamente, então precisamos fazer monkey patch
-    import database.connection as db_conn
-    original_SessionLocal = db_conn.SessionLocal
-    
-    # Criar uma função que retorna sempre a mesma sessão de teste
-    def mock_SessionLocal():
-        return db
-    
-    # Aplicar o monkey patch
-    db_conn.SessionLocal = mock_SessionLocal
-    
-    # Também fazer patch no import do chat.py se necessário
+    # O WebSocket usa AsyncSessionLocal() diretamente, então precisamos fazer monkey patch
     import routers.chat as chat_module
-    chat_module.SessionLocal = mock_SessionLocal
+    original_AsyncSessionLocal = chat_module.AsyncSessionLocal
+    chat_module.AsyncSessionLocal = TestingAsyncSessionLocal
     
     with TestClient(app) as test_client:
         yield test_client
     
     # Restaurar
     app.dependency_overrides.clear()
-    db_conn.SessionLocal = original_SessionLocal
-    chat_module.SessionLocal = original_SessionLocal
+    chat_module.AsyncSessionLocal = original_AsyncSessionLocal
+
+
+@pytest.fixture
+def internal_headers(monkeypatch):
+    """Liga os endpoints /internal/* com um token de teste; retorna o header"""
+    monkeypatch.setattr("routers.internal.INTERNAL_METRICS_TOKEN", "test-internal-token")
+    return {"X-Internal-Token": "test-internal-token"}
+
+
+@pytest.fixture
+def count_queries():
+    """Conta os statements SQL executados na engine de teste dentro do bloco `with`"""
+    class QueryCounter:
+        def __init__(self):
+            self.count = 0
+
+        def _on_execute(self, *args):
+            self.count += 1
+
+        def __enter__(self):
+            self.count = 0
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+            return self
+
+        def __exit__(self, *exc):
+            event.remove(engine, "before_cursor_execute", self._on_execute)
+            return False
+
+    return QueryCounter()
+
+
+@pytest.fixture
+def create_users():
+    """Cria usuários direto no banco (sem passar pelo bcrypt); retorna os ids"""
+    from services import game_service
+    def create(db, count, game="League of Legends", prefix="bulk"):
+        games = game_service.get_or_create_games(db, [game])
+        users = [
+            models.User(email=f"{prefix}{i}@example.com", hashed_password="x", is_active=True,
+                        game=game, games=games)
+            for i in range(count)
+        ]
+        db.add_all(users)
+        db.commit()
+        return [user.id for user in users]
+    return create
 
 
 @pytest.fixture
@@ -117,7 +184,9 @@ def created_user(client, test_user_data, db):
     """Cria um usuário e retorna os dados"""
     # Limpar qualquer usuário existente primeiro (garantir isolamento)
     from database import models
-    db.query(models.User).filter(models.User.email == test_user_data["email"]).delete()
+    # delete pela sessão (e não em massa) para levar junto as linhas de user_games
+    for existing in db.query(models.User).filter(models.User.email == test_user_data["email"]):
+        db.delete(existing)
     db.commit()
     
     response = client.post("/auth/register", json=test_user_data)
@@ -196,3 +265,10 @@ def two_users(client, test_user_data, test_user2_data):
         "headers2": {"Authorization": f"Bearer {token2}"}
     }
 
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Remove o arquivo do banco de teste ao final da sessão"""
+    engine.dispose()
+    if os.path.exists(TEST_DB_PATH):
+        os.remove(TEST_DB_PATH)
@@ -250,3 +250,180 @@ class TestGetMatches:
         response = client.get("/auth/users/match")
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
+
+
+class TestPrincipalCache:
+    """Testes para o cache de usuários autenticados"""
+    
+    def test_cache_hit_on_repeated_requests(self, client, auth_headers, internal_headers):
+        """Testa que requisições repetidas usam o cache em vez do banco"""
+        client.get("/auth/users/me", headers=auth_headers)
+        hits_before = client.get("/internal/auth/cache", headers=internal_headers).json()["hits"]
+        
+        response = client.get("/auth/users/me", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        stats = client.get("/internal/auth/cache", headers=internal_headers).json()
+        assert stats["hits"] == hits_before + 1
+        assert stats["size"] >= 1
+    
+    def test_update_invalidates_cache(self, client, auth_headers):
+        """Testa que atualizar o usuário invalida o principal em cache"""
+        client.get("/auth/users/me", headers=auth_headers)
+        client.put("/auth/users/me", headers=auth_headers, json={"game": "Valorant"})
+        
+        response = client.get("/auth/users/me", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["game"] == "Valorant"
+    
+    def test_deactivation_invalidates_cache(self, client, auth_headers):
+        """Testa que desativar o usuário reflete imediatamente no principal"""
+        client.get("/auth/users/me", headers=auth_headers)
+        client.put("/auth/users/me", headers=auth_headers, json={"is_active": False})
+        
+        response = client.get("/auth/users/me", headers=auth_headers)
+        assert response.json()["is_active"] is False
+
+
+class TestTokenClaims:
+    """Testes para o formato de token v2 (claims de perfil)"""
+    
+    def test_login_token_carries_user_claims(self, client, created_user, test_user_data):
+        """Testa que o token de login carrega id, jogo, status e versão"""
+        from jose import jwt
+        from auth import utils as auth_utils
+        
+        response = client.post(
+            "/auth/token",
+            data={"username": test_user_data["email"], "password": test_user_data["password"]}
+        )
+        payload = jwt.decode(
+            response.json()["access_token"],
+            auth_utils.SECRET_KEY,
+            algorithms=[auth_utils.ALGORITHM]
+        )
+        assert payload["sub"] == test_user_data["email"]
+        assert payload["uid"] == created_user["id"]
+        assert payload["game"] == test_user_data["game"]
+        assert payload["act"] is True
+        assert payload["ver"] == auth_utils.TOKEN_VERSION
+    
+    def test_claims_principal_skips_database(self, client, auth_headers, internal_headers):
+        """Testa que rotas de match com token v2 não consultam o cache/banco de usuários"""
+        stats_before = client.get("/internal/auth/cache", headers=internal_headers).json()
+        
+        response = client.get("/matches/me", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        stats_after = client.get("/internal/auth/cache", headers=internal_headers).json()
+        assert stats_after["hits"] == stats_before["hits"]
+        assert stats_after["misses"] == stats_before["misses"]
+    
+    def test_deactivation_rejects_claims_token(self, client, auth_headers):
+        """Testa que desativar o usuário barra na hora as rotas autenticadas pelos claims"""
+        assert client.get("/matches/me", headers=auth_headers).status_code == status.HTTP_200_OK
+        client.put("/auth/users/me", headers=auth_headers, json={"is_active": False})
+        
+        response = client.get("/matches/me", headers=auth_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        # O perfil continua acessível para reativar a conta
+        assert client.get("/auth/users/me", headers=auth_headers).json()["is_active"] is False
+    
+    @pytest.mark.parametrize("path", ["/discovery/feed", "/discovery/next", "/auth/users/match"])
+    def test_deactivated_user_cannot_browse(self, client, auth_headers, path):
+        """Testa que as rotas fresh (fora do próprio perfil) barram usuários desativados"""
+        assert client.get(path, headers=auth_headers).status_code == status.HTTP_200_OK
+        client.put("/auth/users/me", headers=auth_headers, json={"is_active": False})
+        
+        assert client.get(path, headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+        # Reativar pelo perfil devolve o acesso
+        client.put("/auth/users/me", headers=auth_headers, json={"is_active": True})
+        assert client.get(path, headers=auth_headers).status_code == status.HTTP_200_OK
+    
+    def test_old_claims_are_checked_against_database(self, client, auth_headers, db, monkeypatch):
+        """Testa que claims mais velhos que AUTH_CLAIMS_MAX_AGE_SECONDS passam pelo banco (ex: desativado em outro worker)"""
+        from database import models
+        user = db.query(models.User).filter(models.User.email == "test@example.com").one()
+        user.is_active = False
+        db.commit()
+        # Sem revoke_claims (mudança feita fora deste worker): claims recentes ainda valem
+        assert client.get("/matches/me", headers=auth_headers).status_code == status.HTTP_200_OK
+        
+        monkeypatch.setattr("auth.cache.AUTH_CLAIMS_MAX_AGE_SECONDS", 0)
+        response = client.get("/matches/me", headers=auth_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
+    def test_legacy_email_only_token(self, client, created_user, test_user_data):
+        """Testa que tokens antigos (apenas email em 'sub') continuam funcionando"""
+        from auth import utils as auth_utils
+        
+        legacy_token = auth_utils.create_access_token(data={"sub": test_user_data["email"]})
+        headers = {"Authorization": f"Bearer {legacy_token}"}
+        
+        response = client.get("/matches/me", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        response = client.get("/auth/users/me", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["id"] == created_user["id"]
+
+
+class TestPasswordHashing:
+    """Testes para o pool de hashing de senhas"""
+    
+    def test_login_rehashes_outdated_cost(self, client, db, created_user, test_user_data):
+        """Testa que o login refaz o hash de senhas salvas com custo antigo"""
+        import bcrypt
+        from auth import utils as auth_utils
+        from database import models
+        
+        user = db.query(models.User).filter(models.User.id == created_user["id"]).first()
+        old_hash = bcrypt.hashpw(
+            test_user_data["password"].encode("utf-8"),
+            bcrypt.gensalt(rounds=auth_utils.BCRYPT_ROUNDS + 1)
+        ).decode("utf-8")
+        user.hashed_password = old_hash
+        db.commit()
+        assert auth_utils.password_needs_rehash(old_hash)
+        
+        response = client.post(
+            "/auth/token",
+            data={"username": test_user_data["email"], "password": test_user_data["password"]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        
+        db.refresh(user)
+        assert user.hashed_password != old_hash
+        assert not auth_utils.password_needs_rehash(user.hashed_password)
+        assert auth_utils.verify_password(test_user_data["password"], user.hashed_password)
+    
+    def test_saturated_pool_returns_503(self, client, created_user, test_user_data, monkeypatch):
+        """Testa que o login falha rápido com 503 quando o pool está cheio"""
+        import threading
+        from auth import utils as auth_utils
+        
+        monkeypatch.setattr(auth_utils, "_hash_slots", threading.Semaphore(0))
+        response = client.post(
+            "/auth/token",
+            data={"username": test_user_data["email"], "password": test_user_data["password"]}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert "Retry-After" in response.headers
+    
+    def test_register_hashes_in_pool_without_blocking(self, client, test_user_data, monkeypatch):
+        """Testa que o registro usa o pool de hashing assíncrono (503 quando cheio, sem criar o usuário)"""
+        import threading
+        from auth import utils as auth_utils
+        
+        def blocking_hash(password):
+            raise AssertionError("registro não deve esperar o bcrypt numa thread do AnyIO")
+        monkeypatch.setattr("services.user_service.get_password_hash", blocking_hash)
+        
+        monkeypatch.setattr(auth_utils, "_hash_slots", threading.Semaphore(0))
+        response = client.post("/auth/register", json=test_user_data)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        
+        monkeypatch.setattr(auth_utils, "_hash_slots", threading.Semaphore(2))
+        response = client.post("/auth/register", json=test_user_data)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["email"] == test_user_data["email"]
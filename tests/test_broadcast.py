@@ -0,0 +1,313 @@
+"""
+Testes para o fan-out do chat entre workers (services/broadcast.py)
+"""
+import asyncio
+import json
+import os
+import time
+import pytest
+
+
+class FakeWebSocket:
+    """Socket local mínimo: guarda o que foi enviado"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def _workers(backend, count=2):
+    """Um ConnectionManager por "worker", todos no mesmo backend"""
+    from routers.chat import ConnectionManager
+    return [ConnectionManager(backend) for _ in range(count)]
+
+
+async def _drain(*managers):
+    """Espera as tasks de escrita esvaziarem as filas"""
+    for manager in managers:
+        for connections in list(manager.active_connections.values()):
+            for connection in list(connections):
+                await connection.queue.join()
+
+
+class TestInMemoryBroadcast:
+    """Testes com o backend em memória"""
+
+    def test_publish_once_deliver_on_every_worker(self):
+        """Testa que uma publicação chega aos sockets da sala em todos os workers"""
+        from services.broadcast import InMemoryBroadcast, encode_frame
+        backend = InMemoryBroadcast()
+        published = []
+        original_publish = backend.publish
+
+        async def counting_publish(event):
+            published.append(event)
+            await original_publish(event)
+        backend.publish = counting_publish
+        worker_a, worker_b = _workers(backend)
+        sender, receiver, other_room = FakeWebSocket(1), FakeWebSocket(2), FakeWebSocket(3)
+
+        async def scenario():
+            await worker_a.connect(sender, 10, 1)
+            await worker_b.connect(receiver, 10, 2)
+            await worker_b.connect(other_room, 11, 3)
+            await worker_a.broadcast(encode_frame({"id": 1, "content": "oi"}), 10)
+            await worker_a.broadcast(encode_frame({"id": 2, "content": "só pro outro"}), 10, exclude_user=1)
+            await _drain(worker_a, worker_b)
+        asyncio.run(scenario())
+
+        assert len(published) == 2
+        assert [json.loads(frame) for frame in sender.sent] == [{"id": 1, "content": "oi"}]
+        assert len(receiver.sent) == 2
+        assert json.loads(receiver.sent[1])["content"] == "só pro outro"
+        assert other_room.sent == []
+
+    def test_failed_socket_is_dropped(self):
+        """Testa que um socket que falha sai das conexões locais"""
+        from services.broadcast import InMemoryBroadcast
+
+        class BrokenWebSocket(FakeWebSocket):
+            async def send_text(self, text):
+                raise RuntimeError("closed")
+        worker, = _workers(InMemoryBroadcast(), count=1)
+
+        async def scenario():
+            await worker.connect(BrokenWebSocket(1), 10, 1)
+            await worker.broadcast('{"id":1}', 10)
+            await asyncio.sleep(0)
+        asyncio.run(scenario())
+        assert worker.active_connections == {}
+        assert worker.stats()["send_errors"] == 1
+
+    def test_oversized_event_is_sent_by_reference(self, client, two_users, db):
+        """Testa que um evento grande demais vira só o id e cada worker relê a mensagem"""
+        from database import models
+        from services import chat_service
+        from services.broadcast import InMemoryBroadcast, PayloadTooLarge, encode_frame
+        user1, user2 = two_users["user1"], two_users["user2"]
+        match = models.Match(
+            user_a_id=min(user1["id"], user2["id"]), user_b_id=max(user1["id"], user2["id"]),
+            status=models.MatchStatus.MATCHED
+        )
+        db.add(match)
+        db.flush()
+        message = models.ChatMessage(match_id=match.id, sender_id=user1["id"], content="x" * 10000)
+        db.add(message)
+        db.commit()
+
+        class SmallBroadcast(InMemoryBroadcast):
+            async def publish(self, event):
+                if "frame" in event:
+                    raise PayloadTooLarge()
+                await super().publish(event)
+        worker_a, worker_b = _workers(SmallBroadcast())
+        receiver = FakeWebSocket(user2["id"])
+        frame = encode_frame(chat_service.broadcast_payload(message, user1["email"]))
+
+        async def scenario():
+            await worker_b.connect(receiver, match.id, user2["id"])
+            await worker_a.broadcast(frame, match.id, message_id=message.id)
+            await _drain(worker_b)
+        asyncio.run(scenario())
+
+        delivered = json.loads(receiver.sent[0])
+        assert delivered["id"] == message.id
+        assert delivered["sender_email"] == user1["email"]
+        assert len(delivered["content"]) == 10000
+
+    def test_backend_failure_falls_back_to_local_delivery(self):
+        """Testa que, com o backend fora, a sala ainda recebe neste worker e quem envia segue conectado"""
+        from services.broadcast import InMemoryBroadcast, encode_frame
+
+        class DownBroadcast(InMemoryBroadcast):
+            async def publish(self, event):
+                raise RuntimeError("LISTEN connection is down")
+        worker, = _workers(DownBroadcast(), count=1)
+        sender, receiver = FakeWebSocket(1), FakeWebSocket(2)
+
+        async def scenario():
+            await worker.connect(sender, 10, 1)
+            await worker.connect(receiver, 10, 2)
+            await worker.broadcast(encode_frame({"id": 1, "content": "oi"}), 10, exclude_user=1, message_id=1)
+            await _drain(worker)
+        asyncio.run(scenario())
+
+        assert [json.loads(frame) for frame in receiver.sent] == [{"id": 1, "content": "oi"}]
+        assert sender.sent == []
+        assert len(worker.active_connections[10]) == 2
+        assert worker.stats()["publish_errors"] == 1
+
+
+class TestBackpressure:
+    """Testes para as filas de saída por conexão"""
+
+    def test_slow_client_does_not_block_others(self):
+        """Testa que um socket travado não atrasa os outros e é desconectado ao estourar a fila"""
+        from services.broadcast import InMemoryBroadcast
+        from routers.chat import ConnectionManager
+
+        class StuckWebSocket(FakeWebSocket):
+            def __init__(self, user_id):
+                super().__init__(user_id)
+                self.release = asyncio.Event()
+                self.closed_with = None
+
+            async def send_text(self, text):
+                await self.release.wait()
+
+            async def close(self, code=1000):
+                self.closed_with = code
+        manager = ConnectionManager(InMemoryBroadcast(), queue_size=3)
+        stuck, fast = StuckWebSocket(1), FakeWebSocket(2)
+
+        async def scenario():
+            await manager.connect(stuck, 10, 1)
+            await manager.connect(fast, 10, 2)
+            for n in range(3):
+                await manager.broadcast(f'{{"id":{n}}}', 10)
+                await asyncio.sleep(0)
+            # Um em envio, dois na fila
+            depth = manager.stats()["max_queue_depth"]
+            for n in range(3, 6):
+                await asyncio.wait_for(manager.broadcast(f'{{"id":{n}}}', 10), timeout=1)
+            await _drain(manager)
+            await asyncio.sleep(0)
+            return depth
+        depth = asyncio.run(scenario())
+
+        assert depth == 2
+        assert len(fast.sent) == 6
+        assert stuck.closed_with == 1013
+        stats = manager.stats()
+        assert stats["connections"] == 1
+        assert stats["dropped"] == 1
+        assert stats["slow_disconnects"] == 1
+
+
+class TestFrames:
+    """Testes para os frames pré-codificados"""
+
+    def test_frame_is_encoded_once_and_shared(self, monkeypatch):
+        """Testa que todos os sockets (inclusive vários aparelhos do mesmo usuário) recebem o mesmo objeto"""
+        from services import broadcast
+        from services.broadcast import InMemoryBroadcast, encode_frame
+        worker_a, worker_b = _workers(InMemoryBroadcast())
+        sockets = [FakeWebSocket(user_id) for user_id in (1, 1, 2, 2, 2)]
+        calls = []
+        original = broadcast.encode_event
+        monkeypatch.setattr(broadcast, "encode_event", lambda event: calls.append(event) or original(event))
+
+        async def scenario():
+            for n, socket in enumerate(sockets):
+                await (worker_a if n % 2 else worker_b).connect(socket, 10, socket.user_id)
+            await worker_a.broadcast(encode_frame({"id": 1, "content": "ação"}), 10, exclude_user=1)
+            await _drain(worker_a, worker_b)
+        asyncio.run(scenario())
+
+        assert calls == []
+        assert [socket.sent for socket in sockets[:2]] == [[], []]
+        frames = [socket.sent[0] for socket in sockets[2:]]
+        assert all(frame is frames[0] for frame in frames)
+        assert json.loads(frames[0]) == {"id": 1, "content": "ação"}
+
+    def test_encode_frame_without_orjson(self, monkeypatch):
+        """Testa que sem orjson o frame sai igual pelo json da biblioteca padrão"""
+        from services import broadcast
+        data = {"id": 1, "content": "olá", "created_at": "2026-01-01T00:00:00"}
+        expected = broadcast.encode_frame(data)
+        monkeypatch.setattr(broadcast, "orjson", None)
+        assert broadcast.encode_frame(data) == expected
+        assert json.loads(broadcast.encode_event({"frame": expected}))["frame"] == expected
+
+    @pytest.mark.slow
+    def test_benchmark_room_fan_out(self):
+        """Benchmark: entregar a uma sala grande (muitos aparelhos por usuário) com um frame único vs json.dumps por socket"""
+        from services.broadcast import InMemoryBroadcast, encode_frame
+        from routers.chat import ConnectionManager
+        users, devices, messages = 50, 4, 200
+        payload = {
+            "type": "message", "id": 123456, "sender_id": 1, "content": "mensagem de teste " * 10,
+            "created_at": "2026-01-01T12:00:00", "sender_email": "player@example.com",
+        }
+
+        async def scenario():
+            manager = ConnectionManager(InMemoryBroadcast(), queue_size=messages + 1)
+            for user_id in range(users):
+                for _ in range(devices):
+                    await manager.connect(FakeWebSocket(user_id), 10, user_id)
+            connections = manager.active_connections[10]
+            for connection in connections:
+                connection.writer.cancel()
+
+            start = time.perf_counter()
+            for _ in range(messages):
+                for connection in connections:
+                    connection.queue.put_nowait(json.dumps(payload))
+            per_socket = time.perf_counter() - start
+            for connection in connections:
+                while not connection.queue.empty():
+                    connection.queue.get_nowait()
+
+            start = time.perf_counter()
+            for _ in range(messages):
+                await manager.broadcast(encode_frame(payload), 10, exclude_user=0)
+            encoded_once = time.perf_counter() - start
+            return per_socket, encoded_once, connections
+        per_socket, encoded_once, connections = asyncio.run(scenario())
+
+        sockets = users * devices
+        print(f"\n{messages} mensagens x {sockets} sockets: json.dumps por socket {per_socket * 1000:.1f} ms, "
+              f"frame único {encoded_once * 1000:.1f} ms")
+        assert sum(connection.queue.qsize() for connection in connections) == messages * (sockets - devices)
+        assert encoded_once < per_socket
+
+
+class TestBackendSelection:
+    """Testes para create_broadcast_backend"""
+
+    def test_defaults_follow_database_url(self):
+        """Testa o backend padrão conforme o banco"""
+        from services.broadcast import create_broadcast_backend, InMemoryBroadcast, PostgresBroadcast
+        assert isinstance(create_broadcast_backend("sqlite:///./app.db"), InMemoryBroadcast)
+        backend = create_broadcast_backend("postgresql+psycopg2://u:p@db:5432/app")
+        assert isinstance(backend, PostgresBroadcast)
+        assert backend.dsn == "postgresql://u:p@db:5432/app"
+        assert isinstance(create_broadcast_backend("postgresql://u:p@db/app", kind="memory"), InMemoryBroadcast)
+
+
+@pytest.mark.integration
+@pytest.mark.postgres
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL não definida")
+class TestPostgresBroadcast:
+    """Testes com LISTEN/NOTIFY em um Postgres de verdade (TEST_POSTGRES_URL)"""
+
+    def test_notify_reaches_every_worker(self):
+        """Testa que dois "workers" com conexões próprias recebem a mesma publicação"""
+        from services.broadcast import create_broadcast_backend
+
+        async def scenario():
+            backends = [create_broadcast_backend(os.environ["TEST_POSTGRES_URL"], kind="postgres") for _ in range(2)]
+            received = [[], []]
+            for backend, inbox in zip(backends, received):
+                async def handler(event, inbox=inbox):
+                    inbox.append(event)
+                backend.subscribe(handler)
+                await backend.start()
+            try:
+                await backends[0].publish({"match_id": 1, "message": {"id": 7}})
+                for _ in range(50):
+                    if all(received):
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                for backend in backends:
+                    await backend.stop()
+            return received
+        received = asyncio.run(scenario())
+        assert received == [[{"match_id": 1, "message": {"id": 7}}]] * 2
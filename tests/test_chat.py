@@ -45,6 +45,76 @@ class TestGetChatRooms:
         """Testa obter salas sem autenticação"""
         response = client.get("/chat/rooms")
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    @staticmethod
+    def _rooms_with_history(db, me, others, messages_per_room=3):
+        """Cria um match por usuário; a sala i tem a atividade mais recente em i minutos"""
+        from datetime import datetime, timedelta
+        from database import models
+        start = datetime(2024, 1, 1)
+        match_ids = []
+        for i, other in enumerate(others):
+            match = models.Match(
+                user_a_id=min(me, other), user_b_id=max(me, other),
+                status=models.MatchStatus.MATCHED, created_at=start
+            )
+            db.add(match)
+            db.flush()
+            db.add_all([
+                models.ChatMessage(
+                    match_id=match.id, sender_id=other if n % 2 else me,
+                    content=f"sala {i} msg {n}", created_at=start + timedelta(minutes=i, seconds=n)
+                )
+                for n in range(messages_per_room)
+            ])
+            match_ids.append(match.id)
+        db.commit()
+        return match_ids
+    
+    def test_rooms_ordered_by_last_activity_with_last_message(self, client, auth_headers, db, create_users):
+        """Testa a ordem por última atividade e a última mensagem de cada sala"""
+        me = client.get("/auth/users/me", headers=auth_headers).json()["id"]
+        others = create_users(db, 3)
+        match_ids = self._rooms_with_history(db, me, others)
+        
+        rooms = client.get("/chat/rooms", headers=auth_headers).json()
+        assert [room["match_id"] for room in rooms] == match_ids[::-1]
+        assert [room["other_user"]["id"] for room in rooms] == others[::-1]
+        assert rooms[0]["last_message"]["content"] == "sala 2 msg 2"
+        assert rooms[0]["last_message"]["sender"]["id"] == me
+    
+    def test_rooms_keyset_pagination(self, client, auth_headers, db, create_users):
+        """Testa percorrer as salas com before_activity/before_match_id"""
+        me = client.get("/auth/users/me", headers=auth_headers).json()["id"]
+        match_ids = self._rooms_with_history(db, me, create_users(db, 5))
+        
+        seen, params = [], {"limit": 2}
+        while True:
+            page = client.get("/chat/rooms", params=params, headers=auth_headers).json()
+            seen += [room["match_id"] for room in page]
+            if len(page) < 2:
+                break
+            params = {"limit": 2, "before_activity": page[-1]["last_activity_at"], "before_match_id": page[-1]["match_id"]}
+        assert seen == match_ids[::-1]
+        
+        response = client.get("/chat/rooms", params={"before_match_id": 1}, headers=auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    @pytest.mark.parametrize("room_count", [1, 20])
+    def test_rooms_query_count_is_constant(self, db, count_queries, create_users, room_count):
+        """Testa que a lista de salas não faz consultas por sala nem lê o histórico inteiro"""
+        from schemas import chat as chat_schema
+        from services import chat_service
+        me, *others = create_users(db, room_count + 1)
+        self._rooms_with_history(db, me, others, messages_per_room=10)
+        db.expunge_all()
+        
+        with count_queries as counter:
+            rooms = [chat_schema.ChatRoom.model_validate(room) for room in chat_service.get_chat_rooms(db, me)]
+        assert len(rooms) == room_count
+        assert all(room.last_message.content.endswith("msg 9") for room in rooms)
+        # salas + jogos dos outros usuários + jogos dos remetentes + não lidas
+        assert counter.count == 4
 
 
 class TestGetChatMessages:
@@ -131,6 +201,53 @@ class TestGetChatMessages:
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
+class TestChatHistoryPagination:
+    """Testes para a paginação keyset de /chat/messages/{match_id}"""
+    
+    @pytest.fixture
+    def history(self, two_users, db):
+        """Match entre user1 e user2 com 7 mensagens; retorna (match_id, ids)"""
+        from database import models
+        user1, user2 = two_users["user1"]["id"], two_users["user2"]["id"]
+        match = models.Match(user_a_id=min(user1, user2), user_b_id=max(user1, user2), status=models.MatchStatus.MATCHED)
+        db.add(match)
+        db.flush()
+        messages = [models.ChatMessage(match_id=match.id, sender_id=(user1, user2)[n % 2], content=f"msg {n}") for n in range(7)]
+        db.add_all(messages)
+        db.commit()
+        return match.id, [message.id for message in messages]
+    
+    def test_default_page_is_most_recent(self, client, two_users, history):
+        """Testa que sem parâmetros vêm as mais recentes, em ordem crescente"""
+        match_id, ids = history
+        response = client.get(f"/chat/messages/{match_id}?limit=3", headers=two_users["headers1"])
+        assert [m["id"] for m in response.json()] == ids[-3:]
+    
+    def test_before_and_after(self, client, two_users, history):
+        """Testa voltar com before_id e avançar com after_id"""
+        match_id, ids = history
+        headers = two_users["headers1"]
+        seen, before = [], None
+        while True:
+            params = {"limit": 3} if before is None else {"limit": 3, "before_id": before}
+            page = client.get(f"/chat/messages/{match_id}", params=params, headers=headers).json()
+            seen = [m["id"] for m in page] + seen
+            if len(page) < 3:
+                break
+            before = page[0]["id"]
+        assert seen == ids
+        
+        page = client.get(f"/chat/messages/{match_id}", params={"after_id": ids[1], "limit": 2}, headers=headers).json()
+        assert [m["id"] for m in page] == ids[2:4]
+        assert page[0]["sender"]["id"] == two_users["user1"]["id"]
+    
+    def test_limit_is_capped(self, client, two_users, history):
+        """Testa o limite máximo por página"""
+        match_id, _ = history
+        response = client.get(f"/chat/messages/{match_id}?limit=10000", headers=two_users["headers1"])
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 class TestWebSocket:
     """Testes para WebSocket de chat"""
     
@@ -229,3 +346,505 @@ class TestWebSocket:
             assert "sender_id" in data
             assert "created_at" in data
 
+    
+    def test_websocket_message_persisted(self, client, two_users):
+        """Testa que a mensagem salva pela sessão assíncrona aparece no histórico"""
+        client.post(
+            f"/matches/like/{two_users['user2']['id']}",
+            headers=two_users["headers1"]
+        )
+        like_response = client.post(
+            f"/matches/like/{two_users['user1']['id']}",
+            headers=two_users["headers2"]
+        )
+        match_id = like_response.json()["match_id"]
+        
+        with client.websocket_connect(
+            f"/chat/ws/{match_id}?token={two_users['token1']}"
+        ) as websocket:
+            websocket.send_json({"content": "Persistida"})
+            sent = websocket.receive_json()
+        
+        response = client.get(
+            f"/chat/messages/{match_id}",
+            headers=two_users["headers2"]
+        )
+        messages = response.json()
+        assert [m["id"] for m in messages] == [sent["id"]]
+        assert messages[0]["content"] == "Persistida"
+
+
+class TestUnreadCounts:
+    """Testes para as não lidas (chat_read_cursors)"""
+    
+    @pytest.fixture
+    def room(self, client, two_users):
+        """Match entre user1 e user2; retorna o match_id"""
+        client.post(f"/matches/like/{two_users['user2']['id']}", headers=two_users["headers1"])
+        like_response = client.post(f"/matches/like/{two_users['user1']['id']}", headers=two_users["headers2"])
+        return like_response.json()["match_id"]
+    
+    @staticmethod
+    def _send(client, match_id, token, *contents):
+        with client.websocket_connect(f"/chat/ws/{match_id}?token={token}") as websocket:
+            ids = []
+            for content in contents:
+                websocket.send_json({"content": content})
+                ids.append(websocket.receive_json()["id"])
+        return ids
+    
+    def test_unread_counts_messages_after_cursor(self, client, two_users, room, db):
+        """Testa que só as mensagens do outro usuário depois do cursor contam"""
+        from services import chat_service
+        from services.read_cursors import write_read_cursors
+        user1 = two_users["user1"]["id"]
+        first, second, _ = self._send(client, room, two_users["token2"], "a", "b", "c")
+        self._send(client, room, two_users["token1"], "minha")
+        
+        rooms = client.get("/chat/rooms", headers=two_users["headers1"]).json()
+        assert rooms[0]["unread_count"] == 3
+        
+        write_read_cursors(db, {(room, user1): second})
+        assert chat_service.get_unread_counts(db, user1, [room]) == {room: 1}
+        # O cursor nunca volta
+        write_read_cursors(db, {(room, user1): first})
+        assert chat_service.get_unread_counts(db, user1, [room]) == {room: 1}
+        assert chat_service.get_unread_counts(db, two_users["user2"]["id"], [room]) == {room: 1}
+    
+    def test_read_cursors_without_upsert(self, client, two_users, room, db, monkeypatch):
+        """Testa o caminho genérico (dialetos sem ON CONFLICT): insere, avança e nunca volta"""
+        from database import models
+        from services import read_cursors
+        monkeypatch.setattr(read_cursors, "UPSERT_INSERTS", {})
+        user1, user2 = two_users["user1"]["id"], two_users["user2"]["id"]
+        first, second = self._send(client, room, two_users["token2"], "a", "b")
+        
+        read_cursors.write_read_cursors(db, {(room, user1): first, (room, user2): second})
+        read_cursors.write_read_cursors(db, {(room, user1): second})
+        read_cursors.write_read_cursors(db, {(room, user2): first})
+        
+        cursors = {
+            cursor.user_id: cursor.last_read_message_id
+            for cursor in db.query(models.ChatReadCursor).all()
+        }
+        assert cursors == {user1: second, user2: second}
+    
+    def test_read_marks_are_coalesced(self, db, count_queries, create_users):
+        """Testa que várias marcações viram um upsert com o maior id por sala"""
+        from tests.conftest import TestingSessionLocal
+        from database import models
+        from services.read_cursors import ReadCursorWriter
+        me, a, b = create_users(db, 3)
+        rooms = [models.Match(user_a_id=me, user_b_id=o, status=models.MatchStatus.MATCHED) for o in (a, b)]
+        db.add_all(rooms)
+        db.commit()
+        writer = ReadCursorWriter()
+        for message_id in (5, 9, 7):
+            writer.mark(rooms[0].id, me, message_id)
+            writer.mark(rooms[1].id, me, message_id + 100)
+        
+        with count_queries as counter:
+            assert writer.flush(TestingSessionLocal) == 2
+        assert counter.count == 1
+        assert writer.flush(TestingSessionLocal) == 0
+        cursors = {c.match_id: c.last_read_message_id for c in db.query(models.ChatReadCursor)}
+        assert cursors == {rooms[0].id: 9, rooms[1].id: 109}
+        assert writer.stats() == {"pending": 0, "marks": 6, "flushes": 1, "rows_written": 2, "dropped": 0}
+    
+    def test_out_of_range_read_marks_are_ignored(self):
+        """Testa que ids fora do INTEGER da coluna não entram na fila"""
+        from services.read_cursors import ReadCursorWriter, MAX_MESSAGE_ID
+        writer = ReadCursorWriter()
+        assert writer.mark(1, 1, MAX_MESSAGE_ID + 1) is False
+        assert writer.mark(1, 1, 0) is False
+        assert writer.mark(1, 1, MAX_MESSAGE_ID) is True
+        assert writer.stats()["pending"] == 1
+    
+    def test_rejected_read_cursor_is_dropped(self, db, create_users, monkeypatch):
+        """Testa que uma linha recusada pelo banco é descartada e as outras são gravadas"""
+        from sqlalchemy.exc import DataError
+        from tests.conftest import TestingSessionLocal
+        from database import models
+        from services import read_cursors
+        me, a, b = create_users(db, 3)
+        rooms = [models.Match(user_a_id=me, user_b_id=o, status=models.MatchStatus.MATCHED) for o in (a, b)]
+        db.add_all(rooms)
+        db.commit()
+        bad = (rooms[0].id, me)
+        write = read_cursors.write_read_cursors
+        
+        def reject_bad_row(session, cursors):
+            if bad in cursors:
+                raise DataError("INSERT", {}, Exception("value out of range"))
+            write(session, cursors)
+        
+        monkeypatch.setattr(read_cursors, "write_read_cursors", reject_bad_row)
+        writer = read_cursors.ReadCursorWriter()
+        writer.mark(rooms[0].id, me, 5)
+        writer.mark(rooms[1].id, me, 7)
+        
+        assert writer.flush(TestingSessionLocal) == 1
+        # Nada volta para a fila: o próximo flush não tenta a linha recusada de novo
+        assert writer.flush(TestingSessionLocal) == 0
+        cursors = {c.match_id: c.last_read_message_id for c in db.query(models.ChatReadCursor)}
+        assert cursors == {rooms[1].id: 7}
+        assert writer.stats()["dropped"] == 1
+    
+    def test_read_cursors_return_to_queue_when_database_is_down(self, monkeypatch):
+        """Testa que falhas de conexão devolvem as marcações para o próximo flush"""
+        from sqlalchemy.exc import OperationalError
+        from tests.conftest import TestingSessionLocal
+        from services import read_cursors
+        
+        def database_down(session, cursors):
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+        
+        monkeypatch.setattr(read_cursors, "write_read_cursors", database_down)
+        writer = read_cursors.ReadCursorWriter()
+        writer.mark(1, 1, 5)
+        with pytest.raises(OperationalError):
+            writer.flush(TestingSessionLocal)
+        assert writer.stats()["pending"] == 1
+        assert writer.stats()["dropped"] == 0
+    
+    def test_websocket_mark_read(self, client, two_users, room):
+        """Testa marcar como lida pelo WebSocket e zerar a contagem após o flush"""
+        from tests.conftest import TestingSessionLocal
+        from services.read_cursors import read_cursor_writer
+        ids = self._send(client, room, two_users["token2"], "a", "b")
+        
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+            websocket.send_json({"type": "read", "message_id": ids[0]})
+            websocket.send_json({"type": "read", "message_id": ids[1]})
+            # Mensagem normal depois: garante que as marcações já foram processadas
+            websocket.send_json({"content": "ok"})
+            websocket.receive_json()
+        
+        read_cursor_writer.flush(TestingSessionLocal)
+        rooms = client.get("/chat/rooms", headers=two_users["headers1"]).json()
+        assert rooms[0]["unread_count"] == 0
+        rooms = client.get("/chat/rooms", headers=two_users["headers2"]).json()
+        assert rooms[0]["unread_count"] == 1
+
+
+class TestAuthorizedSession:
+    """Testes para as sessões de chat já autorizadas (services/chat_access.py)"""
+    
+    @pytest.fixture
+    def room(self, client, two_users):
+        """Match entre user1 e user2; retorna o match_id"""
+        client.post(f"/matches/like/{two_users['user2']['id']}", headers=two_users["headers1"])
+        like_response = client.post(f"/matches/like/{two_users['user1']['id']}", headers=two_users["headers2"])
+        return like_response.json()["match_id"]
+    
+    def test_message_on_authorized_socket_is_one_insert(self, client, two_users, room):
+        """Testa que, depois de conectar, cada mensagem custa só o INSERT"""
+        from sqlalchemy import event
+        from tests.conftest import async_engine
+        statements = []
+        
+        def on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+            websocket.send_json({"content": "primeira"})
+            websocket.receive_json()
+            event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+            try:
+                for content in ("a", "b", "c"):
+                    websocket.send_json({"content": content})
+                    websocket.receive_json()
+            finally:
+                event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        
+        assert len(statements) == 3
+        assert all(statement.lstrip().upper().startswith("INSERT") for statement in statements)
+    
+    def test_deactivation_revokes_open_socket(self, client, two_users, room):
+        """Testa que desativar o usuário fecha o socket aberto e nada enviado depois é gravado"""
+        from starlette.websockets import WebSocketDisconnect
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+            websocket.send_json({"content": "antes"})
+            websocket.receive_json()
+            client.put("/auth/users/me", headers=two_users["headers1"], json={"is_active": False})
+            websocket.send_json({"content": "depois"})
+            with pytest.raises(WebSocketDisconnect) as closed:
+                websocket.receive_json()
+        assert closed.value.code == status.WS_1008_POLICY_VIOLATION
+        
+        messages = client.get(f"/chat/messages/{room}", headers=two_users["headers2"]).json()
+        assert [m["content"] for m in messages] == ["antes"]
+    
+    def test_sent_message_starts_sticky_window(self, client, two_users, room):
+        """Testa que enviar pelo WebSocket prende quem enviou ao primário (read-your-writes)"""
+        from database.routing import sticky_writes
+        sticky_writes.clear()
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+            websocket.send_json({"content": "oi"})
+            websocket.receive_json()
+        assert sticky_writes.is_sticky(two_users["user1"]["id"])
+        assert not sticky_writes.is_sticky(two_users["user2"]["id"])
+        sticky_writes.clear()
+    
+    def test_deactivated_user_cannot_reconnect(self, client, two_users, room):
+        """Testa que o token de um usuário desativado não abre um novo socket"""
+        from starlette.websockets import WebSocketDisconnect
+        client.put("/auth/users/me", headers=two_users["headers1"], json={"is_active": False})
+        
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+                websocket.receive_json()
+        assert closed.value.code == status.WS_1008_POLICY_VIOLATION
+    
+    def test_revoked_socket_is_closed_and_stops_receiving(self, client, two_users, room):
+        """Testa que revogar fecha o socket na hora, sem esperar ele enviar, e ele sai das entregas"""
+        from starlette.websockets import WebSocketDisconnect
+        from routers.chat import manager
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as revoked, \
+                client.websocket_connect(f"/chat/ws/{room}?token={two_users['token2']}") as other:
+            client.put("/auth/users/me", headers=two_users["headers1"], json={"is_active": False})
+            with pytest.raises(WebSocketDisconnect) as closed:
+                revoked.receive_json()
+            assert closed.value.code == status.WS_1008_POLICY_VIOLATION
+            
+            other.send_json({"content": "só pro user2"})
+            assert other.receive_json()["content"] == "só pro user2"
+            assert [c.user_id for c in manager.active_connections[room]] == [two_users["user2"]["id"]]
+    
+    def test_revocation_reaches_other_workers(self):
+        """Testa que revogar em um worker (de uma thread síncrona) marca as sessões do outro"""
+        import asyncio
+        from services.broadcast import InMemoryBroadcast
+        from services.chat_access import ChatAccess
+        backend = InMemoryBroadcast()
+        worker_a, worker_b = ChatAccess(), ChatAccess()
+        
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            worker_a.bind(backend, loop)
+            worker_b.bind(backend, loop)
+            kept = worker_b.authorize(10, 1)
+            other_room = worker_b.authorize(11, 2)
+            revoked = worker_b.authorize(11, 1)
+            await asyncio.to_thread(worker_a.revoke, user_id=1, match_id=11)
+            for _ in range(10):
+                await asyncio.sleep(0)
+            return kept, other_room, revoked
+        kept, other_room, revoked = asyncio.run(scenario())
+        
+        assert revoked.revoked
+        assert not kept.revoked
+        assert not other_room.revoked
+        assert worker_b.stats() == {"sessions": 3, "revocations": 1}
+
+
+class TestWriteBehind:
+    """Testes para a gravação write-behind das mensagens (services/message_writer.py)"""
+    
+    @pytest.fixture
+    def rooms(self, db, create_users):
+        """Dez matches confirmados; retorna [(match_id, user_a_id)]"""
+        from database import models
+        users = create_users(db, 20)
+        matches = [
+            models.Match(user_a_id=a, user_b_id=b, status=models.MatchStatus.MATCHED)
+            for a, b in zip(users[::2], users[1::2])
+        ]
+        db.add_all(matches)
+        db.commit()
+        return [(match.id, match.user_a_id) for match in matches]
+    
+    @staticmethod
+    def _count_statements():
+        from sqlalchemy import event
+        from tests.conftest import async_engine
+        statements = []
+        
+        def on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        return statements, lambda: event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    
+    def test_messages_get_server_ids_and_flush_in_one_insert(self, db, rooms):
+        """Testa ids/horário do servidor, nada gravado antes do flush e um INSERT por lote"""
+        import asyncio
+        from database import models
+        from services.message_writer import ChatMessageWriter
+        from tests.conftest import TestingAsyncSessionLocal
+        match_id, sender_id = rooms[0]
+        db.add(models.ChatMessage(match_id=match_id, sender_id=sender_id, content="antiga"))
+        db.commit()
+        writer = ChatMessageWriter(batch_size=100, id_block=4)
+        
+        async def scenario():
+            accepted = [await writer.add(TestingAsyncSessionLocal, match_id, sender_id, f"m{n}") for n in range(6)]
+            assert db.query(models.ChatMessage).count() == 1
+            statements, stop = self._count_statements()
+            try:
+                assert await writer.flush(TestingAsyncSessionLocal) == 6
+            finally:
+                stop()
+            return accepted, statements
+        accepted, statements = asyncio.run(scenario())
+        
+        old_id = db.query(models.ChatMessage.id).filter_by(content="antiga").scalar()
+        assert [message.id for message in accepted] == list(range(old_id + 1, old_id + 7))
+        assert all(message.created_at is not None for message in accepted)
+        assert len(statements) == 1 and statements[0].lstrip().upper().startswith("INSERT")
+        stored = db.query(models.ChatMessage).filter(models.ChatMessage.id > old_id).order_by(models.ChatMessage.id).all()
+        assert [(m.id, m.content) for m in stored] == [(m.id, m.content) for m in accepted]
+        assert writer.stats()["pending"] == 0
+        assert writer.stats()["rows_written"] == 6
+    
+    def test_failed_flush_keeps_messages(self, db, rooms):
+        """Testa que um flush que falha devolve as mensagens à fila, na ordem"""
+        import asyncio
+        from database import models
+        from services.message_writer import ChatMessageWriter
+        from tests.conftest import TestingAsyncSessionLocal
+        match_id, sender_id = rooms[0]
+        writer = ChatMessageWriter()
+        
+        def broken_factory():
+            raise RuntimeError("banco fora")
+        
+        async def scenario():
+            for content in ("a", "b"):
+                await writer.add(TestingAsyncSessionLocal, match_id, sender_id, content)
+            with pytest.raises(RuntimeError):
+                await writer.flush(broken_factory)
+            await writer.add(TestingAsyncSessionLocal, match_id, sender_id, "c")
+            return await writer.flush(TestingAsyncSessionLocal)
+        assert asyncio.run(scenario()) == 3
+        
+        assert [m.content for m in db.query(models.ChatMessage).order_by(models.ChatMessage.id)] == ["a", "b", "c"]
+        assert writer.stats()["failed_flushes"] == 1
+    
+    def test_rejected_row_does_not_block_the_batch(self, db, rooms):
+        """Testa que uma linha recusada pelo banco é descartada e o resto do lote é gravado"""
+        import asyncio
+        from database import models
+        from services.message_writer import ChatMessageWriter
+        from tests.conftest import TestingAsyncSessionLocal
+        match_id, sender_id = rooms[0]
+        writer = ChatMessageWriter()
+        
+        async def scenario():
+            await writer.add(TestingAsyncSessionLocal, match_id, sender_id, "a")
+            # sender_id nulo: o banco recusa o INSERT desta linha
+            await writer.add(TestingAsyncSessionLocal, match_id, None, "inválida")
+            await writer.add(TestingAsyncSessionLocal, match_id, sender_id, "b")
+            written = await writer.flush(TestingAsyncSessionLocal)
+            return written, await writer.flush(TestingAsyncSessionLocal)
+        assert asyncio.run(scenario()) == (2, 0)
+        
+        assert [m.content for m in db.query(models.ChatMessage).order_by(models.ChatMessage.id)] == ["a", "b"]
+        assert writer.stats()["dropped"] == 1
+        assert writer.stats()["failed_flushes"] == 0
+    
+    def test_nul_is_stripped_before_accepting(self, client, two_users, monkeypatch):
+        """Testa que NUL no conteúdo é removido antes de a mensagem ser aceita"""
+        import asyncio
+        from services.message_writer import chat_message_writer
+        from tests.conftest import TestingAsyncSessionLocal
+        monkeypatch.setattr("routers.chat.CHAT_WRITE_BEHIND", True)
+        client.post(f"/matches/like/{two_users['user2']['id']}", headers=two_users["headers1"])
+        room = client.post(f"/matches/like/{two_users['user1']['id']}", headers=two_users["headers2"]).json()["match_id"]
+        
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+            websocket.send_json({"content": "o\u0000i"})
+            assert websocket.receive_json()["content"] == "oi"
+        assert asyncio.run(chat_message_writer.flush(TestingAsyncSessionLocal)) == 1
+        messages = client.get(f"/chat/messages/{room}", headers=two_users["headers2"]).json()
+        assert [m["content"] for m in messages] == ["oi"]
+    
+    def test_oversized_frame_is_written_before_reference(self, client, db, rooms):
+        """Testa que, com o write-behind, a mensagem é gravada antes do envio por id"""
+        import asyncio
+        import json
+        from routers.chat import ConnectionManager
+        from services import chat_service
+        from services.broadcast import InMemoryBroadcast, PayloadTooLarge, encode_frame
+        from services.message_writer import ChatMessageWriter
+        from tests.conftest import TestingAsyncSessionLocal
+        from tests.test_broadcast import FakeWebSocket, _drain
+        match_id, sender_id = rooms[0]
+        writer = ChatMessageWriter()
+        
+        class SmallBroadcast(InMemoryBroadcast):
+            async def publish(self, event):
+                if "frame" in event:
+                    raise PayloadTooLarge()
+                await super().publish(event)
+        worker = ConnectionManager(SmallBroadcast())
+        receiver = FakeWebSocket(sender_id + 1)
+        
+        async def scenario():
+            await worker.connect(receiver, match_id, sender_id + 1)
+            message = await writer.add(TestingAsyncSessionLocal, match_id, sender_id, "x" * 10000)
+            frame = encode_frame(chat_service.broadcast_payload(message, "a@example.com"))
+            await worker.broadcast(frame, match_id, message_id=message.id,
+                                   before_reference=lambda: writer.flush(TestingAsyncSessionLocal))
+            await _drain(worker)
+            return message
+        message = asyncio.run(scenario())
+        
+        assert [json.loads(frame)["id"] for frame in receiver.sent] == [message.id]
+        assert len(json.loads(receiver.sent[0])["content"]) == 10000
+        assert writer.stats()["pending"] == 0
+        assert worker.stats()["publish_errors"] == 0
+    
+    def test_websocket_broadcasts_before_write(self, client, two_users, monkeypatch):
+        """Testa que, com o write-behind, a mensagem é entregue antes de ser gravada"""
+        import asyncio
+        from services.message_writer import chat_message_writer
+        from tests.conftest import TestingAsyncSessionLocal
+        monkeypatch.setattr("routers.chat.CHAT_WRITE_BEHIND", True)
+        client.post(f"/matches/like/{two_users['user2']['id']}", headers=two_users["headers1"])
+        room = client.post(f"/matches/like/{two_users['user1']['id']}", headers=two_users["headers2"]).json()["match_id"]
+        
+        with client.websocket_connect(f"/chat/ws/{room}?token={two_users['token1']}") as websocket:
+            websocket.send_json({"content": "rápida"})
+            sent = websocket.receive_json()
+        assert sent["content"] == "rápida"
+        assert client.get(f"/chat/messages/{room}", headers=two_users["headers2"]).json() == []
+        
+        asyncio.run(chat_message_writer.flush(TestingAsyncSessionLocal))
+        messages = client.get(f"/chat/messages/{room}", headers=two_users["headers2"]).json()
+        assert [(m["id"], m["content"]) for m in messages] == [(sent["id"], "rápida")]
+    
+    @pytest.mark.slow
+    def test_benchmark_write_behind_vs_commit_per_message(self, db, rooms):
+        """Benchmark: mensagens/s com commit por mensagem vs write-behind em lotes"""
+        import asyncio
+        import time
+        from database import models
+        from services import chat_service
+        from services.message_writer import ChatMessageWriter
+        from tests.conftest import TestingAsyncSessionLocal
+        total = 1000
+        
+        async def per_message():
+            async with TestingAsyncSessionLocal() as session:
+                start = time.perf_counter()
+                for n in range(total):
+                    match_id, sender_id = rooms[n % len(rooms)]
+                    await chat_service.insert_chat_message_async(session, match_id, sender_id, f"m{n}")
+                return time.perf_counter() - start
+        
+        async def write_behind():
+            writer = ChatMessageWriter(batch_size=200, id_block=200)
+            start = time.perf_counter()
+            for n in range(total):
+                match_id, sender_id = rooms[n % len(rooms)]
+                await writer.add(TestingAsyncSessionLocal, match_id, sender_id, f"w{n}")
+                if writer.stats()["pending"] >= writer.batch_size:
+                    await writer.flush(TestingAsyncSessionLocal)
+            await writer.flush(TestingAsyncSessionLocal)
+            return time.perf_counter() - start
+        commit_each = asyncio.run(per_message())
+        batched = asyncio.run(write_behind())
+        
+        print(f"\n{total} mensagens: commit por mensagem {total / commit_each:.0f} msg/s, "
+              f"write-behind {total / batched:.0f} msg/s")
+        assert db.query(models.ChatMessage).count() == 2 * total
+        assert batched < commit_each
@@ -0,0 +1,71 @@
+"""
+Testes para o painel agregado (GET /me/dashboard)
+"""
+import pytest
+from fastapi import status
+
+
+class TestDashboard:
+    """Testes para GET /me/dashboard"""
+
+    def test_dashboard_embeds_profiles(self, client, two_users, db, create_users):
+        """Testa que o painel traz perfil, matches e curtidas com os perfis embutidos"""
+        user1 = two_users["user1"]
+        user2 = two_users["user2"]
+        liked, liker = create_users(db, 2)
+        client.post(f"/matches/like/{user2['id']}", headers=two_users["headers1"])
+        client.post(f"/matches/like/{user1['id']}", headers=two_users["headers2"])
+        client.post(f"/matches/like/{liked}", headers=two_users["headers1"])
+        from services import match_service
+        match_service.like_user(db, liker, user1["id"])
+
+        response = client.get("/me/dashboard", headers=two_users["headers1"])
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["user"]["id"] == user1["id"]
+        assert [{match["user_a"]["id"], match["user_b"]["id"]} for match in data["matches"]] == [{user1["id"], user2["id"]}]
+        assert data["matches"][0]["status"] == "matched"
+        assert [like["liked_user"]["id"] for like in data["likes_sent"]] == [liked]
+        assert data["likes_sent"][0]["liked_user"]["game"] == "League of Legends"
+        assert [like["liker_user"]["id"] for like in data["likes_received"]] == [liker]
+        assert data["likes_sent_next"] is None
+        assert data["likes_received_next"] is None
+
+    def test_dashboard_returns_cursor_when_page_is_full(self, db, create_users):
+        """Testa o cursor para continuar as curtidas além do limite do painel"""
+        from database import models
+        from services import dashboard_service
+        me, *others = create_users(db, 4)
+        db.add_all([models.Like(liker_id=me, liked_id=other) for other in others])
+        db.commit()
+
+        dashboard = dashboard_service.get_dashboard(db, me, likes_limit=2)
+        assert [like["liked_user_id"] for like in dashboard["likes_sent"]] == others[:2]
+        assert dashboard["likes_sent_next"] == dashboard["likes_sent"][-1]["like_id"]
+
+    @pytest.mark.parametrize("item_count", [1, 30])
+    def test_dashboard_query_count_is_constant(self, db, count_queries, create_users, item_count):
+        """Testa que o painel roda o mesmo número de statements, independente do tamanho das listas"""
+        from database import models
+        from services import dashboard_service
+        from schemas import dashboard as dashboard_schema
+        me, *others = create_users(db, 3 * item_count + 1)
+        matched = others[:item_count]
+        sent = others[item_count:2 * item_count]
+        received = others[2 * item_count:]
+        db.add_all([models.Match(user_a_id=me, user_b_id=o, status=models.MatchStatus.MATCHED) for o in matched])
+        db.add_all([models.Like(liker_id=me, liked_id=o) for o in sent])
+        db.add_all([models.Like(liker_id=o, liked_id=me) for o in received])
+        db.commit()
+        db.expunge_all()
+
+        with count_queries as counter:
+            dashboard = dashboard_schema.Dashboard.model_validate(dashboard_service.get_dashboard(db, me))
+        assert len(dashboard.matches) == len(dashboard.likes_sent) == len(dashboard.likes_received) == item_count
+        # matches, curtidas enviadas, recebidas, perfis (IN) e jogos dos perfis
+        assert counter.count == 5
+
+    def test_dashboard_unauthorized(self, client):
+        """Testa o painel sem autenticação"""
+        response = client.get("/me/dashboard")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,191 @@
+"""
+Testes para a camada de banco (pool de conexões)
+"""
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine, text
+
+from database import pool as pool_module
+
+
+@pytest.fixture
+def instrumented_engine(tmp_path):
+    """Engine SQLite em arquivo com o QueuePool instrumentado"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=pool_module.InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.1,
+    )
+    metrics = pool_module.instrument_engine("test", engine)
+    try:
+        yield engine, metrics
+    finally:
+        pool_module._instrumented.pop("test", None)
+        engine.dispose()
+
+
+class TestPoolMetrics:
+    """Testes para as métricas do pool de conexões"""
+    
+    def test_checkout_metrics(self, instrumented_engine):
+        """Testa contagem de conexões em uso, overflow e tempo de espera"""
+        engine, metrics = instrumented_engine
+        
+        conn1 = engine.connect()
+        conn2 = engine.connect()
+        conn1.execute(text("SELECT 1"))
+        
+        stats = pool_module.pool_stats()["test"]
+        assert stats["in_use"] == 2
+        assert stats["checked_out"] == 2
+        assert stats["overflow"] == 1
+        assert stats["checkouts"] == 2
+        
+        conn1.close()
+        conn2.close()
+        stats = pool_module.pool_stats()["test"]
+        assert stats["in_use"] == 0
+        assert stats["in_use_max"] == 2
+    
+    def test_checkout_timeout_counted(self, instrumented_engine):
+        """Testa que esgotar o pool conta um timeout de checkout"""
+        from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+        engine, metrics = instrumented_engine
+        
+        conns = [engine.connect(), engine.connect()]
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+        for conn in conns:
+            conn.close()
+        
+        assert metrics.snapshot()["checkout_timeouts"] == 1
+    
+    def test_engine_options_from_environment(self):
+        """Testa que Postgres recebe as opções de pool e SQLite não"""
+        options = pool_module.engine_options("postgresql://u:p@localhost/db")
+        assert options["poolclass"] is pool_module.InstrumentedQueuePool
+        assert options["pool_size"] == pool_module.DB_POOL_SIZE
+        assert options["pool_pre_ping"] == pool_module.DB_POOL_PRE_PING
+        assert pool_module.engine_options("sqlite:///x.db") == {}
+    
+    def test_pool_endpoint(self, client, internal_headers):
+        """Testa o endpoint interno de métricas do pool"""
+        response = client.get("/internal/db/pool", headers=internal_headers)
+        
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert "pid" in data
+        assert "primary" in data["pools"]
+        assert "in_use" in data["pools"]["primary"]
+    
+    def test_internal_endpoints_are_protected(self, client, monkeypatch):
+        """Testa que /internal/* fica desligado sem token e exige o header quando ligado"""
+        assert client.get("/internal/db/pool").status_code == status.HTTP_404_NOT_FOUND
+        monkeypatch.setattr("routers.internal.INTERNAL_METRICS_TOKEN", "segredo")
+        assert client.get("/internal/db/pool").status_code == status.HTTP_403_FORBIDDEN
+        response = client.get("/internal/db/pool", headers={"X-Internal-Token": "errado"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        response = client.get("/internal/db/pool", headers={"X-Internal-Token": "segredo"})
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.fixture
+def primary_and_replica(tmp_path):
+    """Dois bancos SQLite locais simulando primário e réplica"""
+    from sqlalchemy.orm import sessionmaker
+    from database.connection import Base
+    from database.routing import RoutingSession, sticky_writes
+    
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(bind=primary)
+    Base.metadata.create_all(bind=replica)
+    sticky_writes.clear()
+    
+    Session = sessionmaker(class_=RoutingSession, autoflush=False, bind=primary, replica=replica)
+    try:
+        yield Session, primary, replica
+    finally:
+        sticky_writes.clear()
+        primary.dispose()
+        replica.dispose()
+
+
+def _insert_user(engine, user_id, email, game="Valorant"):
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO users (id, email, hashed_password, is_active, game) "
+                 "VALUES (:id, :email, 'x', 1, :game)"),
+            {"id": user_id, "email": email, "game": game}
+        )
+        conn.execute(text("INSERT OR IGNORE INTO games (name) VALUES (:game)"), {"game": game})
+        conn.execute(
+            text("INSERT INTO user_games (user_id, game_id) SELECT :id, id FROM games WHERE name = :game"),
+            {"id": user_id, "game": game}
+        )
+
+
+class TestReplicaRouting:
+    """Testes para o roteamento de leituras para a réplica"""
+    
+    def test_read_only_functions_use_replica(self, primary_and_replica):
+        """Testa que funções @replica_read leem da réplica"""
+        from services import user_service
+        Session, primary, replica = primary_and_replica
+        _insert_user(primary, 1, "me@example.com")
+        _insert_user(replica, 2, "only-on-replica@example.com")
+        
+        with Session() as db:
+            users = user_service.get_users_with_same_game(db, 1, "Valorant")
+            assert [u.email for u in users] == ["only-on-replica@example.com"]
+            
+            # Leituras fora das funções marcadas continuam no primário
+            assert user_service.get_user_by_id(db, 1) is not None
+    
+    def test_writes_stay_on_primary_and_stick(self, primary_and_replica):
+        """Testa que escritas vão ao primário e fixam as leituras do usuário nele"""
+        from services import match_service
+        Session, primary, replica = primary_and_replica
+        for engine in (primary, replica):
+            _insert_user(engine, 1, "a@example.com")
+            _insert_user(engine, 2, "b@example.com")
+        
+        with Session() as db:
+            db.info["principal_id"] = 1
+            result = match_service.like_user(db, 1, 2)
+            assert result["status"] == "LIKED"
+        
+        with primary.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM likes")).scalar() == 1
+        with replica.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM likes")).scalar() == 0
+        
+        # Dentro da janela sticky o autor lê o próprio like no primário...
+        with Session() as db:
+            db.info["principal_id"] = 1
+            assert len(match_service.get_user_likes(db, 1)) == 1
+        
+        # ...enquanto outro usuário lê da réplica
+        with Session() as db:
+            db.info["principal_id"] = 2
+            assert len(match_service.get_user_liked_by(db, 2)) == 0
+    
+    def test_sticky_window_expires(self, primary_and_replica):
+        """Testa que, sem janela ativa, o usuário volta a ler da réplica"""
+        from database.routing import sticky_writes
+        from services import match_service
+        Session, primary, replica = primary_and_replica
+        _insert_user(primary, 1, "a@example.com")
+        _insert_user(primary, 2, "b@example.com")
+        
+        with Session() as db:
+            db.info["principal_id"] = 1
+            match_service.like_user(db, 1, 2)
+        assert sticky_writes.is_sticky(1)
+        
+        sticky_writes.clear()
+        with Session() as db:
+            db.info["principal_id"] = 1
+            assert match_service.get_user_likes(db, 1) == []
@@ -0,0 +1,310 @@
+"""
+Testes para o feed de descoberta
+"""
+import pytest
+from fastapi import status
+
+
+class TestDiscoveryFeed:
+    """Testes para GET /discovery/feed"""
+    
+    def test_feed_keyset_pagination(self, client, auth_headers, db, create_users):
+        """Testa percorrer o feed página a página com o cursor"""
+        ids = create_users(db, 5)
+        
+        first = client.get("/discovery/feed?limit=2", headers=auth_headers).json()
+        assert [user["id"] for user in first["items"]] == ids[:2]
+        assert first["next_cursor"]
+        
+        second = client.get(
+            "/discovery/feed", params={"limit": 2, "cursor": first["next_cursor"]}, headers=auth_headers
+        ).json()
+        assert [user["id"] for user in second["items"]] == ids[2:4]
+        
+        last = client.get(
+            "/discovery/feed", params={"limit": 2, "cursor": second["next_cursor"]}, headers=auth_headers
+        ).json()
+        assert [user["id"] for user in last["items"]] == ids[4:]
+        assert last["next_cursor"] is None
+    
+    def test_feed_excludes_liked_matched_and_other_games(self, client, two_users, db, create_users):
+        """Testa que quem já foi curtido, deu match, está inativo ou joga outro jogo não aparece"""
+        from database import models
+        user1 = two_users["user1"]["id"]
+        user2 = two_users["user2"]["id"]
+        liked, liked_me, fresh, inactive = create_users(db, 4)
+        create_users(db, 2, game="Valorant", prefix="valorant")
+        db.get(models.User, inactive).is_active = False
+        db.add_all([
+            models.Like(liker_id=user1, liked_id=liked),
+            models.Like(liker_id=liked_me, liked_id=user1),
+            models.Match(user_a_id=min(user1, user2), user_b_id=max(user1, user2),
+                         status=models.MatchStatus.MATCHED),
+        ])
+        db.commit()
+        
+        response = client.get("/discovery/feed", headers=two_users["headers1"])
+        assert response.status_code == status.HTTP_200_OK
+        # Quem curtiu o usuário continua no feed (pode curtir de volta)
+        assert [user["id"] for user in response.json()["items"]] == [liked_me, fresh]
+    
+    def test_feed_page_size_is_capped(self, client, auth_headers):
+        """Testa o limite de tamanho da página"""
+        response = client.get("/discovery/feed?limit=1000", headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "eyJnIjoiVmFsb3JhbnQiLCJpZCI6MX0"])
+    def test_invalid_cursor(self, client, auth_headers, cursor):
+        """Testa cursor malformado ou gerado para outro jogo"""
+        response = client.get("/discovery/feed", params={"cursor": cursor}, headers=auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    @pytest.mark.parametrize("player_count", [5, 200])
+    def test_feed_is_one_bounded_query(self, db, count_queries, create_users, player_count):
+        """Testa que cada página custa as mesmas consultas (página + jogos dos perfis), independente do número de jogadores"""
+        from services import discovery_service
+        me, *_ = create_users(db, player_count)
+        
+        with count_queries as counter:
+            page = discovery_service.get_discovery_page(db, me, "League of Legends", limit=3)
+        assert counter.count == 2
+        assert len(page["items"]) == 3
+    
+    def test_feed_requires_auth(self, client):
+        """Testa o feed sem autenticação"""
+        response = client.get("/discovery/feed")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestCandidateIndex:
+    """Testes para o índice de candidatos em memória"""
+    
+    @pytest.fixture
+    def warm_index(self, db):
+        """Monta o índice a partir do banco de teste"""
+        from services.candidate_index import candidate_index
+        def warm():
+            candidate_index.warm(db)
+            return candidate_index
+        return warm
+    
+    def test_index_page_skips_self_and_liked(self, db, create_users, warm_index):
+        """Testa montar uma página só com o índice"""
+        from database import models
+        me, liked, *others = create_users(db, 5)
+        valorant_me, valorant_other = create_users(db, 2, game="Valorant", prefix="valorant")
+        db.add(models.Like(liker_id=me, liked_id=liked))
+        db.commit()
+        
+        index = warm_index()
+        assert index.page(me, None, 10) == others
+        assert index.page(me, others[0], 10) == others[1:]
+        assert index.page(valorant_me, None, 10) == [valorant_other]
+    
+    def test_index_follows_service_writes(self, db, create_users, warm_index):
+        """Testa as atualizações incrementais vindas de create/update/like"""
+        from schemas import user as user_schema
+        from services import match_service, user_service
+        me, target = create_users(db, 2)
+        index = warm_index()
+        
+        new_user = user_service.create_user(db, user_schema.UserCreate(
+            email="new@example.com", password="x", game="League of Legends"
+        ))
+        assert index.page(me, None, 10) == [target, new_user.id]
+        
+        match_service.like_user(db, me, target)
+        assert index.page(me, None, 10) == [new_user.id]
+        
+        user_service.update_user(db, new_user.id, user_schema.UserUpdate(games=["Valorant"]))
+        assert index.page(me, None, 10) == []
+        
+        user_service.update_user(db, me, user_schema.UserUpdate(games=["League of Legends", "Valorant"]))
+        assert index.page(me, None, 10) == [new_user.id]
+        
+        user_service.update_user(db, new_user.id, user_schema.UserUpdate(is_active=False))
+        assert index.page(me, None, 10) == []
+    
+    def test_refresh_applies_only_new_writes(self, db, create_users, count_queries, warm_index):
+        """Testa que o refresh pega escritas de outro worker (direto no banco) lendo só as mudanças"""
+        from datetime import datetime
+        from database import models
+        me, liked, matched, deactivated, kept = create_users(db, 5)
+        index = warm_index()
+        db.add(models.Like(liker_id=me, liked_id=liked))
+        db.add(models.Match(user_a_id=me, user_b_id=matched, status=models.MatchStatus.MATCHED))
+        user = db.get(models.User, deactivated)
+        user.is_active = False
+        user.updated_at = datetime.utcnow()
+        db.commit()
+        newcomer = create_users(db, 1, prefix="newcomer")[0]
+        assert index.page(me, None, 10) == [liked, matched, deactivated, kept]
+        
+        with count_queries as counter:
+            index.refresh(db)
+        assert index.page(me, None, 10) == [kept, newcomer]
+        # 3 marcas d'água + usuários alterados + seus jogos + curtidas novas + matches novos
+        assert counter.count == 7
+        assert index.footprint()["refreshes"] == 1
+        
+        # Sem mudanças, nada muda (a margem relê os mesmos usuários sem efeito)
+        index.refresh(db)
+        assert index.page(me, None, 10) == [kept, newcomer]
+    
+    def test_feed_served_from_index(self, client, auth_headers, db, create_users, warm_index):
+        """Testa o feed paginado servido pelo índice"""
+        ids = create_users(db, 5)
+        warm_index()
+        
+        first = client.get("/discovery/feed?limit=3", headers=auth_headers).json()
+        assert [user["id"] for user in first["items"]] == ids[:3]
+        
+        second = client.get(
+            "/discovery/feed", params={"limit": 3, "cursor": first["next_cursor"]}, headers=auth_headers
+        ).json()
+        assert [user["id"] for user in second["items"]] == ids[3:]
+        assert second["next_cursor"] is None
+    
+    def test_feed_rechecks_writes_missed_by_index(self, client, two_users, db, create_users, warm_index):
+        """Testa que curtidas feitas fora deste processo (sem passar pelo índice) são filtradas"""
+        from database import models
+        target, other = create_users(db, 2)
+        warm_index()
+        db.add(models.Like(liker_id=two_users["user1"]["id"], liked_id=target))
+        db.commit()
+        
+        response = client.get("/discovery/feed", headers=two_users["headers1"])
+        ids = [user["id"] for user in response.json()["items"]]
+        assert target not in ids
+        assert other in ids
+    
+    def test_user_unknown_to_index_falls_back_to_database(self, db, create_users, warm_index):
+        """Testa um usuário criado por outro worker (sem passar pelo índice): página do banco e indexado na hora"""
+        from services import discovery_service
+        others = create_users(db, 3)
+        index = warm_index()
+        newcomer = create_users(db, 1, prefix="newcomer")[0]
+        assert index.user_games(newcomer) is None
+        
+        page = discovery_service.get_discovery_page(db, newcomer, "League of Legends", limit=10)
+        assert [user.id for user in page["items"]] == others
+        assert index.user_games(newcomer) is not None
+        assert index.page(newcomer, None, 10) == others
+    
+    def test_game_changed_elsewhere_falls_back_to_database(self, db, create_users, warm_index):
+        """Testa um usuário que trocou de jogo em outro worker: o índice antigo não responde por ele"""
+        from database import models
+        from services import discovery_service, game_service
+        me = create_users(db, 1, prefix="me")[0]
+        create_users(db, 2)
+        valorant = create_users(db, 2, game="Valorant", prefix="valorant")
+        index = warm_index()
+        user = db.get(models.User, me)
+        user.game = "Valorant"
+        game_service.set_user_games(db, user, ["Valorant"])
+        db.commit()
+        
+        page = discovery_service.get_discovery_page(db, me, "Valorant", limit=10, ranked=True)
+        assert sorted(user.id for user in page["items"]) == valorant
+        assert index.page(me, None, 10) == valorant
+    
+    def test_footprint(self, client, db, create_users, warm_index, internal_headers):
+        """Testa o relatório de tamanho/memória do índice"""
+        create_users(db, 100)
+        warm_index()
+        
+        stats = client.get("/internal/discovery/index", headers=internal_headers).json()
+        assert stats["ready"] is True
+        assert stats["games"] == 1
+        assert stats["indexed_users"] == 100
+        assert stats["bytes"] > 0
+
+
+class TestPrecomputedFeed:
+    """Testes para o feed pré-calculado (GET /discovery/next)"""
+    
+    def test_next_cards_are_dealt_once(self, client, auth_headers, db, create_users):
+        """Testa que a primeira leitura calcula o feed e as seguintes só tiram da fila"""
+        ids = create_users(db, 4)
+        
+        first = client.get("/discovery/next?count=3", headers=auth_headers).json()
+        assert sorted(user["id"] for user in first["items"]) == ids[:3]
+        assert first["remaining"] == 1
+        
+        second = client.get("/discovery/next?count=3", headers=auth_headers).json()
+        assert [user["id"] for user in second["items"]] == [ids[3]]
+    
+    def test_reads_from_store_skip_the_database(self, db, create_users, count_queries):
+        """Testa leituras O(1): com o feed pronto, nenhuma consulta ao banco"""
+        from services import feed_store
+        me, *ids = create_users(db, 6)
+        feed_store.next_cards(db, me, "League of Legends", 1)
+        
+        with count_queries as counter:
+            page = feed_store.next_cards(db, me, "League of Legends", 2)
+        assert counter.count == 0
+        assert len(page["items"]) == 2
+    
+    def test_like_consumes_feed(self, db, create_users):
+        """Testa que curtir um candidato o remove da fila"""
+        from services import feed_store, match_service
+        me, *ids = create_users(db, 4)
+        feed_store.next_cards(db, me, "League of Legends", 1)
+        
+        match_service.like_users_batch(db, me, ids[1:])
+        assert feed_store.feed_store.remaining(me) == 0
+    
+    def test_game_change_invalidates_feed(self, client, auth_headers, db, create_users):
+        """Testa que trocar de jogo descarta o feed do jogo anterior"""
+        create_users(db, 3)
+        valorant = create_users(db, 2, game="Valorant", prefix="valorant")
+        client.get("/discovery/next", headers=auth_headers)
+        
+        client.put("/auth/users/me", json={"game": "Valorant", "games": ["Valorant"]}, headers=auth_headers)
+        page = client.get("/discovery/next?count=5", headers=auth_headers).json()
+        assert sorted(user["id"] for user in page["items"]) == valorant
+    
+    def test_refresh_job_schedules_by_activity_and_staleness(self, db, create_users, monkeypatch):
+        """Testa que o job só recalcula feeds de usuários ativos com fila baixa ou velha"""
+        from services import feed_store as feed_module
+        from tests.conftest import TestingSessionLocal
+        store = feed_module.feed_store
+        me, *ids = create_users(db, 4)
+        
+        # Sem leitura: o usuário não é ativo, nada a recalcular
+        assert feed_module.refresh_due_feeds(TestingSessionLocal) == 0
+        
+        feed_module.next_cards(db, me, "League of Legends", 1)
+        monkeypatch.setattr(feed_module, "FEED_LOW_WATERMARK", 1)
+        assert store.due_for_refresh() == []
+        
+        # Fila velha: recalculada
+        monkeypatch.setattr(feed_module, "FEED_MAX_AGE_SECONDS", 0)
+        assert feed_module.refresh_due_feeds(TestingSessionLocal) == 1
+        # A carta já tirada não volta
+        assert store.remaining(me) == 2
+        
+        # Usuário ocioso: feed descartado
+        monkeypatch.setattr(feed_module, "FEED_IDLE_SECONDS", -1)
+        assert store.due_for_refresh() == []
+        assert store.stats()["feeds"] == 0
+        store.invalidate(me)
+        assert store.stats()["versions"] == 0
+    
+    def test_feed_advances_past_the_first_window(self, db, create_users, monkeypatch):
+        """Testa que o feed continua do cursor: chega às janelas seguintes sem repetir cartas"""
+        from services import discovery_service, feed_store as feed_module
+        from tests.conftest import TestingSessionLocal
+        monkeypatch.setattr(discovery_service, "DISCOVERY_RANKING_WINDOW", 3)
+        monkeypatch.setattr(feed_module, "FEED_SIZE", 2)
+        monkeypatch.setattr(feed_module, "FEED_LOW_WATERMARK", 2)
+        me, *ids = create_users(db, 9)
+        
+        dealt = []
+        for _ in range(len(ids)):
+            dealt.extend(card.id for card in feed_module.next_cards(db, me, "League of Legends", 1)["items"])
+            # O job completa a fila entre as leituras
+            feed_module.refresh_due_feeds(TestingSessionLocal)
+        
+        assert sorted(dealt) == ids
+        assert len(dealt) == len(set(dealt))
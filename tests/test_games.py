@@ -0,0 +1,117 @@
+"""
+Testes para o catálogo de jogos e perfis com vários jogos
+"""
+import pytest
+from fastapi import status
+
+
+class TestGameCatalog:
+    """Testes para GET /games"""
+
+    def test_catalog_lists_registered_games(self, client, db, create_users):
+        """Testa que o catálogo traz os jogos dos usuários, em ordem alfabética"""
+        create_users(db, 1, game="Valorant", prefix="valorant")
+        create_users(db, 1)
+
+        response = client.get("/games")
+        assert response.status_code == status.HTTP_200_OK
+        assert [game["name"] for game in response.json()] == ["League of Legends", "Valorant"]
+        assert "max-age" in response.headers["cache-control"]
+
+    def test_catalog_is_cached_until_new_game(self, client, db, count_queries, create_users):
+        """Testa que o catálogo vem do cache e é invalidado ao criar um jogo"""
+        create_users(db, 1)
+        client.get("/games")
+
+        with count_queries as counter:
+            client.get("/games")
+        assert counter.count == 0
+
+        client.post("/auth/register", json={
+            "email": "cs@example.com", "password": "x", "games": ["Counter-Strike 2"]
+        })
+        names = [game["name"] for game in client.get("/games").json()]
+        assert names == ["Counter-Strike 2", "League of Legends"]
+
+
+class TestUserGames:
+    """Testes para o conjunto de jogos do usuário"""
+
+    def test_register_with_games(self, client):
+        """Testa registrar com vários jogos; o primeiro vira o jogo principal"""
+        response = client.post("/auth/register", json={
+            "email": "multi@example.com", "password": "x", "games": ["Valorant", "Dota 2"]
+        })
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["game"] == "Valorant"
+        assert sorted(data["games"]) == ["Dota 2", "Valorant"]
+
+    def test_register_with_game_only(self, client, test_user_data):
+        """Testa que clientes antigos (só `game`) ganham um conjunto de um jogo"""
+        data = client.post("/auth/register", json=test_user_data).json()
+        assert data["games"] == [test_user_data["game"]]
+
+    def test_update_games_keeps_main_game(self, client, auth_headers):
+        """Testa trocar o conjunto mantendo o jogo principal quando ele continua nele"""
+        response = client.put("/auth/users/me", headers=auth_headers, json={
+            "games": ["Valorant", "League of Legends"]
+        })
+        data = response.json()
+        assert data["game"] == "League of Legends"
+        assert sorted(data["games"]) == ["League of Legends", "Valorant"]
+
+        data = client.put("/auth/users/me", headers=auth_headers, json={"games": ["Dota 2"]}).json()
+        assert data["game"] == "Dota 2"
+        assert data["games"] == ["Dota 2"]
+
+    def test_update_game_only_keeps_other_games(self, client, auth_headers):
+        """Testa que atualizar só `game` troca o jogo principal sem apagar os outros jogos"""
+        client.put("/auth/users/me", headers=auth_headers, json={"games": ["League of Legends", "Valorant"]})
+        data = client.put("/auth/users/me", headers=auth_headers, json={"game": "Dota 2"}).json()
+        assert data["game"] == "Dota 2"
+        assert data["games"] == ["Dota 2", "League of Legends", "Valorant"]
+    
+    def test_users_match_uses_game_sets(self, client, auth_headers, db, create_users):
+        """Testa que /auth/users/match acha quem tem o jogo no conjunto, não só como jogo principal"""
+        from schemas import user as user_schema
+        from services import user_service
+        lol = create_users(db, 1)[0]
+        both = create_users(db, 1, game="Valorant", prefix="valorant")[0]
+        user_service.update_user(db, both, user_schema.UserUpdate(games=["Valorant", "League of Legends"]))
+        
+        response = client.get("/auth/users/match", headers=auth_headers)
+        assert sorted(user["id"] for user in response.json()) == sorted([lol, both])
+
+    @pytest.mark.parametrize("use_index", [False, True])
+    def test_feed_intersects_game_sets(self, client, auth_headers, db, create_users, use_index):
+        """Testa que o feed traz quem joga qualquer um dos jogos do usuário, sem repetir"""
+        from schemas import user as user_schema
+        from services import user_service
+        from services.candidate_index import candidate_index
+        lol = create_users(db, 2)
+        valorant = create_users(db, 2, game="Valorant", prefix="valorant")
+        create_users(db, 2, game="Dota 2", prefix="dota")
+        both = create_users(db, 1, prefix="both")[0]
+        user_service.update_user(db, both, user_schema.UserUpdate(games=["League of Legends", "Valorant"]))
+        client.put("/auth/users/me", headers=auth_headers, json={"games": ["League of Legends", "Valorant"]})
+        if use_index:
+            candidate_index.warm(db)
+
+        page = client.get("/discovery/feed", headers=auth_headers).json()
+        assert [user["id"] for user in page["items"]] == sorted(lol + valorant + [both])
+
+    def test_user_load_skips_games_until_needed(self, db, create_users, count_queries):
+        """Testa que carregar um usuário não busca os jogos; só quem serializa o perfil paga por eles"""
+        from database import models
+        me = create_users(db, 1)[0]
+        db.expire_all()
+
+        with count_queries as counter:
+            user = db.get(models.User, me)
+            assert user.is_active
+        assert counter.count == 1
+
+        with count_queries as counter:
+            assert [game.name for game in user.games] == ["League of Legends"]
+        assert counter.count == 1
@@ -1,6 +1,7 @@
 """
 Testes para rotas de match
 """
+import os
 import pytest
 from fastapi import status
 
@@ -211,3 +212,317 @@ class TestGetLikesReceived:
         response = client.get("/matches/likes-received")
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
+
+class TestLikesPagination:
+    """Testes para a paginação keyset e o anti-join das listagens de likes"""
+    
+    def test_likes_sent_keyset_pagination(self, client, two_users, db, create_users):
+        """Testa paginar likes enviados com after/limit"""
+        from database import models
+        target_ids = create_users(db, 5)
+        db.add_all([models.Like(liker_id=two_users["user1"]["id"], liked_id=t) for t in target_ids])
+        db.commit()
+        
+        first = client.get("/matches/likes-sent?limit=3", headers=two_users["headers1"]).json()
+        assert [like["liked_user_id"] for like in first] == target_ids[:3]
+        
+        second = client.get(
+            f"/matches/likes-sent?limit=3&after={first[-1]['like_id']}",
+            headers=two_users["headers1"]
+        ).json()
+        assert [like["liked_user_id"] for like in second] == target_ids[3:]
+    
+    def test_likes_limit_is_capped(self, client, auth_headers):
+        """Testa que o tamanho de página tem limite máximo"""
+        response = client.get("/matches/likes-received?limit=100000", headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    def test_matched_likes_are_excluded(self, client, two_users):
+        """Testa que curtidas que viraram match não aparecem como pendentes"""
+        client.post(f"/matches/like/{two_users['user2']['id']}", headers=two_users["headers1"])
+        client.post(f"/matches/like/{two_users['user1']['id']}", headers=two_users["headers2"])
+        
+        sent = client.get("/matches/likes-sent", headers=two_users["headers1"]).json()
+        received = client.get("/matches/likes-received", headers=two_users["headers1"]).json()
+        assert sent == []
+        assert received == []
+    
+    @pytest.mark.parametrize("like_count", [1, 30])
+    def test_constant_query_count(self, db, count_queries, like_count, create_users):
+        """Testa que as listagens rodam um número constante de statements"""
+        from database import models
+        from services import match_service
+        user_id, *others = create_users(db, like_count + 1)
+        db.add_all([models.Like(liker_id=user_id, liked_id=o) for o in others])
+        db.add_all([models.Like(liker_id=o, liked_id=user_id) for o in others])
+        db.commit()
+        
+        with count_queries as counter:
+            sent = match_service.get_user_likes(db, user_id, with_profiles=False)
+            received = match_service.get_user_liked_by(db, user_id, with_profiles=False)
+        
+        assert len(sent) == like_count
+        assert len(received) == like_count
+        assert counter.count == 2
+
+
+class TestEmbeddedProfiles:
+    """Testes para os perfis embutidos em /matches/me e nas listagens de likes"""
+    
+    def test_likes_embed_profiles(self, client, two_users):
+        """Testa que as curtidas trazem o perfil do outro usuário"""
+        client.post(f"/matches/like/{two_users['user2']['id']}", headers=two_users["headers1"])
+        
+        sent = client.get("/matches/likes-sent", headers=two_users["headers1"]).json()
+        received = client.get("/matches/likes-received", headers=two_users["headers2"]).json()
+        assert sent[0]["liked_user"]["email"] == two_users["user2"]["email"]
+        assert received[0]["liker_user"]["email"] == two_users["user1"]["email"]
+    
+    @pytest.mark.parametrize("item_count", [1, 30])
+    def test_listings_query_count_is_constant(self, client, two_users, db, count_queries, create_users, item_count):
+        """Testa que carregar os perfis não faz uma consulta por item (selectin/IN)"""
+        from database import models
+        me = two_users["user1"]["id"]
+        headers = two_users["headers1"]
+        others = create_users(db, 3 * item_count)
+        matched = others[:item_count]
+        sent = others[item_count:2 * item_count]
+        received = others[2 * item_count:]
+        db.add_all([models.Match(user_a_id=me, user_b_id=o, status=models.MatchStatus.MATCHED) for o in matched])
+        db.add_all([models.Like(liker_id=me, liked_id=o) for o in sent])
+        db.add_all([models.Like(liker_id=o, liked_id=me) for o in received])
+        db.commit()
+        # Pega o principal antes de contar (o cache de auth não é o que está sendo medido)
+        client.get("/matches/me", headers=headers)
+        db.expunge_all()
+        
+        with count_queries as counter:
+            matches = client.get("/matches/me", headers=headers).json()
+        assert len(matches) == item_count
+        # matches, perfis de user_a e de user_b, e jogos de cada lote de perfis
+        assert counter.count == 5
+        
+        for path, key in (("/matches/likes-sent", "liked_user"), ("/matches/likes-received", "liker_user")):
+            db.expunge_all()
+            with count_queries as counter:
+                likes = client.get(path, headers=headers).json()
+            assert len(likes) == item_count
+            assert all(like[key]["game"] == "League of Legends" for like in likes)
+            # curtidas, perfis (IN) e jogos dos perfis
+            assert counter.count == 3
+
+
+class TestLikeUserAtomic:
+    """Testes para o like_user baseado em upsert (ON CONFLICT)"""
+    
+    def test_like_nonexistent_user_returns_404(self, client, auth_headers):
+        """Testa que curtir um usuário inexistente retorna 404"""
+        response = client.post("/matches/like/99999", headers=auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_like_runs_at_most_two_statements(self, db, count_queries, create_users):
+        """Testa que cada curtida custa no máximo dois statements"""
+        from services import match_service
+        user1, user2 = create_users(db, 2)
+        
+        with count_queries as counter:
+            assert match_service.like_user(db, user1, user2)["status"] == "LIKED"
+        assert counter.count <= 2
+        
+        with count_queries as counter:
+            assert match_service.like_user(db, user2, user1)["status"] == "MATCHED"
+        assert counter.count <= 2
+    
+    def test_concurrent_reciprocal_likes_create_one_match(self, tmp_path, create_users):
+        """Testa curtidas recíprocas simultâneas em várias threads: exatamente um match por par"""
+        from sqlalchemy import create_engine
+        from database.connection import Base
+        
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'race.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        Base.metadata.create_all(bind=engine)
+        run_reciprocal_like_race(engine, create_users)
+        engine.dispose()
+    
+    def test_generic_path_without_upsert(self, db, create_users, monkeypatch):
+        """Testa o caminho genérico (dialetos sem ON CONFLICT) com os mesmos resultados"""
+        from database import models
+        from services import match_service
+        monkeypatch.setattr(match_service, "UPSERT_INSERTS", {})
+        user1, user2 = create_users(db, 2)
+        
+        assert match_service.like_user(db, user1, 99999)["status"] == "NOT_FOUND"
+        assert match_service.like_user(db, user1, user2)["status"] == "LIKED"
+        assert match_service.like_user(db, user1, user2)["status"] == "ALREADY_LIKED"
+        result = match_service.like_user(db, user2, user1)
+        
+        match = db.query(models.Match).one()
+        assert result["status"] == "MATCHED"
+        assert result["match_id"] == match.id
+        assert match.status == models.MatchStatus.MATCHED
+        assert db.query(models.Like).count() == 2
+    
+    def test_generic_batch_without_upsert(self, db, create_users, monkeypatch):
+        """Testa o lote no caminho genérico"""
+        from database import models
+        from services import match_service
+        monkeypatch.setattr(match_service, "UPSERT_INSERTS", {})
+        user1, user2, other, already = create_users(db, 4)
+        db.add_all([
+            models.Like(liker_id=user2, liked_id=user1),
+            models.Like(liker_id=user1, liked_id=already),
+        ])
+        db.commit()
+        
+        results = match_service.like_users_batch(db, user1, [user2, other, already, user1, 99999])
+        
+        assert [r["status"] for r in results] == ["MATCHED", "LIKED", "ALREADY_LIKED", "ERROR", "NOT_FOUND"]
+        assert results[0]["match_id"] == db.query(models.Match).one().id
+
+
+def run_reciprocal_like_race(engine, create_users):
+    """Curtidas recíprocas simultâneas (10 pares, 20 threads); confere um match por par"""
+    import threading
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import sessionmaker
+    from database import models
+    from services import match_service
+    
+    Session = sessionmaker(autoflush=False, bind=engine)
+    
+    with Session() as db:
+        ids = create_users(db, 20, prefix="race")
+        pairs = list(zip(ids[0::2], ids[1::2]))
+    
+    results = []
+    barrier = threading.Barrier(len(pairs) * 2)
+    
+    def like(liker, liked):
+        barrier.wait()
+        with Session() as db:
+            results.append(match_service.like_user(db, liker, liked)["status"])
+    
+    threads = []
+    for a, b in pairs:
+        threads.append(threading.Thread(target=like, args=(a, b)))
+        threads.append(threading.Thread(target=like, args=(b, a)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    with Session() as db:
+        for a, b in pairs:
+            match_count = db.scalar(
+                select(func.count()).select_from(models.Match).where(
+                    models.Match.user_a_id == min(a, b),
+                    models.Match.user_b_id == max(a, b)
+                )
+            )
+            assert match_count == 1
+    
+    assert results.count("MATCHED") == len(pairs)
+    assert results.count("LIKED") == len(pairs)
+
+
+@pytest.mark.postgres
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL não definida")
+class TestLikeUserPostgres:
+    """like_user com o advisory lock do par em um Postgres de verdade (TEST_POSTGRES_URL)"""
+    
+    @pytest.fixture
+    def pg_engine(self):
+        """Engine em um schema próprio, removido no final"""
+        from uuid import uuid4
+        from sqlalchemy import create_engine, text
+        from database.connection import Base
+        
+        schema = f"test_like_{uuid4().hex[:8]}"
+        admin = create_engine(os.environ["TEST_POSTGRES_URL"])
+        with admin.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+        engine = create_engine(
+            os.environ["TEST_POSTGRES_URL"],
+            pool_size=25,
+            connect_args={"options": f"-csearch_path={schema}"},
+        )
+        Base.metadata.create_all(bind=engine)
+        try:
+            yield engine
+        finally:
+            engine.dispose()
+            with admin.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            admin.dispose()
+    
+    def test_concurrent_reciprocal_likes_create_one_match(self, pg_engine, create_users):
+        """Testa que o advisory lock serializa curtidas recíprocas: exatamente um match por par"""
+        run_reciprocal_like_race(pg_engine, create_users)
+
+
+class TestLikeBatch:
+    """Testes para o endpoint de curtidas em lote"""
+    
+    def test_batch_results_per_target(self, client, two_users, db, create_users):
+        """Testa o resultado de cada alvo: LIKED, MATCHED, ALREADY_LIKED, ERROR e NOT_FOUND"""
+        from database import models
+        user1 = two_users["user1"]["id"]
+        user2 = two_users["user2"]["id"]
+        other, already = create_users(db, 2)
+        db.add_all([
+            models.Like(liker_id=user2, liked_id=user1),
+            models.Like(liker_id=user1, liked_id=already),
+        ])
+        db.commit()
+        
+        response = client.post(
+            "/matches/likes:batch",
+            json={"target_user_ids": [user2, other, already, user1, 99999, other]},
+            headers=two_users["headers1"]
+        )
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        
+        assert [r["target_user_id"] for r in results] == [user2, other, already, user1, 99999]
+        assert [r["status"] for r in results] == ["MATCHED", "LIKED", "ALREADY_LIKED", "ERROR", "NOT_FOUND"]
+        
+        match = db.query(models.Match).one()
+        assert results[0]["match_id"] == match.id
+        assert (match.user_a_id, match.user_b_id) == (min(user1, user2), max(user1, user2))
+        assert db.query(models.Like).filter(models.Like.liker_id == user1).count() == 3
+    
+    def test_batch_matches_single_like_semantics(self, db, create_users):
+        """Testa que o lote e o like_user produzem o mesmo estado"""
+        from database import models
+        from services import match_service
+        me, *targets = create_users(db, 6)
+        for target in targets[:3]:
+            match_service.like_user(db, target, me)
+        
+        results = match_service.like_users_batch(db, me, targets)
+        assert [r["status"] for r in results] == ["MATCHED"] * 3 + ["LIKED"] * 2
+        
+        again = match_service.like_users_batch(db, me, targets)
+        assert {r["status"] for r in again} == {"ALREADY_LIKED"}
+        assert db.query(models.Match).count() == 3
+    
+    @pytest.mark.parametrize("batch_size", [1, 50])
+    def test_batch_statement_count_is_constant(self, db, count_queries, batch_size, create_users):
+        """Testa que o número de statements não cresce com o tamanho do lote"""
+        from services import match_service
+        me, *targets = create_users(db, batch_size + 1)
+        
+        with count_queries as counter:
+            match_service.like_users_batch(db, me, targets)
+        assert counter.count == 2
+    
+    def test_batch_size_is_capped(self, client, auth_headers):
+        """Testa o limite de alvos por requisição"""
+        response = client.post(
+            "/matches/likes:batch",
+            json={"target_user_ids": list(range(1, 102))},
+            headers=auth_headers
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,167 @@
+"""
+Testes para o ranking de candidatos do feed
+"""
+import time
+import numpy as np
+import pytest
+from fastapi import status
+
+
+def _features(**overrides):
+    """Features sintéticas para n candidatos (padrão: todos iguais)"""
+    from services.ranking import CandidateFeatures
+    n = len(next(iter(overrides.values()))) if overrides else 3
+    values = {
+        "ids": np.arange(1, n + 1),
+        "last_active_hours": np.full(n, np.nan),
+        "liked_me": np.zeros(n),
+        "likes_received": np.zeros(n),
+        "matches": np.zeros(n),
+        "mutual": np.zeros(n),
+    }
+    values.update(overrides)
+    return CandidateFeatures(**values)
+
+
+class TestScoring:
+    """Testes para o score vetorizado e o top-K"""
+    
+    def test_liked_me_ranks_first(self):
+        """Testa que quem já curtiu o usuário vem primeiro"""
+        from services.ranking import score_candidates, top_k
+        features = _features(liked_me=np.array([0, 0, 1]))
+        assert top_k(features.ids, score_candidates(features), 3) == [3, 1, 2]
+    
+    def test_recent_activity_and_mutual_matches_score_higher(self):
+        """Testa recência da atividade e matches em comum"""
+        from services.ranking import score_candidates
+        scores = score_candidates(_features(last_active_hours=np.array([1.0, 500.0, np.nan])))
+        assert scores[0] > scores[1] > scores[2]
+        
+        scores = score_candidates(_features(mutual=np.array([0, 1, 5])))
+        assert scores[0] < scores[1] < scores[2]
+    
+    def test_top_k_matches_full_sort(self):
+        """Testa que a ordenação parcial dá o mesmo resultado da ordenação completa"""
+        from services.ranking import top_k
+        rng = np.random.default_rng(42)
+        ids = np.arange(10000)
+        scores = rng.random(10000)
+        expected = ids[np.argsort(-scores, kind="stable")][:50].tolist()
+        assert top_k(ids, scores, 50) == expected
+        assert top_k(ids[:3], scores[:3], 10) == ids[:3][np.argsort(-scores[:3])].tolist()
+        assert top_k(ids, scores, 0) == []
+    
+    @pytest.mark.slow
+    def test_benchmark_100k_candidates(self):
+        """Benchmark: score + top-K de 100 mil candidatos em milissegundos"""
+        from services.ranking import score_candidates, top_k
+        n = 100_000
+        rng = np.random.default_rng(7)
+        features = _features(
+            ids=np.arange(n),
+            last_active_hours=rng.exponential(100, n),
+            liked_me=(rng.random(n) < 0.01).astype(float),
+            likes_received=rng.integers(0, 50, n).astype(float),
+            matches=rng.integers(0, 10, n).astype(float),
+            mutual=rng.integers(0, 5, n).astype(float),
+        )
+        
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            best = top_k(features.ids, score_candidates(features), 50)
+            timings.append(time.perf_counter() - start)
+        
+        print(f"\nscore + top-50 de {n} candidatos: {min(timings) * 1000:.2f} ms")
+        assert len(best) == 50
+        assert min(timings) < 0.1
+
+
+class TestRankedFeed:
+    """Testes para o feed com ranked=true"""
+    
+    def test_load_features(self, two_users, db, create_users):
+        """Testa as features lidas do banco para cada candidato"""
+        from database import models
+        from services.ranking import load_features
+        me = two_users["user1"]["id"]
+        friend = two_users["user2"]["id"]
+        fan, common, stranger = create_users(db, 3)
+        db.add_all([
+            models.Like(liker_id=fan, liked_id=me),
+            models.Like(liker_id=stranger, liked_id=fan),
+            models.Match(user_a_id=min(me, friend), user_b_id=max(me, friend), status=models.MatchStatus.MATCHED),
+            models.Match(user_a_id=min(friend, common), user_b_id=max(friend, common), status=models.MatchStatus.MATCHED),
+        ])
+        db.commit()
+        
+        features = load_features(db, me, [fan, common, stranger])
+        by_id = {user_id: i for i, user_id in enumerate(features.ids.tolist())}
+        
+        assert features.liked_me[by_id[fan]] == 1
+        assert features.likes_received[by_id[fan]] == 1
+        assert features.mutual[by_id[common]] == 1
+        assert features.matches[by_id[common]] == 1
+        assert np.isnan(features.last_active_hours[by_id[common]])
+        assert features.last_active_hours[by_id[stranger]] < 1
+    
+    def test_ranked_feed_orders_by_score(self, client, two_users, db, create_users):
+        """Testa que o feed ranqueado traz primeiro quem já curtiu o usuário"""
+        from database import models
+        me = two_users["user1"]["id"]
+        ids = create_users(db, 4)
+        db.add(models.Like(liker_id=ids[2], liked_id=me))
+        db.commit()
+        
+        response = client.get("/discovery/feed?ranked=true&limit=2", headers=two_users["headers1"])
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert [user["id"] for user in page["items"]][0] == ids[2]
+        assert len(page["items"]) == 2
+        # O resto da janela vem na próxima página, sem repetir ninguém
+        rest = client.get(
+            "/discovery/feed", params={"ranked": "true", "limit": 10, "cursor": page["next_cursor"]},
+            headers=two_users["headers1"]
+        ).json()
+        served = [user["id"] for user in page["items"] + rest["items"]]
+        assert len(served) == len(set(served)) == 5
+        assert rest["next_cursor"] is None
+    
+    def test_ranked_feed_walks_windows(self, client, auth_headers, db, create_users, monkeypatch):
+        """Testa que, com a janela inteira na página, o cursor passa para a próxima janela"""
+        from services import discovery_service
+        monkeypatch.setattr(discovery_service, "DISCOVERY_RANKING_WINDOW", 3)
+        ids = create_users(db, 5)
+        
+        first = client.get("/discovery/feed?ranked=true&limit=10", headers=auth_headers).json()
+        assert sorted(user["id"] for user in first["items"]) == ids[:3]
+        
+        second = client.get(
+            "/discovery/feed", params={"ranked": "true", "limit": 10, "cursor": first["next_cursor"]},
+            headers=auth_headers
+        ).json()
+        assert sorted(user["id"] for user in second["items"]) == ids[3:]
+        assert second["next_cursor"] is None
+    
+    def test_ranked_feed_pages_every_candidate_once(self, client, auth_headers, db, create_users, monkeypatch):
+        """Testa que paginar o feed ranqueado por várias janelas entrega cada candidato uma única vez"""
+        from services import discovery_service
+        monkeypatch.setattr(discovery_service, "DISCOVERY_RANKING_WINDOW", 3)
+        ids = create_users(db, 8)
+        
+        seen, cursor = [], None
+        for _ in range(20):
+            params = {"ranked": "true", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            page = client.get("/discovery/feed", params=params, headers=auth_headers).json()
+            assert len(page["items"]) <= 2
+            seen.extend(user["id"] for user in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        
+        assert cursor is None
+        assert sorted(seen) == ids
+        assert len(seen) == len(set(seen))